@@ -1,3 +1,4 @@
+import multiprocessing
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
@@ -14,6 +15,13 @@ from routes.orishas import orishas_bp
 from routes.blog import blog_bp
 from routes.dashboard import dashboard_bp
 from routes.ai import ai_bp
+from routes.jobs import jobs_bp
+from utils.woocommerce_api import end_request_memo, get_wc_api_stats, start_request_memo
+from utils.wordpress_api import get_wp_api_stats
+from utils.catalog_cache import get_catalog_cache
+from utils.order_sync import start_order_sync_poller
+from utils.jobs import start_job_workers
+from utils.image_store import start_image_reconciler
 
 
 def create_app():
@@ -46,12 +54,41 @@ def create_app():
     app.register_blueprint(blog_bp, url_prefix='/api')
     app.register_blueprint(dashboard_bp, url_prefix='/api')
     app.register_blueprint(ai_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
 
+    # Los GET idénticos a WooCommerce dentro de una misma petición se hacen una sola vez
+    app.before_request(start_request_memo)
+    app.teardown_request(end_request_memo)
+
+    # Los procesos del pool de optimización de imágenes (spawn) vuelven a importar
+    # el módulo principal: en ellos no se arrancan los hilos de fondo
+    if multiprocessing.parent_process() is None:
+        # Mantener la réplica local de pedidos al día
+        start_order_sync_poller()
+
+        # Ejecutar los trabajos en segundo plano (operaciones masivas)
+        start_job_workers()
+
+        # Mantener el índice de imágenes generadas al día con el directorio
+        start_image_reconciler()
 
     @app.route("/")
     def index():
         return jsonify({"message": "Welcome to the IbuloreWP Backend!"})
 
+    @app.route("/api/upstream/stats")
+    def upstream_stats():
+        """
+        Uso de los pools de conexiones y reintentos hacia WooCommerce y WordPress,
+        y aciertos de la caché del catálogo. Los contadores son por worker de gunicorn.
+        """
+        catalog_cache = get_catalog_cache()
+        return jsonify({
+            "woocommerce": get_wc_api_stats(),
+            "wordpress": get_wp_api_stats(),
+            "catalog_cache": catalog_cache.stats() if catalog_cache else None
+        })
+
     return app
 
 # Create app instance for Gunicorn
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la derivación de clientes invitados (build_guest_customers).
+
+Genera pedidos sintéticos y compara el índice por email de una sola pasada con
+el algoritmo anterior (any() sobre clientes registrados + re-escaneo de todos los
+pedidos por cada email). Comprueba también que ambos producen el mismo resultado.
+
+Uso:
+    python bench_guest_customers.py [--orders 50000]
+"""
+
+import argparse
+import random
+import time
+
+from utils.api_helpers import build_guest_customers
+
+
+def synthetic_orders(count, seed=42):
+    rnd = random.Random(seed)
+    statuses = ['completed', 'processing', 'pending', 'cancelled', 'on-hold', 'refunded']
+    # ~1 email distinto por cada 4 pedidos
+    emails = max(count // 4, 1)
+    orders = []
+    for i in range(count):
+        email_id = rnd.randrange(emails)
+        date_created = f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T{rnd.randint(0, 23):02d}:00:00"
+        orders.append({
+            'id': i + 1,
+            'status': rnd.choice(statuses),
+            'total': f"{rnd.uniform(5, 500):.2f}",
+            'date_created': date_created,
+            'date_modified': date_created,
+            'billing': {
+                'first_name': f"Nombre{email_id}",
+                'last_name': "Apellido",
+                'email': f"cliente{email_id}@example.com"
+            },
+            'shipping': {}
+        })
+    orders.sort(key=lambda o: o['date_created'], reverse=True)
+    return orders
+
+
+def synthetic_customers(count):
+    return [
+        {'id': i + 1, 'email': f"cliente{i * 7}@example.com", 'role': 'customer'}
+        for i in range(count)
+    ]
+
+
+def legacy_guest_customers(orders, registered_customers):
+    """Algoritmo anterior de /customers, O(pedidos² + pedidos × clientes)."""
+    guest_customers_dict = {}
+    for order in orders:
+        billing = order.get('billing', {})
+        email_addr = billing.get('email', '').strip().lower()
+        if email_addr and email_addr not in guest_customers_dict:
+            is_customer = any(c.get('email', '').lower() == email_addr and c.get('role') == 'customer' for c in registered_customers)
+            if not is_customer:
+                customer_orders = [o for o in orders if o.get('billing', {}).get('email', '').lower() == email_addr]
+                total_spent = sum(float(o.get('total', 0)) for o in customer_orders if o.get('status') in ['completed', 'processing'])
+                customer_orders_sorted = sorted(customer_orders, key=lambda x: x.get('date_created', ''))
+                guest_customers_dict[email_addr] = {
+                    'email': billing.get('email', ''),
+                    'date_created': customer_orders_sorted[0].get('date_created'),
+                    'last_order_date': customer_orders_sorted[-1].get('date_created'),
+                    'orders_count': len(customer_orders),
+                    'total_spent': str(total_spent)
+                }
+    return list(guest_customers_dict.values())
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=50000)
+    args = parser.parse_args()
+
+    customers = synthetic_customers(100)
+
+    # 1. Mismo resultado que el algoritmo anterior
+    sample = synthetic_orders(2000)
+    expected = legacy_guest_customers(sample, customers)
+    actual = build_guest_customers(sample, customers)
+    keys = ['email', 'date_created', 'last_order_date', 'orders_count', 'total_spent']
+    assert [{k: g[k] for k in keys} for g in actual] == expected, "build_guest_customers differs from legacy output"
+    print(f"✅ Resultado idéntico al algoritmo anterior ({len(actual)} invitados de {len(sample)} pedidos)\n")
+
+    # 2. Escalado: el tiempo por pedido debe mantenerse constante
+    print(f"{'pedidos':>8}  {'nuevo (ms)':>11}  {'µs/pedido':>10}  {'anterior (ms)':>14}")
+    for size in (args.orders // 8, args.orders // 4, args.orders // 2, args.orders):
+        orders = synthetic_orders(size)
+        _, new_time = timed(build_guest_customers, orders, customers)
+        legacy = ''
+        if size <= 6250:
+            _, legacy_time = timed(legacy_guest_customers, orders, customers)
+            legacy = f"{legacy_time * 1000:14.1f}"
+        else:
+            legacy = f"{'(omitido)':>14}"
+        print(f"{size:>8}  {new_time * 1000:11.1f}  {new_time / size * 1e6:10.2f}  {legacy}")
+
+
+if __name__ == '__main__':
+    main()
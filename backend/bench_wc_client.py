@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark del cliente de WooCommerce: un API nuevo por petición vs. cliente con pool.
+
+Levanta una tienda WooCommerce simulada en localhost (HTTP/1.1 con keep-alive) y
+mide la latencia por petición de ambos enfoques. La opción --handshake-ms añade un
+retardo en cada conexión nueva para simular el coste del handshake TCP+TLS contra
+una tienda remota.
+
+Uso:
+    python bench_wc_client.py [--requests 300] [--handshake-ms 30]
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from woocommerce import API
+
+from config import Config
+import utils.woocommerce_api as woocommerce_api
+
+HANDSHAKE_DELAY = 0.0
+ORDERS_PAYLOAD = json.dumps([
+    {"id": i, "status": "processing", "total": "10.00"} for i in range(20)
+]).encode()
+
+
+class StandInStoreHandler(BaseHTTPRequestHandler):
+    """Responde a /wp-json/wc/v3/* con una lista fija de pedidos."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        # Una conexión nueva paga el "handshake"
+        if HANDSHAKE_DELAY:
+            time.sleep(HANDSHAKE_DELAY)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(ORDERS_PAYLOAD)))
+        self.send_header("X-WP-Total", "20")
+        self.end_headers()
+        self.wfile.write(ORDERS_PAYLOAD)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in_store():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInStoreHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def run(label, get_client, total_requests):
+    timings = []
+    for _ in range(total_requests):
+        start = time.perf_counter()
+        response = get_client().get("orders", params={"per_page": 20})
+        response.json()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<28} mean={statistics.mean(timings):7.2f} ms  "
+          f"p50={statistics.median(timings):7.2f} ms  p95={p95:7.2f} ms")
+    return statistics.median(timings)
+
+
+def main():
+    global HANDSHAKE_DELAY
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    args = parser.parse_args()
+
+    HANDSHAKE_DELAY = args.handshake_ms / 1000
+    server = start_stand_in_store()
+    store_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    Config.WC_STORE_URL = store_url
+    Config.WC_CONSUMER_KEY = "ck_bench"
+    Config.WC_CONSUMER_SECRET = "cs_bench"
+    woocommerce_api.reset_wc_api()
+
+    print(f"🏪 Tienda simulada en {store_url} (handshake simulado: {args.handshake_ms} ms)")
+    print(f"📊 {args.requests} peticiones GET orders por cliente\n")
+
+    def new_client_per_request():
+        return API(url=store_url, consumer_key="ck_bench", consumer_secret="cs_bench", version="wc/v3")
+
+    before = run("Antes (API por petición)", new_client_per_request, args.requests)
+    after = run("Después (cliente con pool)", woocommerce_api.get_wc_api, args.requests)
+
+    print(f"\n✅ p50 {before:.2f} ms -> {after:.2f} ms ({before / after:.1f}x)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
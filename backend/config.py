@@ -8,12 +8,115 @@ class Config:
     WC_CONSUMER_KEY = os.getenv("WC_CONSUMER_KEY")
     WC_CONSUMER_SECRET = os.getenv("WC_CONSUMER_SECRET")
     
+    # Pool de conexiones y timeouts (en segundos) del cliente de WooCommerce
+    WC_POOL_SIZE = int(os.getenv("WC_POOL_SIZE", "10"))
+    WC_CONNECT_TIMEOUT = float(os.getenv("WC_CONNECT_TIMEOUT", "5"))
+    WC_READ_TIMEOUT = float(os.getenv("WC_READ_TIMEOUT", "30"))
+    
+    # Llamadas concurrentes (dashboard, lotes): tamaño del pool y timeout por llamada
+    FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "16"))
+    FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "10"))
+    
+    # Endpoints /batch de WooCommerce: lotes en paralelo por petición y timeout de lectura por lote
+    WC_BATCH_CONCURRENCY = int(os.getenv("WC_BATCH_CONCURRENCY", "4"))
+    WC_BATCH_TIMEOUT = float(os.getenv("WC_BATCH_TIMEOUT", "90"))
+    
     # Credenciales para la API de Medios de WordPress
     WP_USER_LOGIN = os.getenv("WP_USER_LOGIN")
     WP_APPLICATION_PASSWORD = os.getenv("WP_APPLICATION_PASSWORD")
     
+    # Pool de conexiones, timeouts (en segundos) y reintentos del cliente de WordPress
+    WP_POOL_SIZE = int(os.getenv("WP_POOL_SIZE", "10"))
+    WP_CONNECT_TIMEOUT = float(os.getenv("WP_CONNECT_TIMEOUT", "5"))
+    WP_READ_TIMEOUT = float(os.getenv("WP_READ_TIMEOUT", "30"))
+    WP_WRITE_TIMEOUT = float(os.getenv("WP_WRITE_TIMEOUT", "60"))
+    WP_UPLOAD_TIMEOUT = float(os.getenv("WP_UPLOAD_TIMEOUT", "120"))
+    WP_MAX_RETRIES = int(os.getenv("WP_MAX_RETRIES", "3"))
+    WP_RETRY_BASE_DELAY = float(os.getenv("WP_RETRY_BASE_DELAY", "0.5"))
+    WP_RETRY_MAX_DELAY = float(os.getenv("WP_RETRY_MAX_DELAY", "8"))
+    
+    # Subida de medios a WordPress: tamaño máximo por archivo y subidas simultáneas por lote
+    MEDIA_MAX_UPLOAD_BYTES = int(os.getenv("MEDIA_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    MEDIA_MAX_BATCH_FILES = int(os.getenv("MEDIA_MAX_BATCH_FILES", "20"))
+    MEDIA_UPLOAD_CONCURRENCY = int(os.getenv("MEDIA_UPLOAD_CONCURRENCY", "4"))
+    # Optimización previa de imágenes (redimensionar, quitar EXIF, recodificar) en un pool de procesos;
+    # cada subida puede desactivarla con optimize=0
+    MEDIA_OPTIMIZE_ENABLED = os.getenv("MEDIA_OPTIMIZE_ENABLED", "True").lower() in ("true", "1", "t")
+    MEDIA_OPTIMIZE_MAX_EDGE = int(os.getenv("MEDIA_OPTIMIZE_MAX_EDGE", "2048"))
+    MEDIA_OPTIMIZE_FORMAT = os.getenv("MEDIA_OPTIMIZE_FORMAT", "webp").lower()  # webp o jpeg
+    MEDIA_OPTIMIZE_QUALITY = int(os.getenv("MEDIA_OPTIMIZE_QUALITY", "82"))
+    MEDIA_OPTIMIZE_WORKERS = int(os.getenv("MEDIA_OPTIMIZE_WORKERS", "2"))
+    MEDIA_OPTIMIZE_TIMEOUT = float(os.getenv("MEDIA_OPTIMIZE_TIMEOUT", "30"))
+    # Deduplicación por SHA-256 del contenido (DATA_DIR/media_index.db); cada subida puede forzar
+    # una copia nueva con force_new=1. El primer uso indexa en segundo plano la biblioteca existente
+    MEDIA_DEDUPE_ENABLED = os.getenv("MEDIA_DEDUPE_ENABLED", "True").lower() in ("true", "1", "t")
+    MEDIA_INDEX_BACKFILL_CONCURRENCY = int(os.getenv("MEDIA_INDEX_BACKFILL_CONCURRENCY", "4"))
+    # Límite de Flask para el cuerpo de cualquier petición (un lote completo de medios)
+    MAX_CONTENT_LENGTH = MEDIA_MAX_UPLOAD_BYTES * MEDIA_MAX_BATCH_FILES + 1024 * 1024
+    
     # Configuración de OpenAI para generación de contenido con IA
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-1106-preview")  # Modelo por defecto
+    OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1").rstrip('/')
+    # En modo streaming: segundos máximos de espera entre fragmentos (no la duración total)
+    OPENAI_STREAM_TIMEOUT = float(os.getenv("OPENAI_STREAM_TIMEOUT", "30"))
+    
+    # Caché en disco de generaciones de IA (DATA_DIR/ai_cache.db)
+    AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "True").lower() in ("true", "1", "t")
+    AI_CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+    AI_CACHE_MAX_AGE_DAYS = float(os.getenv("AI_CACHE_MAX_AGE_DAYS", "30"))
+    
+    # Replicate (generación de fotos de producto con IA)
+    REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
+    REPLICATE_API_URL = os.getenv("REPLICATE_API_URL", "https://api.replicate.com/v1").rstrip('/')
+    REPLICATE_POLL_INITIAL = float(os.getenv("REPLICATE_POLL_INITIAL", "0.5"))
+    REPLICATE_POLL_MAX = float(os.getenv("REPLICATE_POLL_MAX", "5"))
+    REPLICATE_TIMEOUT = float(os.getenv("REPLICATE_TIMEOUT", "300"))
+    
+    # Imágenes generadas con IA (se sirven desde /api/static/generated-images)
+    GENERATED_IMAGES_DIR = os.getenv(
+        "GENERATED_IMAGES_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "generated-images")
+    )
+    # Cada cuánto se reconcilia el índice de imágenes con el directorio (segundos, 0 desactiva)
+    GENERATED_IMAGES_RECONCILE_INTERVAL = float(os.getenv("GENERATED_IMAGES_RECONCILE_INTERVAL", "600"))
+    # Las imágenes y sus variantes no cambian una vez escritas: caché de navegador larga
+    GENERATED_IMAGES_MAX_AGE = int(os.getenv("GENERATED_IMAGES_MAX_AGE", "31536000"))
+    # Prefijo de la location interna de nginx que sirve GENERATED_IMAGES_DIR
+    # (p. ej. /_generated-images/); si se define, Flask responde con X-Accel-Redirect
+    # y nginx envía los bytes. Vacío: los sirve Flask.
+    GENERATED_IMAGES_ACCEL_PREFIX = os.getenv("GENERATED_IMAGES_ACCEL_PREFIX", "")
+    
+    # Directorio para datos locales (réplica de pedidos, colas, cachés)
+    DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    
+    # Sincronización de la réplica local de pedidos (segundos, 0 desactiva el sondeo)
+    ORDER_SYNC_INTERVAL = int(os.getenv("ORDER_SYNC_INTERVAL", "120"))
+    # Refresco completo de los clientes registrados del directorio de búsqueda (segundos, 0 desactiva)
+    CUSTOMER_SYNC_INTERVAL = int(os.getenv("CUSTOMER_SYNC_INTERVAL", "3600"))
+    
+    # Trabajos en segundo plano (DATA_DIR/jobs.db): hilos por worker, segundos que una
+    # ruta espera el resultado antes de responder 202, y recuperación de trabajos huérfanos
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+    JOB_SYNC_WAIT = float(os.getenv("JOB_SYNC_WAIT", "20"))
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "60"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+    
+    # Caché en memoria de categorías, atributos y orishas (segundos). Hasta CATALOG_CACHE_TTL se
+    # sirve sin consultar; hasta CATALOG_CACHE_STALE_TTL se sirve y se refresca en segundo plano.
+    # Las escrituras del panel y /api/webhooks/catalog la invalidan. 0 la desactiva
+    CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+    CATALOG_CACHE_STALE_TTL = int(os.getenv("CATALOG_CACHE_STALE_TTL", "3600"))
+    
+    # Índice en memoria para /api/products/search. Se reconstruye cada
+    # PRODUCT_INDEX_REFRESH_INTERVAL segundos; entre medias lo actualizan las rutas del panel
+    # y /api/webhooks/products
+    PRODUCT_INDEX_ENABLED = os.getenv("PRODUCT_INDEX_ENABLED", "True").lower() in ("true", "1", "t")
+    PRODUCT_INDEX_REFRESH_INTERVAL = int(os.getenv("PRODUCT_INDEX_REFRESH_INTERVAL", "900"))
+    
+    # Secreto de los webhooks de WooCommerce (opcional, verifica X-WC-Webhook-Signature)
+    WC_WEBHOOK_SECRET = os.getenv("WC_WEBHOOK_SECRET")
     
     FLASK_DEBUG = os.getenv("FLASK_DEBUG", "False").lower() in ("true", "1", "t") 
\ No newline at end of file
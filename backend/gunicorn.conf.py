@@ -0,0 +1,23 @@
+"""
+Configuración de gunicorn para el backend de IbuloreWP.
+
+gunicorn carga este archivo automáticamente desde el directorio de trabajo.
+"""
+
+bind = "0.0.0.0:5001"
+workers = 4
+# Hilos por worker: las conexiones largas (SSE de progreso) ocupan un hilo, no un proceso
+worker_class = "gthread"
+threads = 8
+timeout = 120
+keepalive = 5
+
+
+def post_fork(server, worker):
+    """
+    Cada worker crea sus propios pools de conexiones a WooCommerce y WordPress tras el fork.
+    """
+    from utils.woocommerce_api import reset_wc_api
+    from utils.wordpress_api import reset_wp_session
+    reset_wc_api()
+    reset_wp_session()
@@ -1,53 +1,63 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app, send_file, Response, stream_with_context
 import os
-import json
+import re
+import math
+import time
 from datetime import datetime
 import requests
 from werkzeug.utils import secure_filename
 import base64
+import mimetypes
+from urllib.parse import quote
+import hashlib
 from io import BytesIO
 from PIL import Image
+from config import Config
+from utils.jobs import job_handler, respond_with_job, get_job_queue, FINISHED_STATUSES, SUCCEEDED
+from utils.replicate_api import create_prediction, wait_for_prediction, download_output
+from utils.api_helpers import sse_event
+from utils.image_store import get_image_store
+from utils.image_variants import (VARIANTS, FORMAT_MIMETYPES, available_formats, create_variant, create_all_variants,
+                                  file_etag, negotiate_format)
+from utils.ai_cache import (cache_key, normalize_text, cached_lookup, cached_store, force_regenerate_requested,
+                            get_ai_cache)
 
 ai_bp = Blueprint('ai', __name__)
 
 # Directorio para guardar imágenes generadas
-GENERATED_IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'generated-images')
-METADATA_FILE = os.path.join(GENERATED_IMAGES_DIR, 'metadata.json')
+GENERATED_IMAGES_DIR = Config.GENERATED_IMAGES_DIR
+
+# Modelo SDXL-Lightning para generación rápida
+PRODUCT_PHOTO_MODEL_VERSION = '5f24084160c9089501c1b3545d9be3c27883ae2239b6f412990e82d4a6210f8f'
 
 # Crear directorio si no existe
 os.makedirs(GENERATED_IMAGES_DIR, exist_ok=True)
 
-def load_metadata():
-    """Cargar metadata de imágenes generadas"""
-    if os.path.exists(METADATA_FILE):
-        with open(METADATA_FILE, 'r') as f:
-            return json.load(f)
-    return []
-
-def save_metadata(metadata):
-    """Guardar metadata de imágenes generadas"""
-    with open(METADATA_FILE, 'w') as f:
-        json.dump(metadata, f, indent=2)
-
 @ai_bp.route('/ai/generated-images', methods=['GET'])
 def get_generated_images():
-    """Obtener lista de imágenes generadas"""
+    """
+    Obtener imágenes generadas, de la más reciente a la más antigua.
+    
+    Parámetros: page, per_page (máx. 200), search (texto del prompt), order (desc/asc).
+    """
     try:
-        metadata = load_metadata()
-        
-        # Verificar que los archivos aún existen
-        valid_images = []
-        for item in metadata:
-            file_path = os.path.join(GENERATED_IMAGES_DIR, item['fileName'])
-            if os.path.exists(file_path):
-                # Agregar URL completa para acceder a la imagen
-                item['url'] = f"/panel/api/static/generated-images/{item['fileName']}"
-                item['localUrl'] = item['url']  # Mantener compatibilidad
-                valid_images.append(item)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+        images, total = get_image_store().query_images(
+            page=page,
+            per_page=per_page,
+            search=request.args.get('search', '').strip() or None,
+            order=request.args.get('order', 'desc')
+        )
+        total_pages = math.ceil(total / per_page) if total else 0
         
         return jsonify({
             'success': True,
-            'images': valid_images
+            'images': images,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'total_pages': total_pages
         })
     
     except Exception as e:
@@ -56,9 +66,79 @@ def get_generated_images():
             'details': str(e)
         }), 500
 
+def prediction_percent(prediction):
+    """Último porcentaje de avance que aparece en los logs de Replicate (p. ej. ' 50%|█████')"""
+    matches = re.findall(r'(\d{1,3})%\|', prediction.get('logs') or '')
+    return int(matches[-1]) if matches else None
+
+@job_handler('ai.product_photo')
+def generate_product_photo_job(job):
+    """
+    Espera a que termine la predicción de Replicate, descarga la imagen y la
+    registra en el índice de imágenes, todo fuera del ciclo de la petición HTTP.
+    """
+    prediction_id = job.payload['prediction_id']
+    
+    def on_poll(prediction):
+        job.progress(0, 1, {
+            'stage': 'generating',
+            'prediction_id': prediction_id,
+            'prediction_status': prediction.get('status'),
+            'percent': prediction_percent(prediction)
+        })
+    
+    prediction = wait_for_prediction(prediction_id, on_poll)
+    if prediction['status'] != 'succeeded':
+        raise RuntimeError('Error al generar la imagen')
+    
+    # Obtener la URL de la imagen generada
+    output = prediction.get('output')
+    generated_image_url = output[0] if isinstance(output, list) and output else output
+    if not generated_image_url:
+        raise RuntimeError('No se pudo obtener la imagen generada')
+    
+    job.progress(0, 1, {
+        'stage': 'downloading',
+        'prediction_id': prediction_id,
+        'prediction_status': prediction['status'],
+        'percent': 100
+    })
+    
+    # Generar nombre único para el archivo
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"product_{timestamp}_{job.id[:8]}.png"
+    file_path = os.path.join(GENERATED_IMAGES_DIR, filename)
+    
+    # Descargar a un temporal y mover, para no servir nunca una imagen a medias
+    download_output(generated_image_url, f"{file_path}.part")
+    os.replace(f"{file_path}.part", file_path)
+    
+    # Miniatura y tamaño medio para la galería, antes de que la imagen aparezca en ella
+    create_all_variants(filename)
+    get_image_store().add_image(filename, job.payload['prompt'])
+    
+    # Devolver URL completa que funcione en producción
+    result = {
+        'success': True,
+        'imageUrl': f"/panel/api/static/generated-images/{filename}",
+        'fileName': filename
+    }
+    if job.payload.get('cache_key'):
+        cached_store('ai.product_photo', job.payload['cache_key'], result)
+    return result
+
 @ai_bp.route('/ai/generate-product-photo', methods=['POST'])
 def generate_product_photo():
-    """Generar foto de producto con IA usando Replicate"""
+    """
+    Generar foto de producto con IA usando Replicate.
+    
+    Inicia la predicción y deja la espera, la descarga y el registro en un trabajo
+    en segundo plano. Con ?async=1 responde 202 con el job_id al momento; el
+    avance se sigue en /ai/generate-product-photo/<job_id>/events (SSE).
+    
+    La misma imagen con el mismo prompt devuelve al momento la foto ya generada
+    (caché de generaciones), salvo con forceRegenerate=true.
+    """
     try:
         # Verificar que se recibió una imagen
         if 'image' not in request.files:
@@ -71,8 +151,7 @@ def generate_product_photo():
             return jsonify({'error': 'No se proporcionó un prompt'}), 400
         
         # Verificar la API key de Replicate
-        replicate_api_token = os.environ.get('REPLICATE_API_TOKEN')
-        if not replicate_api_token:
+        if not Config.REPLICATE_API_TOKEN:
             return jsonify({'error': 'API key de Replicate no configurada'}), 500
         
         # Convertir imagen a base64
@@ -81,84 +160,39 @@ def generate_product_photo():
         
         # Preparar el prompt mejorado
         enhanced_prompt = f"Product photography: {prompt}. Professional studio lighting, high quality, commercial photography, clean background, sharp focus, high resolution"
-        
-        # Llamar a la API de Replicate
-        headers = {
-            'Authorization': f'Token {replicate_api_token}',
-            'Content-Type': 'application/json'
+        model_input = {
+            'prompt': enhanced_prompt,
+            'num_outputs': 1,
+            'guidance_scale': 7.5,
+            'num_inference_steps': 4,
+            'scheduler': 'K_EULER',
+            'disable_safety_checker': True
         }
         
-        # Usar el modelo SDXL-Lightning para generación rápida
-        data = {
-            'version': '5f24084160c9089501c1b3545d9be3c27883ae2239b6f412990e82d4a6210f8f',
-            'input': {
-                'prompt': enhanced_prompt,
-                'image': f'data:image/jpeg;base64,{image_base64}',
-                'num_outputs': 1,
-                'guidance_scale': 7.5,
-                'num_inference_steps': 4,
-                'scheduler': 'K_EULER',
-                'disable_safety_checker': True
-            }
-        }
+        # Clave por contenido: modelo, parámetros, prompt normalizado y hash de la imagen
+        key = cache_key('ai.product_photo', version=PRODUCT_PHOTO_MODEL_VERSION,
+                        input={**model_input, 'prompt': normalize_text(enhanced_prompt)},
+                        image_sha256=hashlib.sha256(image_data).hexdigest())
+        if not force_regenerate_requested():
+            cached = cached_lookup('ai.product_photo', key)
+            # Solo si la imagen sigue en disco (se puede haber borrado a mano)
+            if cached is not None and os.path.exists(os.path.join(GENERATED_IMAGES_DIR, cached['fileName'])):
+                return jsonify({**cached, 'cached': True})
         
-        response = requests.post(
-            'https://api.replicate.com/v1/predictions',
-            headers=headers,
-            json=data
-        )
-        
-        if response.status_code != 201:
+        try:
+            prediction = create_prediction(PRODUCT_PHOTO_MODEL_VERSION, {
+                **model_input,
+                'image': f'data:image/jpeg;base64,{image_base64}'
+            })
+        except (RuntimeError, requests.RequestException) as e:
+            current_app.logger.error(f"Replicate prediction could not be created: {e}")
             return jsonify({'error': 'Error al iniciar la generación de imagen'}), 500
         
-        prediction = response.json()
-        prediction_id = prediction['id']
-        
-        # Esperar a que la predicción termine
-        while prediction['status'] not in ['succeeded', 'failed', 'canceled']:
-            response = requests.get(
-                f'https://api.replicate.com/v1/predictions/{prediction_id}',
-                headers=headers
-            )
-            prediction = response.json()
-            
-            if prediction['status'] == 'failed':
-                return jsonify({'error': 'Error al generar la imagen'}), 500
-        
-        # Obtener la URL de la imagen generada
-        if prediction['output'] and len(prediction['output']) > 0:
-            generated_image_url = prediction['output'][0]
-            
-            # Descargar y guardar la imagen
-            image_response = requests.get(generated_image_url)
-            if image_response.status_code == 200:
-                # Generar nombre único para el archivo
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"product_{timestamp}.png"
-                file_path = os.path.join(GENERATED_IMAGES_DIR, filename)
-                
-                # Guardar imagen
-                with open(file_path, 'wb') as f:
-                    f.write(image_response.content)
-                
-                # Actualizar metadata
-                metadata = load_metadata()
-                metadata.append({
-                    'fileName': filename,
-                    'prompt': prompt,
-                    'timestamp': datetime.now().isoformat(),
-                    'localUrl': f"/api/static/generated-images/{filename}"
-                })
-                save_metadata(metadata)
-                
-                # Devolver URL completa que funcione en producción
-                return jsonify({
-                    'success': True,
-                    'imageUrl': f"/panel/api/static/generated-images/{filename}",
-                    'fileName': filename
-                })
-            
-        return jsonify({'error': 'No se pudo obtener la imagen generada'}), 500
+        return respond_with_job('ai.product_photo', {
+            'prediction_id': prediction['id'],
+            'prompt': prompt,
+            'cache_key': key
+        }, total=1)
     
     except Exception as e:
         return jsonify({
@@ -166,14 +200,135 @@ def generate_product_photo():
             'details': str(e)
         }), 500
 
+@ai_bp.route('/ai/generate-product-photo/<job_id>', methods=['GET'])
+def get_product_photo_job(job_id):
+    """Estado de una generación de foto (mismo formato que /api/jobs/<id>)"""
+    job = get_job_queue().get(job_id)
+    if job is None or job['type'] != 'ai.product_photo':
+        return jsonify({'error': 'Generación no encontrada'}), 404
+    return jsonify(job)
+
+@ai_bp.route('/ai/generate-product-photo/<job_id>/events', methods=['GET'])
+def stream_product_photo_job(job_id):
+    """
+    Progreso de una generación como Server-Sent Events.
+    
+    Eventos: 'progress' ({status, stage, prediction_status, percent}) cada vez que
+    cambia, y al final 'done' (mismo cuerpo que la respuesta síncrona) o 'error'.
+    """
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None or job['type'] != 'ai.product_photo':
+        return jsonify({'error': 'Generación no encontrada'}), 404
+    
+    def events():
+        deadline = time.monotonic() + Config.REPLICATE_TIMEOUT + 60
+        last_snapshot = None
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            job = queue.get(job_id)
+            partial = job['partial_results'] or {}
+            snapshot = {
+                'status': job['status'],
+                'stage': partial.get('stage', 'queued'),
+                'prediction_status': partial.get('prediction_status'),
+                'percent': partial.get('percent')
+            }
+            if snapshot != last_snapshot:
+                yield sse_event('progress', snapshot)
+                last_snapshot = snapshot
+                last_sent = time.monotonic()
+            
+            if job['status'] in FINISHED_STATUSES:
+                if job['status'] == SUCCEEDED:
+                    yield sse_event('done', job['result'])
+                else:
+                    yield sse_event('error', {'error': job['error'] or 'Generación cancelada', 'status': job['status']})
+                return
+            
+            # Comentario periódico para que proxies no cierren la conexión
+            if time.monotonic() - last_sent > 15:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(0.5)
+        yield sse_event('error', {'error': 'Tiempo de espera agotado', 'status': 'timeout'})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@ai_bp.route('/ai/cache/stats', methods=['GET'])
+def get_ai_cache_stats():
+    """Aciertos, fallos, expulsiones y tamaño de la caché de generaciones por tipo"""
+    cache = get_ai_cache()
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.stats()})
+
+@ai_bp.route('/ai/cache', methods=['DELETE'])
+def clear_ai_cache():
+    """Vaciar la caché de generaciones (los contadores se mantienen)"""
+    cache = get_ai_cache()
+    if cache is not None:
+        cache.clear()
+    return jsonify({'success': True})
+
+def send_generated_image(path, mimetype, vary_accept=False):
+    """
+    Envía una imagen generada (o una variante) con ETag fuerte y caché larga.
+    
+    Flask atiende If-None-Match (304) y Range (206). Con GENERATED_IMAGES_ACCEL_PREFIX
+    la transferencia se delega a nginx con X-Accel-Redirect y el worker no envía bytes.
+    """
+    etag = file_etag(path)
+    if Config.GENERATED_IMAGES_ACCEL_PREFIX:
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            relative = os.path.relpath(path, GENERATED_IMAGES_DIR).replace(os.sep, '/')
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = f"{Config.GENERATED_IMAGES_ACCEL_PREFIX.rstrip('/')}/{quote(relative)}"
+        response.set_etag(etag)
+    else:
+        response = send_file(path, mimetype=mimetype, as_attachment=False, conditional=True, etag=etag)
+    response.headers['Cache-Control'] = f"public, max-age={Config.GENERATED_IMAGES_MAX_AGE}, immutable"
+    if vary_accept:
+        response.vary.add('Accept')
+    return response
+
 # Servir archivos estáticos de imágenes generadas
 @ai_bp.route('/static/generated-images/<filename>')
 def serve_generated_image(filename):
-    """Servir imágenes generadas"""
+    """
+    Servir imágenes generadas.
+    
+    ?variant=thumb|medium devuelve una versión reducida (se genera la primera vez
+    que se pide si no existe) en AVIF o WebP según el Accept del navegador, o en
+    el formato de ?format=avif|webp.
+    """
     try:
-        file_path = os.path.join(GENERATED_IMAGES_DIR, secure_filename(filename))
-        if os.path.exists(file_path):
-            return send_file(file_path, mimetype='image/png', as_attachment=False)
-        return jsonify({'error': 'Imagen no encontrada'}), 404
+        file_name = secure_filename(filename)
+        file_path = os.path.join(GENERATED_IMAGES_DIR, file_name)
+        if not os.path.exists(file_path):
+            return jsonify({'error': 'Imagen no encontrada'}), 404
+        
+        variant = request.args.get('variant')
+        if not variant:
+            return send_generated_image(file_path, mimetypes.guess_type(file_name)[0] or 'image/png')
+        if variant not in VARIANTS:
+            return jsonify({'error': f"Variante no válida. Opciones: {', '.join(VARIANTS)}"}), 400
+        
+        fmt = request.args.get('format')
+        if fmt is None:
+            fmt = negotiate_format(request.headers.get('Accept'))
+            if fmt is None:
+                return send_generated_image(file_path, mimetypes.guess_type(file_name)[0] or 'image/png',
+                                            vary_accept=True)
+        elif fmt not in available_formats():
+            return jsonify({'error': f"Formato no disponible. Opciones: {', '.join(available_formats())}"}), 400
+        
+        return send_generated_image(create_variant(file_name, variant, fmt), FORMAT_MIMETYPES[fmt],
+                                    vary_accept='format' not in request.args)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
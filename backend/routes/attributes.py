@@ -1,5 +1,8 @@
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.catalog_cache import ATTRIBUTES, UpstreamError, cached_wc_get, invalidate_catalog
+from utils.attribute_catalog import get_attribute_catalog
+from utils.wc_batch import run_batch
 
 attributes_bp = Blueprint('attributes_bp', __name__)
 
@@ -11,15 +14,17 @@ attributes_bp = Blueprint('attributes_bp', __name__)
 def get_attributes():
     """
     Obtiene todos los atributos globales de productos de WooCommerce.
+
+    Con include_terms=true cada atributo incluye sus términos ('terms'), para
+    cargar el editor de variaciones con una sola petición.
     """
     try:
-        wc_api = get_wc_api()
-        attributes = wc_api.get("products/attributes", params={
-            "per_page": 100,  # Obtener hasta 100 atributos
-            "orderby": "name",
-            "order": "asc"
-        }).json()
-        return jsonify(attributes)
+        catalog = get_attribute_catalog()
+        if request.args.get('include_terms', 'false').lower() == 'true':
+            return jsonify(catalog.as_list())
+        return jsonify(catalog.attributes)
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
@@ -70,6 +75,7 @@ def create_attribute():
         response = wc_api.post("products/attributes", attribute_data)
         print(f"WooCommerce API response status: {response.status_code}")
         print(f"WooCommerce API response text: {response.text}")
+        invalidate_catalog(ATTRIBUTES)
         
         # Verificar si la respuesta tiene contenido
         if response.text.strip():
@@ -109,6 +115,7 @@ def update_attribute(attribute_id):
 
         wc_api = get_wc_api()
         response = wc_api.put(f"products/attributes/{attribute_id}", attribute_data)
+        invalidate_catalog(ATTRIBUTES)
         
         # Verificar si la respuesta tiene contenido
         if response.text.strip():
@@ -141,6 +148,7 @@ def delete_attribute(attribute_id):
         wc_api = get_wc_api()
         # En WooCommerce, para eliminar permanentemente un atributo, usamos force=true
         deleted_attribute = wc_api.delete(f"products/attributes/{attribute_id}", params={"force": True}).json()
+        invalidate_catalog(ATTRIBUTES)
         return jsonify(deleted_attribute)
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
@@ -154,9 +162,10 @@ def get_attribute(attribute_id):
     Obtiene un atributo específico por su ID.
     """
     try:
-        wc_api = get_wc_api()
-        attribute = wc_api.get(f"products/attributes/{attribute_id}").json()
+        attribute, _ = cached_wc_get(ATTRIBUTES, f"products/attributes/{attribute_id}")
         return jsonify(attribute)
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
@@ -170,16 +179,21 @@ def get_attribute(attribute_id):
 @attributes_bp.route('/products/attributes/<int:attribute_id>/terms', methods=['GET'])
 def get_attribute_terms(attribute_id):
     """
-    Obtiene todos los términos de un atributo específico.
+    Obtiene todos los términos de un atributo específico (todas las páginas).
     """
     try:
-        wc_api = get_wc_api()
-        terms = wc_api.get(f"products/attributes/{attribute_id}/terms", params={
-            "per_page": 100,  # Obtener hasta 100 términos
-            "orderby": "name",
-            "order": "asc"
-        }).json()
-        return jsonify(terms)
+        catalog = get_attribute_catalog()
+        if attribute_id not in catalog:
+            # Atributo desconocido (o creado fuera del panel): WooCommerce responde
+            terms, _ = cached_wc_get(ATTRIBUTES, f"products/attributes/{attribute_id}/terms", {
+                "per_page": 100,
+                "orderby": "name",
+                "order": "asc"
+            })
+            return jsonify(terms)
+        return jsonify(catalog.terms_for(attribute_id))
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
@@ -202,6 +216,7 @@ def create_attribute_term(attribute_id):
         
         wc_api = get_wc_api()
         response = wc_api.post(f"products/attributes/{attribute_id}/terms", term_data)
+        invalidate_catalog(ATTRIBUTES)
         
         # Verificar si la respuesta tiene contenido
         if response.text.strip():
@@ -224,6 +239,68 @@ def create_attribute_term(attribute_id):
         print(f"Error al crear el término para el atributo {attribute_id}: {e}")
         return jsonify({"error": "Ocurrió un error interno"}), 500
 
+@attributes_bp.route('/products/attributes/<int:attribute_id>/terms/batch', methods=['POST'])
+def create_attribute_terms_batch(attribute_id):
+    """
+    Crea muchos términos de un atributo a la vez a través de
+    products/attributes/<id>/terms/batch (lotes de 100).
+
+    Acepta {"terms": [{"name": ..., "slug": ...}, ...]} o {"terms": ["S", "M", ...]}.
+    Los nombres que ya existen en el atributo (sin distinguir mayúsculas) se
+    omiten y se devuelven en 'existing'.
+    """
+    try:
+        data = request.get_json()
+        terms = data.get('terms') if isinstance(data, dict) else None
+        if not isinstance(terms, list) or not terms:
+            return jsonify({"error": "Se requiere una lista de términos"}), 400
+        
+        terms = [{"name": term} if isinstance(term, str) else term for term in terms]
+        if not all(isinstance(term, dict) and isinstance(term.get('name'), str) and term['name'].strip()
+                   for term in terms):
+            return jsonify({"error": "Todos los términos necesitan un nombre (texto)"}), 400
+        
+        existing_names = get_attribute_catalog().term_names(attribute_id)
+        to_create, existing = [], []
+        for term in terms:
+            key = term['name'].strip().casefold()
+            if key in existing_names:
+                existing.append(term['name'])
+            else:
+                existing_names.add(key)
+                to_create.append(term)
+        
+        wc_api = get_wc_api()
+        outcomes = run_batch(wc_api, f"products/attributes/{attribute_id}/terms/batch", "create", to_create)
+        created = [term for term, error in outcomes if error is None]
+        errors = [{"name": item['name'], "error": error} for item, (term, error) in zip(to_create, outcomes) if error]
+        if created:
+            invalidate_catalog(ATTRIBUTES)
+        
+        # 201 todos creados, 207 sólo algunos, 400 ninguno, 200 si ya existían todos
+        if created:
+            status = 207 if errors else 201
+        else:
+            status = 400 if errors else 200
+        return jsonify({
+            "created": created,
+            "existing": existing,
+            "errors": errors,
+            "summary": {
+                "requested": len(terms),
+                "created": len(created),
+                "existing": len(existing),
+                "errors": len(errors)
+            }
+        }), status
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        print(f"Error al crear términos en lote para el atributo {attribute_id}: {e}")
+        return jsonify({"error": "Ocurrió un error interno"}), 500
+
 @attributes_bp.route('/products/attributes/<int:attribute_id>/terms/<int:term_id>', methods=['PUT'])
 def update_attribute_term(attribute_id, term_id):
     """
@@ -236,6 +313,7 @@ def update_attribute_term(attribute_id, term_id):
 
         wc_api = get_wc_api()
         response = wc_api.put(f"products/attributes/{attribute_id}/terms/{term_id}", term_data)
+        invalidate_catalog(ATTRIBUTES)
         
         # Verificar si la respuesta tiene contenido
         if response.text.strip():
@@ -267,6 +345,7 @@ def delete_attribute_term(attribute_id, term_id):
         wc_api = get_wc_api()
         # En WooCommerce, para eliminar permanentemente un término, usamos force=true
         deleted_term = wc_api.delete(f"products/attributes/{attribute_id}/terms/{term_id}", params={"force": True}).json()
+        invalidate_catalog(ATTRIBUTES)
         return jsonify(deleted_term)
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
@@ -280,9 +359,10 @@ def get_attribute_term(attribute_id, term_id):
     Obtiene un término específico de un atributo por su ID.
     """
     try:
-        wc_api = get_wc_api()
-        term = wc_api.get(f"products/attributes/{attribute_id}/terms/{term_id}").json()
+        term, _ = cached_wc_get(ATTRIBUTES, f"products/attributes/{attribute_id}/terms/{term_id}")
         return jsonify(term)
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
@@ -1,11 +1,16 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from utils.wordpress_api import get_wp_api
+from utils.openai_api import stream_chat_completion, IncrementalJSONObject
+from utils.api_helpers import sse_event
+from utils.ai_cache import (cache_key, normalize_text, normalize_terms, cached_lookup, cached_store,
+                            force_regenerate_requested)
+from utils.jobs import job_handler, run_in_chunks, respond_with_job
+from utils.media_upload import (MediaUploadError, check_request_size, dedupe_requested, optimize_requested,
+                                upload_file_storage)
 from config import Config
 import math
 import requests
 import json
-from werkzeug.utils import secure_filename
-from requests.auth import HTTPBasicAuth
 
 blog_bp = Blueprint('blog_bp', __name__)
 
@@ -466,75 +471,21 @@ def create_tag():
 @blog_bp.route('/blog/media', methods=['POST'])
 def upload_media():
     """
-    Sube un archivo de media a WordPress usando el mismo método que productos.
+    Sube un archivo de media a WordPress (mismo flujo que /media/upload).
     """
+    too_large = check_request_size()
+    if too_large:
+        return jsonify({"error": too_large.message}), too_large.status
+    
+    if 'file' not in request.files:
+        return jsonify({"error": "No se proporcionó ningún archivo"}), 400
+    
     try:
-        if 'file' not in request.files:
-            return jsonify({"error": "No se proporcionó ningún archivo"}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No se seleccionó ningún archivo"}), 400
-        
-        alt_text = request.form.get('alt_text', '')
-        
-        # Usar el mismo método que funciona para productos
-        filename = secure_filename(file.filename)
-        
-        # Construir la URL base desde WC_STORE_URL
-        if '/wp-json/wc/v3' in Config.WC_STORE_URL:
-            wp_base_url = Config.WC_STORE_URL.split('/wp-json/wc/v3')[0]
-        else:
-            wp_base_url = Config.WC_STORE_URL.rstrip('/')
-        
-        media_endpoint = f"{wp_base_url}/wp-json/wp/v2/media"
-        
-        # Usar las credenciales de WordPress
-        if Config.WP_USER_LOGIN and Config.WP_APPLICATION_PASSWORD:
-            auth = HTTPBasicAuth(Config.WP_USER_LOGIN, Config.WP_APPLICATION_PASSWORD)
-        else:
-            auth = HTTPBasicAuth(Config.WC_CONSUMER_KEY, Config.WC_CONSUMER_SECRET)
-            print("WARN: Using WC API keys for media upload.")
-
-        # Establecer la cabecera del nombre del archivo
-        headers = {
-            'Content-Disposition': f'attachment; filename={filename}'
-        }
-        
-        if alt_text:
-            headers['Content-Description'] = alt_text
-
-        print(f"Uploading media: {filename} to {media_endpoint}")
-
-        # Enviar el archivo usando el parámetro `files` para multipart/form-data
-        response = requests.post(
-            media_endpoint, 
-            headers=headers,
-            files={'file': (filename, file.stream, file.mimetype)},
-            auth=auth,
-            timeout=30
-        )
-        
-        print(f"WP Media API Response Status: {response.status_code}")
-        print(f"WP Media API Response Body: {response.text}")
-
-        if not response.ok:
-            error_data = response.json() if response.content else {"error": "No response content"}
-            print(f"Error uploading media: {error_data}")
-            return jsonify({"error": f"Error al subir el archivo: {error_data.get('message', 'Error desconocido')}"}), response.status_code
-
-        uploaded_image_data = response.json()
-        
-        # Comprobar si la subida falló silenciosamente
-        if not uploaded_image_data.get('id'):
-            error_msg = uploaded_image_data.get('message', 'WordPress returned null data after upload.')
-            print(f"ERROR: Silent failure from WordPress: {error_msg}")
-            return jsonify({"error": error_msg}), 500
-
-        print(f"Successfully uploaded media: ID {uploaded_image_data.get('id')}")
-        
-        return jsonify(uploaded_image_data), 201
-        
+        media = upload_file_storage(request.files['file'], alt_text=request.form.get('alt_text', ''),
+                                     optimize=optimize_requested(), dedupe=dedupe_requested())
+        return jsonify(media), 200 if media.get('deduplicated') else 201
+    except MediaUploadError as e:
+        return jsonify({"error": e.message}), e.status
     except Exception as e:
         print(f"Error uploading media: {e}")
         return jsonify({"error": "Error al subir el archivo"}), 500
@@ -906,6 +857,77 @@ def get_comment_counts():
         print(f"Error getting comment counts: {e}")
         return jsonify({"error": "Error al obtener los contadores de comentarios"}), 500
 
+# Mapear acciones a estados de WordPress
+COMMENT_ACTION_MAPPING = {
+    'approve': 'approved',
+    'hold': 'hold',
+    'spam': 'spam',
+    'trash': 'trash'
+}
+
+def apply_comment_action(wp_api, comment_id, action):
+    """
+    Aplica una acción a un comentario. Devuelve la entrada de 'results' para
+    /blog/comments/bulk, o None si la acción no existe.
+    """
+    try:
+        if action == 'delete':
+            # Eliminar permanentemente
+            response = wp_api.delete(f'comments/{comment_id}', params={'force': True})
+        else:
+            # Cambiar estado
+            if action not in COMMENT_ACTION_MAPPING:
+                return None
+            
+            wp_comment_data = {
+                'status': COMMENT_ACTION_MAPPING[action]
+            }
+            
+            response = wp_api.put(f'comments/{comment_id}', wp_comment_data)
+        
+        return {
+            'comment_id': comment_id,
+            'success': True,
+            'data': response.json()
+        }
+        
+    except Exception as e:
+        print(f"Error processing comment {comment_id}: {e}")
+        return {
+            'comment_id': comment_id,
+            'success': False,
+            'error': str(e)
+        }
+
+@job_handler('blog.comments_bulk')
+def bulk_update_comments_job(job):
+    """
+    Aplica la acción del trabajo a cada comentario, guardando el avance cada pocos.
+    """
+    comment_ids = job.payload['comment_ids']
+    action = job.payload['action']
+    wp_api = get_wp_api()
+    
+    outcomes = run_in_chunks(job, comment_ids, 10, lambda chunk: [
+        apply_comment_action(wp_api, comment_id, action) for comment_id in chunk
+    ])
+    results = [outcome for outcome in outcomes if outcome is not None]
+    errors = []
+    for comment_id, outcome in zip(comment_ids, outcomes):
+        if outcome is None:
+            errors.append(f"Acción desconocida: {action}")
+        elif not outcome['success']:
+            errors.append(f"Error en comentario {comment_id}: {outcome['error']}")
+    
+    return {
+        'success': True,
+        'processed': len(comment_ids),
+        'successful': len([r for r in results if r['success']]),
+        'failed': len([r for r in results if not r['success']]),
+        'results': results,
+        'errors': errors
+    }
+
 @blog_bp.route('/blog/comments/bulk', methods=['POST'])
 def bulk_update_comments():
     """
@@ -925,59 +947,11 @@ def bulk_update_comments():
         if not action:
             return jsonify({"error": "No se proporcionó una acción"}), 400
         
-        wp_api = get_wp_api()
-        results = []
-        errors = []
-        
-        # Mapear acciones a estados de WordPress
-        action_mapping = {
-            'approve': 'approved',
-            'hold': 'hold',
-            'spam': 'spam',
-            'trash': 'trash'
-        }
-        
-        for comment_id in comment_ids:
-            try:
-                if action == 'delete':
-                    # Eliminar permanentemente
-                    response = wp_api.delete(f'comments/{comment_id}', params={'force': True})
-                else:
-                    # Cambiar estado
-                    if action not in action_mapping:
-                        errors.append(f"Acción desconocida: {action}")
-                        continue
-                    
-                    wp_comment_data = {
-                        'status': action_mapping[action]
-                    }
-                    
-                    response = wp_api.put(f'comments/{comment_id}', wp_comment_data)
-                
-                result = response.json()
-                results.append({
-                    'comment_id': comment_id,
-                    'success': True,
-                    'data': result
-                })
-                
-            except Exception as e:
-                print(f"Error processing comment {comment_id}: {e}")
-                errors.append(f"Error en comentario {comment_id}: {str(e)}")
-                results.append({
-                    'comment_id': comment_id,
-                    'success': False,
-                    'error': str(e)
-                })
-        
-        return jsonify({
-            'success': True,
-            'processed': len(comment_ids),
-            'successful': len([r for r in results if r['success']]),
-            'failed': len([r for r in results if not r['success']]),
-            'results': results,
-            'errors': errors
-        })
+        # Se ejecuta como trabajo en segundo plano (ver /api/jobs/<id>)
+        return respond_with_job('blog.comments_bulk', {
+            'comment_ids': comment_ids,
+            'action': action
+        }, total=len(comment_ids))
         
     except Exception as e:
         print(f"Error in bulk update: {e}")
@@ -1053,11 +1027,119 @@ def clean_json_response(content):
     
     return cleaned_content.strip()
 
+def parse_generated_json(content):
+    """
+    Parsea el JSON generado por OpenAI, limpiando las vallas ``` si hace falta.
+    Devuelve None si no es JSON válido.
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        try:
+            return json.loads(clean_json_response(content) or '')
+        except json.JSONDecodeError:
+            return None
+
+def wants_event_stream(data):
+    """
+    Modo streaming: "stream": true en el JSON, ?stream=1 o Accept: text/event-stream.
+    """
+    return (
+        (isinstance(data, dict) and data.get('stream') is True)
+        or request.args.get('stream', '').lower() in ('1', 'true')
+        or 'text/event-stream' in request.headers.get('Accept', '')
+    )
+
+def generation_cache_key(kind, openai_payload):
+    """
+    Clave de caché de una generación: modelo, parámetros y prompts con los
+    espacios normalizados (los prompts ya incluyen palabras clave, audiencia, etc.).
+    """
+    return cache_key(kind, payload={
+        **openai_payload,
+        'messages': [
+            {'role': message['role'], 'content': normalize_text(message['content'])}
+            for message in openai_payload['messages']
+        ]
+    })
+
+def cached_generation_events(generated_json):
+    """
+    Eventos 'item' y 'field' de un JSON ya generado, en el mismo orden que en streaming.
+    """
+    for name, value in generated_json.items():
+        if isinstance(value, list):
+            for index, item in enumerate(value):
+                yield sse_event('item', {'field': name, 'index': index, 'value': item})
+        yield sse_event('field', {'name': name, 'value': value})
+
+def stream_generated_json(openai_payload, build_result, format_error, cache_kind, cache_key, cached=None):
+    """
+    Reenvía por Server-Sent Events la respuesta de OpenAI mientras se genera.
+    
+    Eventos: 'token' ({text}) por cada fragmento, 'field' ({name, value}) al
+    completarse cada campo del JSON, 'item' ({field, index, value}) por cada
+    elemento de un array (p. ej. cada idea), y al final 'done' con el mismo cuerpo
+    que la respuesta sin streaming, o 'error'.
+    
+    Con `cached` (entrada de la caché de generaciones) se emiten los campos y
+    'done' al momento, sin llamar a OpenAI.
+    """
+    def events():
+        if cached is not None:
+            yield from cached_generation_events(cached['generated'])
+            yield sse_event('done', {**build_result(cached['generated'], cached['summary']), 'cached': True})
+            return
+        
+        parser = IncrementalJSONObject()
+        parts = []
+        summary = {}
+        try:
+            for piece in stream_chat_completion(openai_payload, timeout=(10, Config.OPENAI_STREAM_TIMEOUT)):
+                if isinstance(piece, dict):
+                    summary = piece
+                    break
+                parts.append(piece)
+                yield sse_event('token', {'text': piece})
+                for event in parser.feed(piece):
+                    if event[0] == 'field':
+                        yield sse_event('field', {'name': event[1], 'value': event[2]})
+                    else:
+                        yield sse_event('item', {'field': event[1], 'index': event[2], 'value': event[3]})
+            
+            generated_json = parse_generated_json(''.join(parts))
+            if generated_json is None:
+                print(f"Error parseando JSON generado en streaming: {''.join(parts)[:500]}...")
+                yield sse_event('error', {'error': format_error})
+                return
+            summary = {'model': summary.get('model'), 'usage': summary.get('usage', {})}
+            cached_store(cache_kind, cache_key, {'generated': generated_json, 'summary': summary})
+            yield sse_event('done', {**build_result(generated_json, summary), 'cached': False})
+            
+        except requests.exceptions.Timeout:
+            yield sse_event('error', {'error': "Timeout esperando a OpenAI. Intenta de nuevo."})
+        except requests.exceptions.RequestException as e:
+            print(f"Error de conexión con OpenAI: {e}")
+            yield sse_event('error', {'error': "Error de conexión con OpenAI API"})
+        except Exception as e:
+            # La respuesta ya empezó: un error sin capturar cortaría el stream sin 'error' ni 'done'
+            print(f"Error generando JSON en streaming: {e}")
+            yield sse_event('error', {'error': format_error})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @blog_bp.route('/blog/ai/generate-content', methods=['POST'])
 def generate_ai_content():
     """
     Genera contenido para artículos de blog usando OpenAI GPT.
     Especializado en santería yoruba con enfoque SEO.
+    
+    Con "stream": true responde con Server-Sent Events (ver stream_generated_json).
+    Las peticiones repetidas se sirven de la caché de generaciones salvo con
+    "forceRegenerate": true.
     """
     try:
         # Verificar que la API key de OpenAI esté configurada
@@ -1070,9 +1152,9 @@ def generate_ai_content():
             return jsonify({"error": "No se proporcionaron datos"}), 400
         
         # Extraer parámetros
-        selected_idea = data.get('selectedIdea', '')
-        additional_context = data.get('additionalContext', '')
-        keywords = data.get('keywords', [])
+        selected_idea = normalize_text(data.get('selectedIdea', ''))
+        additional_context = normalize_text(data.get('additionalContext', ''))
+        keywords = normalize_terms(data.get('keywords', []))
         target_audience = data.get('targetAudience', 'principiante')
         article_length = data.get('articleLength', 'mediano')
         image_prompts = data.get('imagePrompts', [])
@@ -1167,9 +1249,29 @@ Responde ÚNICAMENTE con el JSON, sin texto adicional.
         print(f"Palabras clave: {keywords}")
         print(f"Imágenes subidas: {len(uploaded_images)}")
         
+        def build_result(content_json, summary):
+            return {
+                'success': True,
+                'content': json.dumps(content_json),
+                'usage': summary.get('usage', {}),
+                'model': summary.get('model') or Config.OPENAI_MODEL
+            }
+        
+        key = generation_cache_key('blog.content', openai_payload)
+        cached = None if force_regenerate_requested(data) else cached_lookup('blog.content', key)
+        
+        if wants_event_stream(data):
+            return stream_generated_json(openai_payload, build_result,
+                                         "El contenido generado no tiene el formato JSON correcto",
+                                         'blog.content', key, cached)
+        
+        if cached is not None:
+            print(f"Contenido servido desde caché para: {selected_idea}")
+            return jsonify({**build_result(cached['generated'], cached['summary']), 'cached': True})
+        
         # Hacer la llamada a OpenAI
         response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
+            f"{Config.OPENAI_API_URL}/chat/completions",
             headers=headers,
             json=openai_payload,
             timeout=60  # Timeout de 60 segundos
@@ -1186,39 +1288,17 @@ Responde ÚNICAMENTE con el JSON, sin texto adicional.
         if not generated_content:
             return jsonify({"error": "No se pudo generar contenido"}), 500
         
-        # Intentar parsear el JSON generado
-        try:
-            content_json = json.loads(generated_content)
-            
-            print(f"Contenido generado exitosamente para: {selected_idea}")
-            
-            return jsonify({
-                'success': True,
-                'content': json.dumps(content_json),
-                'usage': openai_response.get('usage', {}),
-                'model': openai_response.get('model', Config.OPENAI_MODEL)
-            })
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parseando JSON generado: {e}")
-            print(f"Contenido generado: {generated_content[:500]}...")
-            
-            # Intentar limpiar el JSON usando la función helper
-            cleaned_content = clean_json_response(generated_content)
-            
-            try:
-                content_json = json.loads(cleaned_content)
-                print(f"JSON limpiado exitosamente para: {selected_idea}")
-                return jsonify({
-                    'success': True,
-                    'content': json.dumps(content_json),
-                    'usage': openai_response.get('usage', {}),
-                    'model': openai_response.get('model', Config.OPENAI_MODEL)
-                })
-            except json.JSONDecodeError as e2:
-                print(f"Error parseando JSON limpiado: {e2}")
-                print(f"Contenido limpiado: {cleaned_content[:500]}...")
-                return jsonify({"error": "El contenido generado no tiene el formato JSON correcto"}), 500
+        # Parsear el JSON generado (limpiando las vallas ``` si hace falta)
+        content_json = parse_generated_json(generated_content)
+        if content_json is None:
+            print(f"Error parseando JSON generado: {generated_content[:500]}...")
+            return jsonify({"error": "El contenido generado no tiene el formato JSON correcto"}), 500
+        
+        print(f"Contenido generado exitosamente para: {selected_idea}")
+        
+        summary = {'model': openai_response.get('model', Config.OPENAI_MODEL), 'usage': openai_response.get('usage', {})}
+        cached_store('blog.content', key, {'generated': content_json, 'summary': summary})
+        return jsonify({**build_result(content_json, summary), 'cached': False})
         
     except requests.exceptions.Timeout:
         return jsonify({"error": "Timeout al generar contenido. Intenta de nuevo."}), 500
@@ -1233,6 +1313,10 @@ Responde ÚNICAMENTE con el JSON, sin texto adicional.
 def generate_ai_ideas():
     """
     Genera nuevas ideas para artículos de santería yoruba usando OpenAI.
+    
+    Con "stream": true responde con Server-Sent Events; cada idea llega como evento 'item'.
+    Las peticiones repetidas se sirven de la caché de generaciones salvo con
+    "forceRegenerate": true.
     """
     try:
         # Verificar que la API key de OpenAI esté configurada
@@ -1241,7 +1325,7 @@ def generate_ai_ideas():
         
         # Obtener parámetros opcionales
         data = request.get_json() or {}
-        focus_area = data.get('focusArea', '')
+        focus_area = normalize_text(data.get('focusArea', ''))
         audience_level = data.get('audienceLevel', 'todos')
         
         # Construir el prompt para generar ideas
@@ -1309,9 +1393,29 @@ Responde ÚNICAMENTE con un JSON en este formato:
         
         print(f"Generando nuevas ideas de artículos...")
         
+        def build_result(ideas_json, summary):
+            return {
+                'success': True,
+                'ideas': ideas_json.get('ideas', []),
+                'usage': summary.get('usage', {}),
+                'model': summary.get('model') or Config.OPENAI_MODEL
+            }
+        
+        key = generation_cache_key('blog.ideas', openai_payload)
+        cached = None if force_regenerate_requested(data) else cached_lookup('blog.ideas', key)
+        
+        if wants_event_stream(data):
+            return stream_generated_json(openai_payload, build_result,
+                                         "Las ideas generadas no tienen el formato correcto",
+                                         'blog.ideas', key, cached)
+        
+        if cached is not None:
+            print("Ideas servidas desde caché")
+            return jsonify({**build_result(cached['generated'], cached['summary']), 'cached': True})
+        
         # Hacer la llamada a OpenAI
         response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
+            f"{Config.OPENAI_API_URL}/chat/completions",
             headers=headers,
             json=openai_payload,
             timeout=30
@@ -1328,39 +1432,17 @@ Responde ÚNICAMENTE con un JSON en este formato:
         if not generated_content:
             return jsonify({"error": "No se pudieron generar ideas"}), 500
         
-        # Intentar parsear el JSON generado
-        try:
-            ideas_json = json.loads(generated_content)
-            
-            print(f"Ideas generadas exitosamente: {len(ideas_json.get('ideas', []))}")
-            
-            return jsonify({
-                'success': True,
-                'ideas': ideas_json.get('ideas', []),
-                'usage': openai_response.get('usage', {}),
-                'model': openai_response.get('model', Config.OPENAI_MODEL)
-            })
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parseando JSON de ideas: {e}")
-            print(f"Contenido generado: {generated_content[:500]}...")
-            
-            # Intentar limpiar el JSON usando la función helper
-            cleaned_content = clean_json_response(generated_content)
-            
-            try:
-                ideas_json = json.loads(cleaned_content)
-                print(f"JSON de ideas limpiado exitosamente: {len(ideas_json.get('ideas', []))}")
-                return jsonify({
-                    'success': True,
-                    'ideas': ideas_json.get('ideas', []),
-                    'usage': openai_response.get('usage', {}),
-                    'model': openai_response.get('model', Config.OPENAI_MODEL)
-                })
-            except json.JSONDecodeError as e2:
-                print(f"Error parseando JSON de ideas limpiado: {e2}")
-                print(f"Contenido limpiado: {cleaned_content[:500]}...")
-                return jsonify({"error": "Las ideas generadas no tienen el formato correcto"}), 500
+        # Parsear el JSON generado (limpiando las vallas ``` si hace falta)
+        ideas_json = parse_generated_json(generated_content)
+        if ideas_json is None:
+            print(f"Error parseando JSON de ideas: {generated_content[:500]}...")
+            return jsonify({"error": "Las ideas generadas no tienen el formato correcto"}), 500
+        
+        print(f"Ideas generadas exitosamente: {len(ideas_json.get('ideas', []))}")
+        
+        summary = {'model': openai_response.get('model', Config.OPENAI_MODEL), 'usage': openai_response.get('usage', {})}
+        cached_store('blog.ideas', key, {'generated': ideas_json, 'summary': summary})
+        return jsonify({**build_result(ideas_json, summary), 'cached': False})
         
     except requests.exceptions.Timeout:
         return jsonify({"error": "Timeout al generar ideas. Intenta de nuevo."}), 500
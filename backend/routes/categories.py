@@ -1,8 +1,41 @@
 from flask import Blueprint, jsonify, request
+from config import Config
 from utils.woocommerce_api import get_wc_api
+from utils.jobs import job_handler, run_in_chunks, respond_with_job
+from utils.wc_batch import run_batch, BATCH_SIZE
+from utils.catalog_cache import CATEGORIES, UpstreamError, cached_wc_get, invalidate_catalog
+from utils.category_tree import get_category_tree
 
 categories_bp = Blueprint('categories_bp', __name__)
 
+def parent_category_exists(parent_id):
+    """
+    Comprueba la categoría padre con el árbol en caché. Si no aparece (p. ej. se
+    creó desde wp-admin sin webhook) se confirma con WooCommerce antes de rechazarla.
+    """
+    if parent_id in get_category_tree():
+        return True
+    response = get_wc_api().get(f"products/categories/{parent_id}")
+    if response.status_code != 200:
+        return False
+    invalidate_catalog(CATEGORIES)
+    return True
+
+def category_delete_error(tree, category_id, deleting=()):
+    """
+    Motivo por el que no se puede eliminar una categoría, o None. Las
+    subcategorías incluidas en `deleting` no impiden el borrado.
+    """
+    category = tree.get(category_id)
+    if category is None:
+        return "La categoría no existe"
+    subcategories = [child for child in tree.child_ids(category_id) if child not in deleting]
+    if subcategories:
+        return f"tiene {len(subcategories)} subcategorías"
+    if category.get('count', 0) > 0:
+        return f"contiene {category['count']} productos"
+    return None
+
 @categories_bp.route('/categories', methods=['GET'])
 def get_categories():
     """
@@ -33,9 +66,7 @@ def get_categories():
         if parent is not None:
             params["parent"] = parent
             
-        wc_api = get_wc_api()
-        response = wc_api.get("products/categories", params=params)
-        categories = response.json()
+        categories, headers = cached_wc_get(CATEGORIES, "products/categories", params)
         
         # Añadir información de paginación en los headers si está disponible
         result = {
@@ -43,8 +74,8 @@ def get_categories():
             "pagination": {
                 "page": page,
                 "per_page": per_page,
-                "total": response.headers.get('X-WP-Total', len(categories)),
-                "total_pages": response.headers.get('X-WP-TotalPages', 1)
+                "total": headers.get('X-WP-Total', len(categories)),
+                "total_pages": headers.get('X-WP-TotalPages', 1)
             }
         }
         
@@ -53,6 +84,8 @@ def get_categories():
             return jsonify(categories)
             
         return jsonify(result)
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
@@ -89,12 +122,10 @@ def create_category():
             category_data['slug'] = slug
             print(f"Slug generado automáticamente: '{slug}' para la categoría: '{category_data['name']}'")
         
-        # Validar categoría padre si se especifica
+        # Validar categoría padre si se especifica (árbol en caché)
         if category_data.get('parent') and category_data['parent'] != 0:
-            wc_api = get_wc_api()
             try:
-                parent_response = wc_api.get(f"products/categories/{category_data['parent']}")
-                if parent_response.status_code != 200:
+                if not parent_category_exists(category_data['parent']):
                     return jsonify({"error": "La categoría padre especificada no existe"}), 400
             except Exception:
                 return jsonify({"error": "Error al validar la categoría padre"}), 400
@@ -113,6 +144,8 @@ def create_category():
                 pass
             return jsonify({"error": error_message}), response.status_code
         
+        invalidate_catalog(CATEGORIES)
+        
         # Verificar si la respuesta tiene contenido
         if response.text.strip():
             new_category = response.json()
@@ -151,12 +184,12 @@ def update_category(category_id):
         if category_data.get('parent') and category_data['parent'] != 0:
             if category_data['parent'] == category_id:
                 return jsonify({"error": "Una categoría no puede ser padre de sí misma"}), 400
-                
-            wc_api = get_wc_api()
+            
             try:
-                parent_response = wc_api.get(f"products/categories/{category_data['parent']}")
-                if parent_response.status_code != 200:
+                if not parent_category_exists(category_data['parent']):
                     return jsonify({"error": "La categoría padre especificada no existe"}), 400
+                if get_category_tree().creates_cycle(category_id, category_data['parent']):
+                    return jsonify({"error": "La categoría padre no puede ser una subcategoría de esta categoría"}), 400
             except Exception:
                 return jsonify({"error": "Error al validar la categoría padre"}), 400
 
@@ -174,6 +207,8 @@ def update_category(category_id):
                 pass
             return jsonify({"error": error_message}), response.status_code
         
+        invalidate_catalog(CATEGORIES)
+        
         # Verificar si la respuesta tiene contenido
         if response.text.strip():
             updated_category = response.json()
@@ -206,22 +241,31 @@ def delete_category(category_id):
     try:
         wc_api = get_wc_api()
         
-        # Verificar si la categoría tiene subcategorías
-        subcategories = wc_api.get("products/categories", params={"parent": category_id}).json()
+        # Verificar subcategorías y productos con el árbol en caché (sin datos de más de CATALOG_CACHE_TTL)
+        tree = get_category_tree(allow_stale=False)
+        if category_id not in tree:
+            # Puede ser nueva (creada desde wp-admin sin webhook): se recarga el árbol
+            # antes de decidir, nunca se borra sin comprobarla
+            invalidate_catalog(CATEGORIES)
+            tree = get_category_tree(allow_stale=False)
+        category = tree.get(category_id)
+        if category is None:
+            return jsonify({"error": "La categoría no existe"}), 404
+        
+        subcategories = tree.child_ids(category_id)
         if subcategories:
             return jsonify({
                 "error": f"No se puede eliminar la categoría porque tiene {len(subcategories)} subcategorías. Elimina o reasigna las subcategorías primero."
             }), 400
         
-        # Verificar si la categoría tiene productos
-        category_info = wc_api.get(f"products/categories/{category_id}").json()
-        if category_info.get('count', 0) > 0:
+        if category.get('count', 0) > 0:
             return jsonify({
-                "error": f"No se puede eliminar la categoría porque contiene {category_info['count']} productos. Reasigna los productos a otra categoría primero."
+                "error": f"No se puede eliminar la categoría porque contiene {category['count']} productos. Reasigna los productos a otra categoría primero."
             }), 400
         
         # Eliminar la categoría
         deleted_category = wc_api.delete(f"products/categories/{category_id}", params={"force": True}).json()
+        invalidate_catalog(CATEGORIES)
         return jsonify(deleted_category)
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
@@ -235,15 +279,78 @@ def get_category(category_id):
     Obtiene una categoría específica por su ID.
     """
     try:
-        wc_api = get_wc_api()
-        category = wc_api.get(f"products/categories/{category_id}").json()
+        category, _ = cached_wc_get(CATEGORIES, f"products/categories/{category_id}")
         return jsonify(category)
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
         print(f"Error al obtener la categoría {category_id}: {e}")
         return jsonify({"error": "Ocurrió un error interno"}), 500
 
+def plan_bulk_category_delete(tree, category_ids):
+    """
+    Decide con el árbol de categorías qué categorías se pueden eliminar, sin
+    peticiones por id. Una categoría cuyas subcategorías también se eliminan en la
+    misma operación se puede borrar; las hijas van primero.
+
+    Devuelve (ids a eliminar en orden, errores).
+    """
+    errors = []
+    deletable = set()
+    # De las más profundas a las raíces: cada una sabe ya si sus hijas se pueden borrar
+    known = sorted({category_id for category_id in category_ids if category_id in tree},
+                   key=tree.depth, reverse=True)
+    for category_id in known:
+        error = category_delete_error(tree, category_id, deletable)
+        if error:
+            errors.append(f"Categoría {category_id}: {error}")
+        else:
+            deletable.add(category_id)
+    errors.extend(f"Categoría {category_id}: La categoría no existe"
+                  for category_id in dict.fromkeys(category_ids) if category_id not in tree)
+    return [category_id for category_id in known if category_id in deletable], errors
+
+@job_handler('categories.bulk_delete')
+def bulk_delete_categories_job(job):
+    """
+    Elimina las categorías vacías del trabajo a través de products/categories/batch,
+    en lotes de 100 y guardando el avance tras cada grupo de lotes.
+
+    El plan de borrado se calcula al encolar, así un trabajo reanudado tras un
+    reinicio sigue con la misma lista.
+    """
+    category_ids = job.payload['ids']
+    wc_api = get_wc_api()
+    if 'delete_order' in job.payload:
+        to_delete, errors = job.payload['delete_order'], list(job.payload['errors'])
+    else:
+        to_delete, errors = plan_bulk_category_delete(get_category_tree(allow_stale=False), category_ids)
+    
+    def delete_chunk(chunk):
+        return [
+            {"id": category_id, "status": "deleted", "data": deleted} if error is None
+            else {"error": f"Categoría {category_id}: {error}"}
+            for category_id, (deleted, error) in zip(chunk, run_batch(wc_api, "products/categories/batch", "delete", chunk))
+        ]
+    
+    outcomes = run_in_chunks(job, to_delete, BATCH_SIZE * Config.WC_BATCH_CONCURRENCY, delete_chunk)
+    results = [outcome for outcome in outcomes if 'error' not in outcome]
+    errors.extend(outcome['error'] for outcome in outcomes if 'error' in outcome)
+    if results:
+        invalidate_catalog(CATEGORIES)
+    
+    return {
+        "deleted": results,
+        "errors": errors,
+        "summary": {
+            "total_requested": len(category_ids),
+            "deleted": len(results),
+            "errors": len(errors)
+        }
+    }
+
 @categories_bp.route('/categories/bulk', methods=['DELETE'])
 def bulk_delete_categories():
     """
@@ -258,39 +365,14 @@ def bulk_delete_categories():
         if not isinstance(category_ids, list) or not category_ids:
             return jsonify({"error": "La lista de IDs debe ser un array no vacío"}), 400
         
-        wc_api = get_wc_api()
-        results = []
-        errors = []
-        
-        for category_id in category_ids:
-            try:
-                # Verificar subcategorías y productos antes de eliminar
-                subcategories = wc_api.get("products/categories", params={"parent": category_id}).json()
-                if subcategories:
-                    errors.append(f"Categoría {category_id}: tiene {len(subcategories)} subcategorías")
-                    continue
-                
-                category_info = wc_api.get(f"products/categories/{category_id}").json()
-                if category_info.get('count', 0) > 0:
-                    errors.append(f"Categoría {category_id}: contiene {category_info['count']} productos")
-                    continue
-                
-                # Eliminar la categoría
-                deleted = wc_api.delete(f"products/categories/{category_id}", params={"force": True}).json()
-                results.append({"id": category_id, "status": "deleted", "data": deleted})
-                
-            except Exception as e:
-                errors.append(f"Categoría {category_id}: {str(e)}")
-        
-        return jsonify({
-            "deleted": results,
-            "errors": errors,
-            "summary": {
-                "total_requested": len(category_ids),
-                "deleted": len(results),
-                "errors": len(errors)
-            }
-        })
+        # Las comprobaciones se hacen aquí con el árbol de categorías; el borrado se
+        # ejecuta como trabajo en segundo plano (ver /api/jobs/<id>)
+        to_delete, errors = plan_bulk_category_delete(get_category_tree(allow_stale=False), category_ids)
+        return respond_with_job('categories.bulk_delete', {
+            'ids': category_ids,
+            'delete_order': to_delete,
+            'errors': errors
+        }, total=len(to_delete))
         
     except Exception as e:
         print(f"Error en eliminación masiva: {e}")
@@ -300,37 +382,34 @@ def bulk_delete_categories():
 def get_categories_hierarchy():
     """
     Obtiene las categorías organizadas en estructura jerárquica.
+
+    Incluye todas las páginas de categorías; cada nodo lleva 'level', 'path'
+    (ids de sus ancestros), 'subtree_count' (productos del subárbol) y 'children'.
     """
     try:
-        wc_api = get_wc_api()
-        
-        # Obtener todas las categorías
-        all_categories = wc_api.get("products/categories", params={
-            "per_page": 100,
-            "orderby": "menu_order",
-            "order": "asc"
-        }).json()
-        
-        # Construir estructura jerárquica
-        def build_hierarchy(categories, parent_id=0, level=0):
-            hierarchy = []
-            for category in categories:
-                if category['parent'] == parent_id:
-                    category_with_children = {
-                        **category,
-                        'level': level,
-                        'children': build_hierarchy(categories, category['id'], level + 1)
-                    }
-                    hierarchy.append(category_with_children)
-            return hierarchy
-        
-        hierarchy = build_hierarchy(all_categories)
-        
+        tree = get_category_tree()
         return jsonify({
-            "hierarchy": hierarchy,
-            "total_categories": len(all_categories)
+            "hierarchy": tree.hierarchy(),
+            "total_categories": len(tree)
         })
-        
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
     except Exception as e:
         print(f"Error al obtener jerarquía de categorías: {e}")
-        return jsonify({"error": "Ocurrió un error interno"}), 500 
\ No newline at end of file
+        return jsonify({"error": "Ocurrió un error interno"}), 500
+
+@categories_bp.route('/categories/<int:category_id>/breadcrumb', methods=['GET'])
+def get_category_breadcrumb(category_id):
+    """
+    Devuelve la ruta de categorías desde la raíz hasta la indicada.
+    """
+    try:
+        breadcrumb = get_category_tree().breadcrumb(category_id)
+        if breadcrumb is None:
+            return jsonify({"error": "Categoría no encontrada"}), 404
+        return jsonify({"breadcrumb": breadcrumb, "depth": len(breadcrumb) - 1})
+    except UpstreamError as e:
+        return jsonify(e.data), e.status
+    except Exception as e:
+        print(f"Error al obtener la ruta de la categoría {category_id}: {e}")
+        return jsonify({"error": "Ocurrió un error interno"}), 500
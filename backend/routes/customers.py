@@ -1,5 +1,9 @@
+from itertools import chain, islice
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.order_store import get_order_store, get_ready_order_store
+from utils.order_sync import iter_order_pages
+from utils.api_helpers import build_guest_customers
 import logging
 
 customers_bp = Blueprint('customers_bp', __name__)
@@ -8,6 +12,10 @@ customers_bp = Blueprint('customers_bp', __name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sin réplica local, páginas de pedidos de invitados (100 por página, los más
+# recientes primero) que se leen como máximo en cada petición
+LIVE_GUEST_ORDER_PAGES = 5
+
 def calculate_customer_stats(wc_api, customer_id):
     """
     Calcula las estadísticas de pedidos para un cliente específico.
@@ -58,6 +66,89 @@ def calculate_customer_stats(wc_api, customer_id):
             'last_order_date': None
         }
 
+def mirror_customer(customer=None, deleted_id=None):
+    """
+    Refleja en el directorio de clientes un cliente creado, actualizado o eliminado por nosotros.
+    """
+    try:
+        store = get_order_store()
+        if deleted_id is not None:
+            store.delete_customer(deleted_id)
+        elif isinstance(customer, dict) and customer.get('id'):
+            store.upsert_customers([customer])
+    except Exception as e:
+        logger.warning(f"Could not update local customer directory: {e}")
+
+def customer_search_result(customer):
+    """
+    Formato de un cliente en los resultados de /customers/search.
+    """
+    return {
+        'id': customer.get('id'),
+        'first_name': customer.get('first_name', ''),
+        'last_name': customer.get('last_name', ''),
+        'name': f"{customer.get('first_name', '') or ''} {customer.get('last_name', '') or ''}".strip(),
+        'email': customer.get('email', ''),
+        'username': customer.get('username', ''),
+        'date_created': customer.get('date_created'),
+        'orders_count': customer.get('orders_count', 0),
+        'total_spent': float(customer.get('total_spent', 0.0) or 0),
+        'avatar_url': customer.get('avatar_url', ''),
+        'billing': customer.get('billing', {}),
+        'shipping': customer.get('shipping', {}),
+        'role': customer.get('role', 'customer')
+    }
+
+def get_guest_customers(wc_api, registered_customers, include_links=True):
+    """
+    Clientes invitados (agrupados por email de sus pedidos), sin los emails de
+    clientes registrados con rol 'customer'.
+
+    Con la réplica local sincronizada salen del directorio de clientes, que ya
+    los mantiene al guardar cada pedido; si no, se calculan con las
+    LIVE_GUEST_ORDER_PAGES páginas más recientes de pedidos de invitados.
+    """
+    store = get_ready_order_store()
+    if not store:
+        pages = islice(iter_order_pages(wc_api, {'customer': 0, 'orderby': 'date', 'order': 'desc'}),
+                       LIVE_GUEST_ORDER_PAGES)
+        return build_guest_customers(chain.from_iterable(pages), registered_customers, include_links)
+
+    registered_emails = {
+        (customer.get('email') or '').strip().lower()
+        for customer in registered_customers
+        if customer.get('role') == 'customer'
+    }
+    guests = []
+    for guest in store.guest_customers():
+        email_addr = (guest.get('email') or '').strip().lower()
+        if email_addr in registered_emails:
+            continue
+        if include_links:
+            guest['_links'] = {'self': [{'href': f'guest_customer_{email_addr}'}]}
+        guests.append(guest)
+    return guests
+
+def attach_order_stats(wc_api, customers):
+    """
+    Añade orders_count, total_spent y last_order_date a cada cliente registrado.
+
+    Con la réplica local sincronizada basta una consulta a la tabla de agregados
+    para toda la página; si no, se calcula en vivo cliente por cliente.
+    """
+    store = get_ready_order_store()
+    if store:
+        stats_by_customer = store.customer_stats(c.get('id') for c in customers)
+        for customer in customers:
+            stats = stats_by_customer.get(customer.get('id'))
+            customer['orders_count'] = stats['orders_count'] if stats else 0
+            customer['total_spent'] = str(stats['total_spent']) if stats else '0'
+            customer['last_order_date'] = stats['last_order_date'] if stats else None
+        return
+
+    for customer in customers:
+        customer.update(calculate_customer_stats(wc_api, customer.get('id')))
+
 @customers_bp.route('/customers', methods=['GET'])
 def get_customers():
     """
@@ -96,103 +187,16 @@ def get_customers():
             registered_customers = response.json() if isinstance(response.json(), list) else []
             
             # Obtener información de pedidos para clientes registrados
-            for customer in registered_customers:
-                try:
-                    # Obtener todos los pedidos del cliente para calcular estadísticas
-                    customer_orders_response = wc_api.get("orders", params={
-                        'customer': customer.get('id'),
-                        'per_page': 100,  # Obtener hasta 100 pedidos para cálculos precisos
-                        'orderby': 'date',
-                        'order': 'desc',
-                        'status': 'any'
-                    })
-                    customer_orders = customer_orders_response.json()
-                    
-                    if customer_orders and isinstance(customer_orders, list):
-                        # Filtrar pedidos válidos (excluir carritos abandonados y fallidos)
-                        valid_orders = [
-                            order for order in customer_orders 
-                            if order.get('status') not in ['checkout-draft', 'failed', 'cancelled']
-                        ]
-                        
-                        # Calcular estadísticas
-                        customer['orders_count'] = len(valid_orders)
-                        customer['total_spent'] = str(sum(
-                            float(order.get('total', 0)) 
-                            for order in valid_orders 
-                            if order.get('status') in ['completed', 'processing']
-                        ))
-                        
-                        # Obtener fecha del último pedido
-                        if valid_orders:
-                            customer['last_order_date'] = valid_orders[0].get('date_created')
-                        else:
-                            customer['last_order_date'] = None
-                    else:
-                        customer['orders_count'] = 0
-                        customer['total_spent'] = '0'
-                        customer['last_order_date'] = None
-                        
-                except Exception as order_error:
-                    logger.warning(f"Error fetching orders for customer {customer.get('id')}: {order_error}")
-                    customer['orders_count'] = 0
-                    customer['total_spent'] = 0
-                    customer['last_order_date'] = None
+            attach_order_stats(wc_api, registered_customers)
                     
         except Exception as e:
             logger.warning(f"Error fetching registered customers: {e}")
         
-        # 2. Obtener clientes invitados de pedidos
+        # 2. Obtener clientes invitados de todos sus pedidos
+        # Si es administrador pero hizo una compra como invitado, lo incluimos como invitado también
         guest_customers = []
         try:
-            # Obtener pedidos para extraer clientes invitados
-            orders_response = wc_api.get("orders", params={'per_page': 100, 'customer': 0})
-            orders = orders_response.json() if isinstance(orders_response.json(), list) else []
-            
-            # Crear diccionario para evitar duplicados por email
-            guest_customers_dict = {}
-            
-            for order in orders:
-                billing = order.get('billing', {})
-                email_addr = billing.get('email', '').strip().lower()
-                
-                if email_addr and email_addr not in guest_customers_dict:
-                    # Verificar que no sea un cliente registrado CON ROL CUSTOMER
-                    # Si es administrador pero hizo una compra como invitado, lo incluimos como invitado también
-                    is_customer = any(c.get('email', '').lower() == email_addr and c.get('role') == 'customer' for c in registered_customers)
-                    
-                    if not is_customer:
-                        # Calcular estadísticas del cliente invitado
-                        customer_orders = [o for o in orders if o.get('billing', {}).get('email', '').lower() == email_addr]
-                        orders_count = len(customer_orders)
-                        total_spent = sum(float(o.get('total', 0)) for o in customer_orders if o.get('status') in ['completed', 'processing'])
-                        
-                        # Ordenar pedidos por fecha para obtener el primero y último
-                        customer_orders_sorted = sorted(customer_orders, key=lambda x: x.get('date_created', ''))
-                        last_order_date = customer_orders_sorted[-1].get('date_created') if customer_orders_sorted else ''
-                        
-                        guest_customer = {
-                            'id': f"guest_{email_addr.replace('@', '_').replace('.', '_')}",  # ID único para invitados
-                            'first_name': billing.get('first_name', ''),
-                            'last_name': billing.get('last_name', ''),
-                            'email': billing.get('email', ''),
-                            'username': '',
-                            'role': 'guest',
-                            'date_created': customer_orders_sorted[0].get('date_created') if customer_orders_sorted else '',
-                            'date_modified': customer_orders_sorted[-1].get('date_modified') if customer_orders_sorted else '',
-                            'last_order_date': last_order_date,
-                            'is_paying_customer': total_spent > 0,
-                            'orders_count': orders_count,
-                            'total_spent': str(total_spent),
-                            'avatar_url': '',
-                            'billing': billing,
-                            'shipping': order.get('shipping', {}),
-                            '_links': {'self': [{'href': f'guest_customer_{email_addr}'}]}
-                        }
-                        guest_customers_dict[email_addr] = guest_customer
-            
-            guest_customers = list(guest_customers_dict.values())
-            
+            guest_customers = get_guest_customers(wc_api, registered_customers)
         except Exception as e:
             logger.warning(f"Error fetching guest customers: {e}")
         
@@ -291,6 +295,7 @@ def create_customer():
         
         if response.status_code == 201:
             logger.info(f"Customer created successfully: {new_customer.get('id')}")
+            mirror_customer(new_customer)
             return jsonify(new_customer), 201
         else:
             logger.error(f"Error creating customer: {new_customer}")
@@ -321,6 +326,7 @@ def update_customer(customer_id):
         
         if response.status_code == 200:
             logger.info(f"Customer updated successfully: {customer_id}")
+            mirror_customer(updated_customer)
             return jsonify(updated_customer)
         else:
             logger.error(f"Error updating customer {customer_id}: {updated_customer}")
@@ -357,6 +363,7 @@ def delete_customer(customer_id):
         if response.status_code == 200:
             action = "eliminado permanentemente" if force else "movido a la papelera"
             logger.info(f"Customer {customer_id} {action}")
+            mirror_customer(deleted_id=customer_id)
             return jsonify(deleted_customer)
         else:
             logger.error(f"Error deleting customer {customer_id}: {deleted_customer}")
@@ -373,10 +380,12 @@ def delete_customer(customer_id):
 def search_customers():
     """
     Busca clientes por diferentes criterios (nombre, email, etc.).
+
+    Con el directorio de clientes de la réplica local sincronizado responde desde
+    su índice (nombre, email, usuario, teléfono y ciudad, sin acentos ni
+    mayúsculas, por prefijo o subcadena). Si no, descarga los clientes y filtra en vivo.
     """
     try:
-        wc_api = get_wc_api()
-        
         # Obtener parámetros de búsqueda
         query = request.args.get('q', '').strip()
         limit = request.args.get('limit', 10, type=int)
@@ -384,7 +393,12 @@ def search_customers():
         if not query:
             return jsonify({"customers": []})
         
-        logger.info(f"Searching customers with query: '{query}'")
+        store = get_ready_order_store()
+        if store and store.customers_ready():
+            customers = store.search_customers(query, limit)
+            return jsonify({"customers": [customer_search_result(c) for c in customers], "source": "local"})
+        
+        wc_api = get_wc_api()
         
         # 1. Obtener clientes registrados
         registered_customers = []
@@ -398,114 +412,25 @@ def search_customers():
             registered_customers = response.json() if isinstance(response.json(), list) else []
             
             # Obtener información de pedidos para clientes registrados
-            for customer in registered_customers:
-                try:
-                    # Obtener todos los pedidos del cliente para calcular estadísticas
-                    customer_orders_response = wc_api.get("orders", params={
-                        'customer': customer.get('id'),
-                        'per_page': 100,  # Obtener hasta 100 pedidos para cálculos precisos
-                        'orderby': 'date',
-                        'order': 'desc',
-                        'status': 'any'
-                    })
-                    customer_orders = customer_orders_response.json()
-                    
-                    if customer_orders and isinstance(customer_orders, list):
-                        # Filtrar pedidos válidos (excluir carritos abandonados y fallidos)
-                        valid_orders = [
-                            order for order in customer_orders 
-                            if order.get('status') not in ['checkout-draft', 'failed', 'cancelled']
-                        ]
-                        
-                        # Calcular estadísticas
-                        customer['orders_count'] = len(valid_orders)
-                        customer['total_spent'] = str(sum(
-                            float(order.get('total', 0)) 
-                            for order in valid_orders 
-                            if order.get('status') in ['completed', 'processing']
-                        ))
-                        
-                        # Obtener fecha del último pedido
-                        if valid_orders:
-                            customer['last_order_date'] = valid_orders[0].get('date_created')
-                        else:
-                            customer['last_order_date'] = None
-                    else:
-                        customer['orders_count'] = 0
-                        customer['total_spent'] = '0'
-                        customer['last_order_date'] = None
-                        
-                except Exception as order_error:
-                    logger.warning(f"Error fetching orders for customer {customer.get('id')}: {order_error}")
-                    customer['orders_count'] = 0
-                    customer['total_spent'] = 0
-                    customer['last_order_date'] = None
+            attach_order_stats(wc_api, registered_customers)
                     
         except Exception as e:
             logger.warning(f"Error fetching registered customers: {e}")
         
-        # 2. Obtener clientes invitados de pedidos
+        # 2. Obtener clientes invitados de todos sus pedidos
         guest_customers = []
         try:
-            orders_response = wc_api.get("orders", params={'per_page': 100, 'customer': 0})
-            orders = orders_response.json() if isinstance(orders_response.json(), list) else []
-            
-            guest_customers_dict = {}
-            
-            for order in orders:
-                billing = order.get('billing', {})
-                email_addr = billing.get('email', '').strip().lower()
-                
-                if email_addr and email_addr not in guest_customers_dict:
-                    # Verificar que no sea un cliente registrado CON ROL CUSTOMER
-                    is_customer = any(c.get('email', '').lower() == email_addr and c.get('role') == 'customer' for c in registered_customers)
-                    
-                    if not is_customer:
-                        customer_orders = [o for o in orders if o.get('billing', {}).get('email', '').lower() == email_addr]
-                        orders_count = len(customer_orders)
-                        total_spent = sum(float(o.get('total', 0)) for o in customer_orders if o.get('status') in ['completed', 'processing'])
-                        
-                        # Ordenar pedidos por fecha para obtener el primero y último
-                        customer_orders_sorted = sorted(customer_orders, key=lambda x: x.get('date_created', ''))
-                        last_order_date = customer_orders_sorted[-1].get('date_created') if customer_orders_sorted else ''
-                        
-                        guest_customer = {
-                            'id': f"guest_{email_addr.replace('@', '_').replace('.', '_')}",
-                            'first_name': billing.get('first_name', ''),
-                            'last_name': billing.get('last_name', ''),
-                            'email': billing.get('email', ''),
-                            'username': '',
-                            'role': 'guest',
-                            'date_created': customer_orders_sorted[0].get('date_created') if customer_orders_sorted else '',
-                            'date_modified': customer_orders_sorted[-1].get('date_modified') if customer_orders_sorted else '',
-                            'last_order_date': last_order_date,
-                            'is_paying_customer': total_spent > 0,
-                            'orders_count': orders_count,
-                            'total_spent': str(total_spent),
-                            'avatar_url': '',
-                            'billing': billing,
-                            'shipping': order.get('shipping', {})
-                        }
-                        guest_customers_dict[email_addr] = guest_customer
-            
-            guest_customers = list(guest_customers_dict.values())
-            
+            guest_customers = get_guest_customers(wc_api, registered_customers, include_links=False)
         except Exception as e:
             logger.warning(f"Error fetching guest customers: {e}")
         
         # 3. Combinar clientes registrados y invitados
         all_customers = registered_customers + guest_customers
         
-        if not isinstance(all_customers, list):
-            logger.error(f"Expected list of customers, got: {type(all_customers)}")
-            return jsonify({"customers": []})
-        
         # 4. Filtrar localmente por nombre, apellido o email
         filtered_customers = []
         query_lower = query.lower()
         
-        logger.info(f"Filtering {len(all_customers)} customers with query_lower: '{query_lower}'")
-        
         for customer in all_customers:
             first_name = (customer.get('first_name', '') or '').lower()
             last_name = (customer.get('last_name', '') or '').lower()
@@ -513,41 +438,19 @@ def search_customers():
             username = (customer.get('username', '') or '').lower()
             full_name = f"{first_name} {last_name}".strip()
             
-            logger.info(f"Checking customer {customer.get('id')}: first_name='{first_name}', last_name='{last_name}', email='{email}', username='{username}', full_name='{full_name}'")
-            
             # Buscar en cualquiera de los campos
             if (query_lower in first_name or 
                 query_lower in last_name or 
                 query_lower in email or 
                 query_lower in username or
                 query_lower in full_name):
-                
-                logger.info(f"MATCH FOUND for customer {customer.get('id')}")
-                
-                # Formatear el cliente para la respuesta
-                filtered_customer = {
-                    'id': customer.get('id'),
-                    'first_name': customer.get('first_name', ''),
-                    'last_name': customer.get('last_name', ''),
-                    'name': f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip(),
-                    'email': customer.get('email', ''),
-                    'username': customer.get('username', ''),
-                    'date_created': customer.get('date_created'),
-                    'orders_count': customer.get('orders_count', 0),
-                    'total_spent': float(customer.get('total_spent', 0.0)),
-                    'avatar_url': customer.get('avatar_url', ''),
-                    'billing': customer.get('billing', {}),
-                    'shipping': customer.get('shipping', {}),
-                    'role': customer.get('role', 'customer')
-                }
-                filtered_customers.append(filtered_customer)
+                filtered_customers.append(customer_search_result(customer))
                 
                 # Limitar resultados
                 if len(filtered_customers) >= limit:
                     break
         
-        logger.info(f"Found {len(filtered_customers)} customers matching '{query}'")
-        return jsonify({"customers": filtered_customers})
+        return jsonify({"customers": filtered_customers, "source": "woocommerce"})
         
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
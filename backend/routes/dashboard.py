@@ -1,5 +1,8 @@
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.fanout import run_parallel
+from utils.order_store import get_ready_order_store
+from config import Config
 from datetime import datetime, timedelta
 import logging
 
@@ -9,6 +12,61 @@ dashboard_bp = Blueprint('dashboard_bp', __name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def fetch_wc(wc_api, endpoint, params):
+    """
+    Devuelve una función que hace un GET a WooCommerce con el timeout del fan-out,
+    para ejecutarla en run_parallel. Los errores HTTP se propagan como excepción y
+    la sección correspondiente queda marcada como degradada.
+    """
+    def fetch():
+        response = wc_api.get(endpoint, params=params, timeout=(Config.WC_CONNECT_TIMEOUT, Config.FANOUT_TIMEOUT))
+        if response.status_code != 200:
+            raise RuntimeError(f"WooCommerce {endpoint} returned {response.status_code}")
+        return response
+    return fetch
+
+
+def header_total(response):
+    return int(response.headers.get('X-WP-Total', 0)) if response is not None else 0
+
+
+def json_list(response):
+    data = response.json() if response is not None else []
+    return data if isinstance(data, list) else []
+
+
+def build_sales_chart(now, months=12):
+    """
+    Ventas (completed/processing) por mes natural de los últimos `months` meses,
+    incluido el actual, leídas de los agregados de la réplica local. Devuelve None
+    si la réplica todavía no está sincronizada.
+    """
+    store = get_ready_order_store()
+    if store is None:
+        return None
+    
+    month_starts = []
+    year, month = now.year, now.month
+    for _ in range(months):
+        month_starts.append(datetime(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    month_starts.reverse()
+    
+    series = store.revenue_series('month', after=month_starts[0].strftime('%Y-%m-%dT%H:%M:%S'))
+    by_period = {point['period']: point for point in series}
+    
+    chart = []
+    for month_start in month_starts:
+        point = by_period.get(month_start.strftime('%Y-%m'), {})
+        chart.append({
+            'month': month_start.strftime('%B %Y'),
+            'revenue': round(point.get('revenue', 0), 2),
+            'orders': point.get('orders', 0)
+        })
+    return chart
+
+
 @dashboard_bp.route('/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
     """
@@ -27,17 +85,39 @@ def get_dashboard_stats():
         after_month = month_ago.strftime('%Y-%m-%dT%H:%M:%S')
         after_year = year_ago.strftime('%Y-%m-%dT%H:%M:%S')
         
-        # 1. Obtener estadísticas de pedidos
-        recent_orders_response = wc_api.get("orders", params={
-            'after': after_month,
-            'per_page': 100,
-            'status': 'any'
+        # 1. Lanzar todas las consultas a WooCommerce en paralelo
+        responses, degraded = run_parallel({
+            'recent_orders': fetch_wc(wc_api, "orders", {
+                'after': after_month,
+                'per_page': 100,
+                'status': 'any'
+            }),
+            'product_totals': fetch_wc(wc_api, "products", {
+                'per_page': 1,
+                'page': 1
+            }),
+            'recent_products': fetch_wc(wc_api, "products", {
+                'per_page': 5,
+                'orderby': 'date',
+                'order': 'desc'
+            }),
+            'customer_totals': fetch_wc(wc_api, "customers", {
+                'per_page': 1,
+                'page': 1
+            }),
+            'recent_customers': fetch_wc(wc_api, "customers", {
+                'per_page': 10,
+                'orderby': 'registered_date',
+                'order': 'desc'
+            })
         })
-        recent_orders = recent_orders_response.json()
         
-        # Filtrar carritos abandonados
-        if isinstance(recent_orders, list):
-            recent_orders = [order for order in recent_orders if order.get('status') != 'checkout-draft']
+        if not responses:
+            logger.error(f"All dashboard sections failed: {degraded}")
+            return jsonify({"error": "WooCommerce no disponible", "degraded": degraded}), 502
+        
+        # 2. Estadísticas de pedidos (sin carritos abandonados)
+        recent_orders = [order for order in json_list(responses.get('recent_orders')) if order.get('status') != 'checkout-draft']
         
         # Calcular estadísticas de pedidos
         total_orders = len(recent_orders)
@@ -55,35 +135,11 @@ def get_dashboard_stats():
         revenue_change = 20.1  # En el futuro, comparar con mes anterior
         orders_change = 180.1
         
-        # 2. Obtener total de productos
-        products_response = wc_api.get("products", params={
-            'per_page': 1,
-            'page': 1
-        })
-        total_products = int(products_response.headers.get('X-WP-Total', 0))
-        
-        # Obtener productos recientes
-        recent_products_response = wc_api.get("products", params={
-            'per_page': 5,
-            'orderby': 'date',
-            'order': 'desc'
-        })
-        recent_products = recent_products_response.json()
-        
-        # 3. Obtener total de clientes
-        customers_response = wc_api.get("customers", params={
-            'per_page': 1,
-            'page': 1
-        })
-        total_customers = int(customers_response.headers.get('X-WP-Total', 0))
-        
-        # Obtener clientes recientes
-        recent_customers_response = wc_api.get("customers", params={
-            'per_page': 10,
-            'orderby': 'registered_date',
-            'order': 'desc'
-        })
-        recent_customers = recent_customers_response.json()
+        # 3. Productos y clientes
+        total_products = header_total(responses.get('product_totals'))
+        recent_products = json_list(responses.get('recent_products'))
+        total_customers = header_total(responses.get('customer_totals'))
+        recent_customers = json_list(responses.get('recent_customers'))
         
         # Contar clientes nuevos del último mes
         new_customers_month = 0
@@ -149,19 +205,11 @@ def get_dashboard_stats():
                     except:
                         pass
         
-        # 5. Obtener datos para el gráfico de ventas (últimos 12 meses)
-        sales_chart_data = []
-        for i in range(12):
-            month_start = now - timedelta(days=30 * (12 - i))
-            month_end = now - timedelta(days=30 * (11 - i))
-            
-            # Por ahora, datos simulados. En el futuro, hacer consultas reales por mes
-            month_revenue = total_revenue * (0.8 + (i * 0.02))  # Crecimiento simulado
-            
-            sales_chart_data.append({
-                'month': month_start.strftime('%B %Y'),
-                'revenue': round(month_revenue, 2)
-            })
+        # 5. Gráfico de ventas de los últimos 12 meses desde los agregados de la réplica
+        sales_chart_data = build_sales_chart(now)
+        if sales_chart_data is None:
+            sales_chart_data = []
+            degraded['sales_chart'] = 'local order store not ready'
         
         # 6. Preparar respuesta final
         stats = {
@@ -185,7 +233,9 @@ def get_dashboard_stats():
                 'change': new_customers_month  # Por ahora
             },
             'recent_activity': recent_activity[:5],  # Máximo 5 items
-            'sales_chart': sales_chart_data
+            'sales_chart': sales_chart_data,
+            # Secciones que fallaron o superaron el timeout: {seccion: motivo}
+            'degraded': degraded
         }
         
         return jsonify(stats)
@@ -206,30 +256,36 @@ def get_quick_stats():
     try:
         wc_api = get_wc_api()
         
-        # Obtener solo conteos básicos
-        orders_response = wc_api.get("orders", params={
-            'per_page': 1,
-            'status': 'any'
-        })
-        
-        products_response = wc_api.get("products", params={
-            'per_page': 1
+        # Obtener solo conteos básicos, en paralelo
+        responses, degraded = run_parallel({
+            'orders': fetch_wc(wc_api, "orders", {
+                'per_page': 1,
+                'status': 'any'
+            }),
+            'products': fetch_wc(wc_api, "products", {
+                'per_page': 1
+            }),
+            'customers': fetch_wc(wc_api, "customers", {
+                'per_page': 1
+            })
         })
         
-        customers_response = wc_api.get("customers", params={
-            'per_page': 1
-        })
+        if not responses:
+            logger.error(f"All quick stats failed: {degraded}")
+            return jsonify({"error": "WooCommerce no disponible", "degraded": degraded}), 502
         
-        # Obtener totales de headers
-        total_orders = int(orders_response.headers.get('X-WP-Total', 0))
-        total_products = int(products_response.headers.get('X-WP-Total', 0))
-        total_customers = int(customers_response.headers.get('X-WP-Total', 0))
+        # Obtener totales de headers (None si la sección está degradada)
+        totals = {
+            name: header_total(responses[name]) if name in responses else None
+            for name in ('orders', 'products', 'customers')
+        }
         
         return jsonify({
-            'orders': total_orders,
-            'products': total_products,
-            'customers': total_customers,
-            'timestamp': datetime.now().isoformat()
+            'orders': totals['orders'],
+            'products': totals['products'],
+            'customers': totals['customers'],
+            'timestamp': datetime.now().isoformat(),
+            'degraded': degraded
         })
         
     except Exception as e:
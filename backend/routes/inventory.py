@@ -1,5 +1,9 @@
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.wc_batch import run_batch, BATCH_SIZE
+from utils.jobs import job_handler, run_in_chunks, respond_with_job
+from utils.product_index import record_product_changes
+from config import Config
 
 inventory_bp = Blueprint('inventory_bp', __name__)
 
@@ -127,6 +131,7 @@ def update_inventory(product_id):
         # Actualizar producto en WooCommerce
         response = wc_api.put(f"products/{product_id}", update_data)
         updated_product = response.json()
+        record_product_changes([updated_product])
         
         return jsonify(updated_product)
         
@@ -137,6 +142,38 @@ def update_inventory(product_id):
         print(f"Error in update_inventory: {e}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
+@job_handler('inventory.bulk_update')
+def bulk_update_inventory_job(job):
+    """
+    Envía las actualizaciones de inventario del trabajo en lotes de 100 a través
+    de products/batch, guardando el avance tras cada grupo de lotes.
+    """
+    updates = job.payload['updates']
+    wc_api = get_wc_api()
+    
+    def update_chunk(chunk):
+        outcomes = []
+        for update, (updated_product, error) in zip(chunk, run_batch(wc_api, "products/batch", "update", chunk)):
+            if error is None:
+                outcomes.append({'id': update['id'], 'success': True, 'data': updated_product})
+            else:
+                outcomes.append({'id': update['id'], 'success': False, 'error': error})
+        record_product_changes([outcome['data'] for outcome in outcomes if outcome['success']])
+        return outcomes
+    
+    outcomes = run_in_chunks(job, updates, BATCH_SIZE * Config.WC_BATCH_CONCURRENCY, update_chunk)
+    results = [outcome for outcome in outcomes if outcome['success']]
+    errors = job.payload['errors'] + [
+        {'id': outcome['id'], 'error': outcome['error']} for outcome in outcomes if not outcome['success']
+    ]
+    
+    return {
+        'success': len(results),
+        'errors': len(errors),
+        'results': results,
+        'error_details': errors
+    }
+
 @inventory_bp.route('/inventory/bulk-update', methods=['POST'])
 def bulk_update_inventory():
     """
@@ -147,63 +184,48 @@ def bulk_update_inventory():
         if not bulk_data or 'products' not in bulk_data:
             return jsonify({"error": "No se proporcionaron datos para actualización masiva"}), 400
         
-        wc_api = get_wc_api()
         products_to_update = bulk_data['products']
         update_type = bulk_data.get('update_type', 'individual')  # individual, stock, price
         
-        results = []
         errors = []
+        batch_updates = []
         
         for product_update in products_to_update:
-            try:
-                product_id = product_update.get('id')
-                if not product_id:
-                    errors.append({"error": "ID de producto faltante", "data": product_update})
-                    continue
-                
-                # Preparar datos según el tipo de actualización
-                update_data = {}
-                
-                if update_type == 'stock' or update_type == 'individual':
-                    if 'stock_quantity' in product_update:
-                        update_data['stock_quantity'] = product_update['stock_quantity']
-                    if 'stock_status' in product_update:
-                        update_data['stock_status'] = product_update['stock_status']
-                    if 'manage_stock' in product_update:
-                        update_data['manage_stock'] = product_update['manage_stock']
-                
-                if update_type == 'price' or update_type == 'individual':
-                    if 'regular_price' in product_update:
-                        update_data['regular_price'] = str(product_update['regular_price'])
-                    if 'sale_price' in product_update:
-                        update_data['sale_price'] = str(product_update['sale_price'])
-                
-                if update_data:
-                    response = wc_api.put(f"products/{product_id}", update_data)
-                    updated_product = response.json()
-                    results.append({
-                        'id': product_id,
-                        'success': True,
-                        'data': updated_product
-                    })
-                else:
-                    errors.append({
-                        'id': product_id,
-                        'error': 'No hay datos válidos para actualizar'
-                    })
-                    
-            except Exception as e:
+            product_id = product_update.get('id')
+            if not product_id:
+                errors.append({"error": "ID de producto faltante", "data": product_update})
+                continue
+            
+            # Preparar datos según el tipo de actualización
+            update_data = {}
+            
+            if update_type == 'stock' or update_type == 'individual':
+                if 'stock_quantity' in product_update:
+                    update_data['stock_quantity'] = product_update['stock_quantity']
+                if 'stock_status' in product_update:
+                    update_data['stock_status'] = product_update['stock_status']
+                if 'manage_stock' in product_update:
+                    update_data['manage_stock'] = product_update['manage_stock']
+            
+            if update_type == 'price' or update_type == 'individual':
+                if 'regular_price' in product_update:
+                    update_data['regular_price'] = str(product_update['regular_price'])
+                if 'sale_price' in product_update:
+                    update_data['sale_price'] = str(product_update['sale_price'])
+            
+            if update_data:
+                batch_updates.append({'id': product_id, **update_data})
+            else:
                 errors.append({
-                    'id': product_update.get('id', 'unknown'),
-                    'error': str(e)
+                    'id': product_id,
+                    'error': 'No hay datos válidos para actualizar'
                 })
         
-        return jsonify({
-            'success': len(results),
-            'errors': len(errors),
-            'results': results,
-            'error_details': errors
-        })
+        # Las actualizaciones se envían en un trabajo en segundo plano (ver /api/jobs/<id>)
+        return respond_with_job('inventory.bulk_update', {
+            'updates': batch_updates,
+            'errors': errors
+        }, total=len(batch_updates))
         
     except ValueError as e:
         print(f"ValueError in bulk_update_inventory: {e}")
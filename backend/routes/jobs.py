@@ -0,0 +1,52 @@
+from flask import Blueprint, jsonify, request
+from utils.jobs import get_job_queue
+import logging
+
+jobs_bp = Blueprint('jobs_bp', __name__)
+
+logger = logging.getLogger(__name__)
+
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    Lista los trabajos más recientes (sin resultados). Filtros: status, limit.
+    """
+    try:
+        status = request.args.get('status')
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        return jsonify({"jobs": get_job_queue().list(status=status, limit=limit)})
+    except Exception as e:
+        logger.error(f"Error listing jobs: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Estado, progreso, resultados parciales y resultado final de un trabajo.
+    """
+    try:
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify(job)
+    except Exception as e:
+        logger.error(f"Error fetching job {job_id}: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@jobs_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Pide la cancelación de un trabajo. Los elementos ya procesados se mantienen
+    en partial_results.
+    """
+    try:
+        job = get_job_queue().cancel(job_id)
+        if job is None:
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify(job)
+    except Exception as e:
+        logger.error(f"Error cancelling job {job_id}: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
@@ -1,96 +1,117 @@
-import os
 from flask import Blueprint, request, jsonify
-import requests
-from requests.auth import HTTPBasicAuth
-from werkzeug.utils import secure_filename
 
 from config import Config
+from utils.media_index import get_media_index
+from utils.media_upload import (MediaUploadError, check_request_size, dedupe_requested, optimize_requested,
+                                upload_file_storage, upload_many)
 
 media_bp = Blueprint('media_bp', __name__)
 
-WP_URL = Config.WC_STORE_URL
-# Credenciales específicas para la API de Medios de WP
-WP_AUTH_USER = Config.WP_USER_LOGIN
-WP_AUTH_PASS = Config.WP_APPLICATION_PASSWORD
-# Credenciales de fallback (API de WC)
-WC_API_KEY = Config.WC_CONSUMER_KEY
-WC_API_SECRET = Config.WC_CONSUMER_SECRET
 
-print(WP_AUTH_USER)
+def media_summary(media):
+    summary = {
+        "id": media.get('id'),
+        "source_url": media.get('source_url'),
+        "alt_text": media.get('alt_text', ''),
+        "media_type": media.get('media_type')
+    }
+    if 'optimization' in media:
+        summary['optimization'] = media['optimization']
+    if media.get('deduplicated'):
+        summary['deduplicated'] = True
+    return summary
+
 
 @media_bp.route('/media/upload', methods=['POST'])
 def upload_media():
     """
     Uploads an image to the WordPress Media Library.
+
+    Las imágenes se optimizan antes de subirlas salvo con optimize=0 (ver MEDIA_OPTIMIZE_*).
+    Si el mismo contenido ya está en WordPress se devuelve ese medio (200,
+    'deduplicated': true) salvo con force_new=1.
     """
+    too_large = check_request_size()
+    if too_large:
+        return jsonify({"error": too_large.message}), too_large.status
+
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
-    
-    file = request.files['file']
-    
-    if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
-
-    if file:
-        filename = secure_filename(file.filename)
-        media_endpoint = f"{WP_URL}/wp-json/wp/v2/media"
-        
-        if WP_AUTH_USER and WP_AUTH_PASS:
-            auth = HTTPBasicAuth(WP_AUTH_USER, WP_AUTH_PASS)
+
+    try:
+        media = upload_file_storage(request.files['file'], alt_text=request.form.get('alt_text'),
+                                     optimize=optimize_requested(), dedupe=dedupe_requested())
+        return jsonify(media_summary(media)), 200 if media.get('deduplicated') else 201
+    except MediaUploadError as e:
+        return jsonify({"error": e.message}), e.status
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return jsonify({"error": "An unexpected server error occurred."}), 500
+
+
+@media_bp.route('/media/upload-batch', methods=['POST'])
+def upload_media_batch():
+    """
+    Sube varios archivos (campo 'files', repetido) a la biblioteca de medios de
+    WordPress en paralelo, como mucho MEDIA_UPLOAD_CONCURRENCY a la vez.
+
+    'alt_text' puede repetirse en el mismo orden que los archivos. Devuelve un
+    resultado por archivo: 201 si subieron todos, 207 si sólo algunos y el código
+    del primer error si no subió ninguno. Con la optimización activa, cada
+    resultado incluye 'optimization' y la respuesta el total 'bytes_saved'. Los
+    archivos ya subidos se resuelven con el medio existente ('deduplicated').
+    """
+    too_large = check_request_size(Config.MEDIA_MAX_BATCH_FILES)
+    if too_large:
+        return jsonify({"error": too_large.message}), too_large.status
+
+    files = request.files.getlist('files') or request.files.getlist('file')
+    if not files:
+        return jsonify({"error": "No se proporcionó ningún archivo"}), 400
+    if len(files) > Config.MEDIA_MAX_BATCH_FILES:
+        return jsonify({"error": f"Máximo {Config.MEDIA_MAX_BATCH_FILES} archivos por lote"}), 400
+
+    try:
+        outcomes = upload_many(files, alt_texts=request.form.getlist('alt_text'), optimize=optimize_requested(),
+                               dedupe=dedupe_requested())
+    except MediaUploadError as e:
+        return jsonify({"error": e.message}), e.status
+
+    results = []
+    for index, (file, (media, error)) in enumerate(zip(files, outcomes)):
+        result = {"index": index, "filename": file.filename, "success": error is None}
+        if error is None:
+            result.update(media_summary(media))
         else:
-            auth = HTTPBasicAuth(WC_API_KEY, WC_API_SECRET)
-            print("WARN: Using WC API keys for media upload.")
-
-        # Establecer la cabecera del nombre del archivo es crucial
-        headers = {
-            'Content-Disposition': f'attachment; filename={filename}'
-        }
-
-        try:
-            # Enviar el archivo usando el parámetro `files` para multipart/form-data
-            # No es necesario establecer Content-Type, `requests` lo hace por nosotros.
-            response = requests.post(
-                media_endpoint, 
-                headers=headers,
-                files={'file': (filename, file.stream, file.mimetype)},
-                auth=auth,
-                timeout=30
-            )
-            
-            print(f"WP Media API Response Status: {response.status_code}")
-            print(f"WP Media API Response Body: {response.text}")
-
-            response.raise_for_status()
-            
-            uploaded_image_data = response.json()
-            
-            # Comprobar si la subida falló silenciosamente
-            if not uploaded_image_data.get('id'):
-                error_msg = uploaded_image_data.get('message', 'WordPress returned null data after upload.')
-                print(f"ERROR: Silent failure from WordPress: {error_msg}")
-                return jsonify({"error": error_msg}), 500
-
-            return jsonify({
-                "id": uploaded_image_data.get('id'),
-                "source_url": uploaded_image_data.get('source_url'),
-                "alt_text": uploaded_image_data.get('alt_text', ''),
-                "media_type": uploaded_image_data.get('media_type')
-            }), 201
-
-        except requests.exceptions.RequestException as e:
-            error_message = f"Failed to upload to WordPress: {e}"
-            if e.response is not None:
-                try:
-                    error_details = e.response.json()
-                    # Extraer el mensaje de error específico de WordPress si está disponible
-                    if 'message' in error_details:
-                        error_message += f" | Details: {error_details['message']}"
-                    else:
-                        error_message += f" | Details: {e.response.text}"
-                except ValueError:
-                    error_message += f" | Details: {e.response.text}"
-            
-            print(error_message)
-            return jsonify({"error": error_message}), 500
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            result.update({"error": error.message, "status": error.status})
+        results.append(result)
+
+    uploaded = sum(1 for result in results if result['success'])
+    if uploaded == len(results):
+        status = 201
+    elif uploaded:
+        status = 207
+    else:
+        status = results[0]['status']
+    bytes_saved = sum(result.get('optimization', {}).get('bytes_saved', 0) for result in results)
+    deduplicated = sum(1 for result in results if result.get('deduplicated'))
+    return jsonify({"results": results, "uploaded": uploaded, "failed": len(results) - uploaded,
+                    "deduplicated": deduplicated, "bytes_saved": bytes_saved}), status
+
+
+@media_bp.route('/media/index', methods=['GET'])
+def media_index_stats():
+    """
+    Estado del índice de hashes usado para no subir dos veces el mismo archivo.
+    """
+    return jsonify(get_media_index().stats())
+
+
+@media_bp.route('/media/index/backfill', methods=['POST'])
+def media_index_backfill():
+    """
+    Vuelve a recorrer la biblioteca de medios de WordPress para completar el índice
+    (p. ej. tras subir archivos directamente desde wp-admin).
+    """
+    job_id = get_media_index().ensure_backfill(force=True)
+    return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.fanout import run_parallel
+from utils.order_store import get_order_store, get_ready_order_store
 from datetime import datetime, timedelta
 import logging
 
@@ -9,6 +11,25 @@ orders_bp = Blueprint('orders_bp', __name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Marca de frescura de las respuestas servidas directamente desde WooCommerce
+LIVE_FRESHNESS = {'source': 'woocommerce'}
+
+# Estados que no cuentan para el historial de un cliente
+EXCLUDED_HISTORY_STATUSES = ['checkout-draft', 'failed', 'cancelled']
+
+def mirror_order(order=None, deleted_id=None):
+    """
+    Refleja en la réplica local un pedido creado, actualizado o eliminado por nosotros.
+    """
+    try:
+        store = get_order_store()
+        if deleted_id is not None:
+            store.delete_order(deleted_id)
+        elif isinstance(order, dict) and order.get('id'):
+            store.upsert_orders([order])
+    except Exception as e:
+        logger.warning(f"Could not update local order store: {e}")
+
 @orders_bp.route('/orders', methods=['GET'])
 def get_orders():
     """
@@ -18,8 +39,8 @@ def get_orders():
         wc_api = get_wc_api()
         
         # Obtener parámetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)  # Entre 1 y 100
         status = request.args.get('status')
         customer = request.args.get('customer', type=int)
         search = request.args.get('search')
@@ -28,10 +49,37 @@ def get_orders():
         orderby = request.args.get('orderby', 'date')
         order = request.args.get('order', 'desc')
         
+        # Responder desde la réplica local si está disponible
+        store = get_ready_order_store()
+        if store:
+            statuses = [s for s in status.split(',') if s and s != 'any'] if status else None
+            orders, total = store.query_orders(
+                page=page,
+                per_page=per_page,
+                orderby=orderby,
+                order=order,
+                statuses=statuses,
+                exclude_statuses=['checkout-draft', 'trash'],
+                customer_id=customer,
+                search=search,
+                after=after,
+                before=before
+            )
+            return jsonify({
+                'orders': orders,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'total_pages': (total + per_page - 1) // per_page
+                },
+                'freshness': store.freshness()
+            })
+        
         # Construir parámetros para la API de WooCommerce
         params = {
             'page': page,
-            'per_page': min(per_page, 100),  # Limitar a 100 máximo
+            'per_page': per_page,
             'orderby': orderby,
             'order': order
         }
@@ -70,7 +118,8 @@ def get_orders():
                 'per_page': per_page,
                 'total': int(total),
                 'total_pages': int(total_pages)
-            }
+            },
+            'freshness': LIVE_FRESHNESS
         })
         
     except ValueError as e:
@@ -149,10 +198,12 @@ def create_order():
                 if 'details' in new_order and isinstance(new_order['details'], dict) and 'id' in new_order['details']:
                     order_details = new_order['details']
                     logger.info(f"Order created successfully: {order_details['id']}")
+                    mirror_order(order_details)
                     return jsonify(order_details), 201
                 # Si no hay details pero hay ID directamente, usar la respuesta completa
                 elif 'id' in new_order:
                     logger.info(f"Order created successfully: {new_order['id']}")
+                    mirror_order(new_order)
                     return jsonify(new_order), 201
             
             # Fallback: devolver la respuesta tal como viene
@@ -202,6 +253,7 @@ def update_order(order_id):
         
         if response.status_code == 200:
             logger.info(f"Order updated successfully: {order_id}")
+            mirror_order(updated_order)
             return jsonify(updated_order)
         else:
             logger.error(f"Error updating order {order_id}: {updated_order}")
@@ -233,6 +285,7 @@ def delete_order(order_id):
         if response.status_code == 200:
             action = "eliminado permanentemente" if force else "movido a la papelera"
             logger.info(f"Order {order_id} {action}")
+            mirror_order(deleted_id=order_id)
             return jsonify(deleted_order)
         else:
             logger.error(f"Error deleting order {order_id}: {deleted_order}")
@@ -419,71 +472,174 @@ def execute_order_action(order_id):
         logger.error(f"Error executing action for order {order_id}: {e}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
+def customer_history(order, store=None):
+    """
+    Pedidos y gasto del cliente de un pedido (registrado por customer_id, invitado
+    por email), sin carritos abandonados, fallidos ni cancelados. Con `store` el
+    historial completo sale de la réplica local; sin ella, de los últimos 100
+    pedidos en WooCommerce.
+    """
+    customer_id = order.get('customer_id', 0)
+    customer_email = order.get('billing', {}).get('email', '')
+    
+    if customer_id == 0 and not customer_email:
+        return {
+            "total_orders": 1,
+            "total_spent": float(order.get('total', 0)),
+            "average_order_value": float(order.get('total', 0))
+        }
+    
+    if store:
+        # Historial completo desde la réplica local (sin límite de 100 pedidos)
+        summary = store.status_summary(
+            customer_id=customer_id if customer_id else None,
+            email=customer_email if not customer_id else None,
+            exclude_statuses=EXCLUDED_HISTORY_STATUSES
+        )
+        total_orders = sum(s['orders'] for s in summary.values())
+        total_spent = sum(s['revenue'] for s in summary.values())
+        
+        return {
+            "total_orders": total_orders,
+            "total_spent": total_spent,
+            "average_order_value": total_spent / total_orders if total_orders > 0 else 0,
+            "customer_id": customer_id,
+            "is_guest": customer_id == 0,
+            "freshness": store.freshness()
+        }
+    
+    if customer_id == 0:
+        # Buscar pedidos por email para clientes invitados
+        params = {
+            'search': customer_email,
+            'per_page': 100,
+            'status': 'any'
+        }
+    else:
+        # Cliente registrado - buscar por customer_id
+        params = {
+            'customer': customer_id,
+            'per_page': 100,
+            'status': 'any'
+        }
+    
+    # Obtener todos los pedidos del cliente
+    orders_response = get_wc_api().get("orders", params=params)
+    customer_orders = orders_response.json()
+    
+    if not isinstance(customer_orders, list):
+        customer_orders = []
+    
+    # Filtrar pedidos válidos (excluir checkout-draft y failed)
+    valid_orders = [
+        order for order in customer_orders 
+        if order.get('status') not in EXCLUDED_HISTORY_STATUSES
+    ]
+    
+    # Calcular estadísticas
+    total_orders = len(valid_orders)
+    total_spent = sum(float(order.get('total', 0)) for order in valid_orders)
+    average_order_value = total_spent / total_orders if total_orders > 0 else 0
+    
+    return {
+        "total_orders": total_orders,
+        "total_spent": total_spent,
+        "average_order_value": average_order_value,
+        "customer_id": customer_id,
+        "is_guest": customer_id == 0,
+        "freshness": LIVE_FRESHNESS
+    }
+
+def order_metadata(order):
+    """
+    Origen, dispositivo, IP y user agent de un pedido, a partir de sus campos y meta_data.
+    """
+    # Extraer metadatos relevantes
+    meta_data = order.get('meta_data', [])
+    
+    # Buscar metadatos específicos que WooCommerce puede almacenar
+    metadata = {}
+    for meta in meta_data:
+        key = meta.get('key', '')
+        value = meta.get('value', '')
+        
+        # Mapear metadatos conocidos de WooCommerce
+        if key == '_customer_ip_address':
+            metadata['customer_ip'] = value
+        elif key == '_customer_user_agent':
+            metadata['user_agent'] = value
+        elif key == '_billing_phone':
+            metadata['billing_phone'] = value
+        elif key == '_billing_email':
+            metadata['billing_email'] = value
+        elif key == '_order_source':
+            metadata['order_source'] = value
+    
+    # Información adicional del pedido
+    created_via = order.get('created_via', 'unknown')
+    customer_ip = order.get('customer_ip_address', metadata.get('customer_ip', ''))
+    user_agent = order.get('customer_user_agent', metadata.get('user_agent', ''))
+    
+    # Determinar tipo de dispositivo basado en user agent
+    device_type = 'Desconocido'
+    if user_agent:
+        user_agent_lower = user_agent.lower()
+        if any(mobile in user_agent_lower for mobile in ['mobile', 'android', 'iphone', 'ipad']):
+            device_type = 'Móvil'
+        elif any(tablet in user_agent_lower for tablet in ['tablet', 'ipad']):
+            device_type = 'Tablet'
+        else:
+            device_type = 'Escritorio'
+    
+    # Determinar origen
+    origin = 'Directo'
+    if created_via == 'admin':
+        origin = 'Admin'
+    elif created_via == 'rest-api':
+        origin = 'API'
+    elif created_via == 'checkout':
+        origin = 'Tienda Online'
+    
+    return {
+        "customer_ip": customer_ip,
+        "user_agent": user_agent,
+        "device_type": device_type,
+        "origin": origin,
+        "created_via": created_via,
+        "order_source": metadata.get('order_source', origin)
+    }
+
+def fetch_order_notes(order_id):
+    """
+    Notas de un pedido desde WooCommerce; lanza una excepción si la API responde con error.
+    """
+    response = get_wc_api().get(f"orders/{order_id}/notes")
+    notes = response.json()
+    if response.status_code != 200:
+        raise RuntimeError(f"WooCommerce orders/{order_id}/notes returned {response.status_code}: {notes}")
+    return notes
+
 @orders_bp.route('/orders/<int:order_id>/customer-history', methods=['GET'])
 def get_customer_history(order_id):
     """
     Obtiene el historial del cliente basado en el pedido actual.
     """
     try:
-        wc_api = get_wc_api()
-        
-        # Primero obtener el pedido para conseguir el customer_id
-        order_response = wc_api.get(f"orders/{order_id}")
-        if order_response.status_code != 200:
-            return jsonify({"error": "Pedido no encontrado"}), 404
+        store = get_ready_order_store()
+        order = store.get_order(order_id) if store else None
         
-        order = order_response.json()
-        customer_id = order.get('customer_id', 0)
-        
-        if customer_id == 0:
-            # Cliente invitado - buscar por email
-            customer_email = order.get('billing', {}).get('email', '')
-            if not customer_email:
-                return jsonify({
-                    "total_orders": 1,
-                    "total_spent": float(order.get('total', 0)),
-                    "average_order_value": float(order.get('total', 0))
-                })
+        if order is None:
+            store = None
+            wc_api = get_wc_api()
             
-            # Buscar pedidos por email para clientes invitados
-            params = {
-                'search': customer_email,
-                'per_page': 100,
-                'status': 'any'
-            }
-        else:
-            # Cliente registrado - buscar por customer_id
-            params = {
-                'customer': customer_id,
-                'per_page': 100,
-                'status': 'any'
-            }
-        
-        # Obtener todos los pedidos del cliente
-        orders_response = wc_api.get("orders", params=params)
-        customer_orders = orders_response.json()
-        
-        if not isinstance(customer_orders, list):
-            customer_orders = []
-        
-        # Filtrar pedidos válidos (excluir checkout-draft y failed)
-        valid_orders = [
-            order for order in customer_orders 
-            if order.get('status') not in ['checkout-draft', 'failed', 'cancelled']
-        ]
-        
-        # Calcular estadísticas
-        total_orders = len(valid_orders)
-        total_spent = sum(float(order.get('total', 0)) for order in valid_orders)
-        average_order_value = total_spent / total_orders if total_orders > 0 else 0
+            # Primero obtener el pedido para conseguir el customer_id
+            order_response = wc_api.get(f"orders/{order_id}")
+            if order_response.status_code != 200:
+                return jsonify({"error": "Pedido no encontrado"}), 404
+            
+            order = order_response.json()
         
-        return jsonify({
-            "total_orders": total_orders,
-            "total_spent": total_spent,
-            "average_order_value": average_order_value,
-            "customer_id": customer_id,
-            "is_guest": customer_id == 0
-        })
+        return jsonify(customer_history(order, store))
         
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
@@ -505,90 +661,106 @@ def get_order_metadata(order_id):
         if order_response.status_code != 200:
             return jsonify({"error": "Pedido no encontrado"}), 404
         
+        return jsonify(order_metadata(order_response.json()))
+        
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logger.error(f"Error fetching order metadata for {order_id}: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@orders_bp.route('/orders/<int:order_id>/full', methods=['GET'])
+def get_order_full(order_id):
+    """
+    Todo lo que muestra el detalle de un pedido en una sola llamada: el pedido, sus
+    notas, sus metadatos y el historial del cliente.
+
+    El pedido se pide una sola vez a WooCommerce; las notas y el historial se
+    obtienen en paralelo y los metadatos se calculan del propio pedido. Si las notas
+    o el historial fallan, su sección va a null y se indica en `degraded`.
+    """
+    try:
+        wc_api = get_wc_api()
+        
+        order_response = wc_api.get(f"orders/{order_id}")
         order = order_response.json()
+        if order_response.status_code != 200 or 'id' not in order:
+            return jsonify({"error": "Pedido no encontrado"}), 404
         
-        # Extraer metadatos relevantes
-        meta_data = order.get('meta_data', [])
+        # El historial sale de la réplica sólo si ya tiene este pedido (como /customer-history)
+        store = get_ready_order_store()
+        if store and store.get_order(order_id) is None:
+            store = None
         
-        # Buscar metadatos específicos que WooCommerce puede almacenar
-        metadata = {}
-        for meta in meta_data:
-            key = meta.get('key', '')
-            value = meta.get('value', '')
-            
-            # Mapear metadatos conocidos de WooCommerce
-            if key == '_customer_ip_address':
-                metadata['customer_ip'] = value
-            elif key == '_customer_user_agent':
-                metadata['user_agent'] = value
-            elif key == '_billing_phone':
-                metadata['billing_phone'] = value
-            elif key == '_billing_email':
-                metadata['billing_email'] = value
-            elif key == '_order_source':
-                metadata['order_source'] = value
-        
-        # Información adicional del pedido
-        created_via = order.get('created_via', 'unknown')
-        customer_ip = order.get('customer_ip_address', metadata.get('customer_ip', ''))
-        user_agent = order.get('customer_user_agent', metadata.get('user_agent', ''))
-        
-        # Determinar tipo de dispositivo basado en user agent
-        device_type = 'Desconocido'
-        if user_agent:
-            user_agent_lower = user_agent.lower()
-            if any(mobile in user_agent_lower for mobile in ['mobile', 'android', 'iphone', 'ipad']):
-                device_type = 'Móvil'
-            elif any(tablet in user_agent_lower for tablet in ['tablet', 'ipad']):
-                device_type = 'Tablet'
-            else:
-                device_type = 'Escritorio'
-        
-        # Determinar origen
-        origin = 'Directo'
-        if created_via == 'admin':
-            origin = 'Admin'
-        elif created_via == 'rest-api':
-            origin = 'API'
-        elif created_via == 'checkout':
-            origin = 'Tienda Online'
+        results, degraded = run_parallel({
+            'notes': lambda: fetch_order_notes(order_id),
+            'customer_history': lambda: customer_history(order, store)
+        })
         
         return jsonify({
-            "customer_ip": customer_ip,
-            "user_agent": user_agent,
-            "device_type": device_type,
-            "origin": origin,
-            "created_via": created_via,
-            "order_source": metadata.get('order_source', origin)
+            "order": order,
+            "notes": results.get('notes'),
+            "metadata": order_metadata(order),
+            "customer_history": results.get('customer_history'),
+            "degraded": degraded
         })
         
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
         return jsonify({"error": str(e)}), 500
     except Exception as e:
-        logger.error(f"Error fetching order metadata for {order_id}: {e}")
+        logger.error(f"Error fetching full order {order_id}: {e}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
 @orders_bp.route('/orders/stats', methods=['GET'])
 def get_order_stats():
     """
     Obtiene estadísticas de pedidos para el dashboard.
+    
+    Por defecto cubre los últimos 30 días; con la réplica local acepta un rango
+    arbitrario con los parámetros `after` y `before` (se redondean a la hora).
     """
     try:
-        wc_api = get_wc_api()
-        
         # Fechas para comparación
         now = datetime.now()
         month_ago = now - timedelta(days=30)
         
         # Formatear fechas para la API
-        after_date = month_ago.strftime('%Y-%m-%dT%H:%M:%S')
+        after_date = request.args.get('after') or month_ago.strftime('%Y-%m-%dT%H:%M:%S')
+        before_date = request.args.get('before')
+        
+        store = get_ready_order_store()
+        if store:
+            # Agregados por hora/día de la réplica local: coste proporcional a los buckets
+            summary = store.revenue_summary(after=after_date, before=before_date, exclude_statuses=['checkout-draft', 'trash'])
+            status_counts = {status: data['orders'] for status, data in summary.items()}
+            total_orders = sum(status_counts.values())
+            total_revenue = sum(summary[status]['revenue'] for status in ['completed', 'processing'] if status in summary)
+            
+            return jsonify({
+                'total_orders': total_orders,
+                'pending_orders': status_counts.get('pending', 0),
+                'processing_orders': status_counts.get('processing', 0),
+                'completed_orders': status_counts.get('completed', 0),
+                'cancelled_orders': status_counts.get('cancelled', 0),
+                'total_revenue': total_revenue,
+                'average_order_value': total_revenue / total_orders if total_orders > 0 else 0,
+                'orders_by_status': status_counts,
+                'top_products': [],
+                'freshness': store.freshness()
+            })
+        
+        wc_api = get_wc_api()
         
         # Obtener pedidos del último mes
-        recent_orders = wc_api.get("orders", params={
+        params = {
             'after': after_date,
             'per_page': 100
-        }).json()
+        }
+        if before_date:
+            params['before'] = before_date
+        recent_orders = wc_api.get("orders", params=params).json()
         
         # Obtener pedidos por estado
         stats = {
@@ -637,6 +809,7 @@ def get_order_stats():
         
         # Productos más vendidos (datos simplificados)
         stats['top_products'] = []
+        stats['freshness'] = LIVE_FRESHNESS
         
         return jsonify(stats)
         
@@ -653,8 +826,6 @@ def search_orders():
     Busca pedidos por diferentes criterios.
     """
     try:
-        wc_api = get_wc_api()
-        
         # Obtener parámetros de búsqueda
         query = request.args.get('q', '')
         limit = request.args.get('limit', 10, type=int)
@@ -662,6 +833,14 @@ def search_orders():
         if not query:
             return jsonify({"orders": []})
         
+        store = get_ready_order_store()
+        if store:
+            # Índice local: resúmenes ya ordenados por relevancia
+            orders = store.search_orders(query, limit=min(max(limit, 1), 50))
+            return jsonify({"orders": orders, "freshness": store.freshness()})
+
+        wc_api = get_wc_api()
+        
         # Buscar por ID de pedido, email del cliente, nombre, etc.
         search_params = {
             'search': query,
@@ -669,6 +848,7 @@ def search_orders():
         }
         
         orders = wc_api.get("orders", params=search_params).json()
+        freshness = LIVE_FRESHNESS
         
         # Filtrar carritos abandonados y datos sensibles
         filtered_orders = []
@@ -693,7 +873,7 @@ def search_orders():
                 }
                 filtered_orders.append(filtered_order)
         
-        return jsonify({"orders": filtered_orders})
+        return jsonify({"orders": filtered_orders, "freshness": freshness})
         
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
@@ -708,16 +888,34 @@ def get_abandoned_carts():
     Obtiene carritos abandonados (pedidos con estado checkout-draft).
     """
     try:
-        wc_api = get_wc_api()
-        
         # Obtener parámetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)  # Entre 1 y 100
+        
+        store = get_ready_order_store()
+        if store:
+            carts, total = store.query_orders(
+                page=page,
+                per_page=per_page,
+                statuses=['checkout-draft']
+            )
+            return jsonify({
+                'abandoned_carts': carts,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'total_pages': (total + per_page - 1) // per_page
+                },
+                'freshness': store.freshness()
+            })
+        
+        wc_api = get_wc_api()
         
         # Buscar solo carritos abandonados
         params = {
             'page': page,
-            'per_page': min(per_page, 100),
+            'per_page': per_page,
             'status': 'checkout-draft',
             'orderby': 'date',
             'order': 'desc'
@@ -738,7 +936,8 @@ def get_abandoned_carts():
                 'per_page': per_page,
                 'total': int(total),
                 'total_pages': int(total_pages)
-            }
+            },
+            'freshness': LIVE_FRESHNESS
         })
         
     except ValueError as e:
@@ -788,6 +987,7 @@ def update_order_customer(order_id):
         
         if response.status_code == 200:
             logger.info(f"Order {order_id} customer updated to {customer_id}")
+            mirror_order(updated_order)
             return jsonify({
                 "message": f"Cliente actualizado correctamente",
                 "order": updated_order,
@@ -896,6 +1096,7 @@ def update_order_addresses(order_id):
         
         if response.status_code == 200:
             logger.info(f"Order addresses updated successfully for order {order_id}")
+            mirror_order(updated_order)
             return jsonify({
                 "success": True,
                 "message": "Direcciones actualizadas correctamente",
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.catalog_cache import ORISHAS, cached_wc_get, invalidate_catalog
 
 orishas_bp = Blueprint('orishas', __name__)
 
@@ -12,10 +13,8 @@ def get_orishas():
     Get all product brands (orishas).
     """
     try:
-        wc_api = get_wc_api()
-        response = wc_api.get('products/brands')
-        response.raise_for_status()
-        return jsonify(response.json()), response.status_code
+        brands, _ = cached_wc_get(ORISHAS, 'products/brands')
+        return jsonify(brands), 200
     except Exception as e:
         print(f"Error fetching orishas: {e}")
         return jsonify({"error": "Failed to fetch brands from WooCommerce"}), 500
@@ -44,6 +43,7 @@ def create_orisha():
         wc_api = get_wc_api()
         response = wc_api.post('products/brands', payload)
         response.raise_for_status()
+        invalidate_catalog(ORISHAS)
         return jsonify(response.json()), 201
             
     except Exception as e:
@@ -56,10 +56,8 @@ def get_orisha(id):
     Get a single product brand (orisha) by ID.
     """
     try:
-        wc_api = get_wc_api()
-        response = wc_api.get(f'products/brands/{id}')
-        response.raise_for_status()
-        return jsonify(response.json()), response.status_code
+        brand, _ = cached_wc_get(ORISHAS, f'products/brands/{id}')
+        return jsonify(brand), 200
     except Exception as e:
         print(f"Error fetching orisha {id}: {e}")
         return jsonify({"error": "Brand not found"}), 404
@@ -93,6 +91,7 @@ def update_orisha(id):
         wc_api = get_wc_api()
         response = wc_api.put(f'products/brands/{id}', payload)
         response.raise_for_status()
+        invalidate_catalog(ORISHAS)
         return jsonify(response.json()), 200
 
     except Exception as e:
@@ -109,6 +108,7 @@ def delete_orisha(id):
         # `force=True` es necesario para borrar términos que tienen productos asociados
         response = wc_api.delete(f'products/brands/{id}', params={'force': True})
         response.raise_for_status()
+        invalidate_catalog(ORISHAS)
         return jsonify(response.json()), 200
             
     except Exception as e:
@@ -1,5 +1,10 @@
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.wc_batch import run_batch, BATCH_SIZE
+from utils.jobs import job_handler, run_in_chunks, respond_with_job
+from utils.catalog_cache import CATEGORIES, invalidate_catalog
+from utils.product_index import record_product_changes
+from config import Config
 
 products_bp = Blueprint('products_bp', __name__)
 
@@ -36,6 +41,9 @@ def create_product():
         
         wc_api = get_wc_api()
         new_product = wc_api.post("products", product_data).json()
+        # El recuento de productos de las categorías cambia
+        invalidate_catalog(CATEGORIES)
+        record_product_changes([new_product])
         return jsonify(new_product), 201
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
@@ -55,6 +63,9 @@ def update_product(product_id):
 
         wc_api = get_wc_api()
         updated_product = wc_api.put(f"products/{product_id}", product_data).json()
+        if 'categories' in product_data or 'status' in product_data:
+            invalidate_catalog(CATEGORIES)
+        record_product_changes([updated_product])
         return jsonify(updated_product)
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
@@ -71,6 +82,9 @@ def delete_product(product_id):
         wc_api = get_wc_api()
         # En WooCommerce, para eliminar permanentemente un producto, usamos force=true
         deleted_product = wc_api.delete(f"products/{product_id}", params={"force": True}).json()
+        invalidate_catalog(CATEGORIES)
+        if isinstance(deleted_product, dict) and deleted_product.get('id'):
+            record_product_changes(deleted_ids=[product_id])
         return jsonify(deleted_product)
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
@@ -106,6 +120,35 @@ def upload_product_image(product_id):
         "product_id": product_id
     }), 501  # Not Implemented
 
+@job_handler('products.bulk_delete')
+def bulk_delete_products_job(job):
+    """
+    Elimina permanentemente los productos del trabajo en lotes de 100 a través de
+    products/batch, guardando el avance tras cada grupo de lotes.
+    """
+    product_ids = job.payload['product_ids']
+    wc_api = get_wc_api()
+    
+    def delete_chunk(chunk):
+        return [
+            {"id": product_id, "error": error}
+            for product_id, (product, error) in zip(chunk, run_batch(wc_api, "products/batch", "delete", chunk))
+        ]
+    
+    outcomes = run_in_chunks(job, product_ids, BATCH_SIZE * Config.WC_BATCH_CONCURRENCY, delete_chunk)
+    deleted_products = [outcome["id"] for outcome in outcomes if outcome["error"] is None]
+    failed_deletions = [outcome for outcome in outcomes if outcome["error"] is not None]
+    if deleted_products:
+        invalidate_catalog(CATEGORIES)
+        record_product_changes(deleted_ids=deleted_products)
+    
+    return {
+        "deleted": deleted_products,
+        "failed": failed_deletions,
+        "total_deleted": len(deleted_products),
+        "total_failed": len(failed_deletions)
+    }
+
 @products_bp.route('/products/bulk-delete', methods=['POST'])
 def bulk_delete_products():
     """
@@ -121,33 +164,8 @@ def bulk_delete_products():
         if not isinstance(product_ids, list) or len(product_ids) == 0:
             return jsonify({"error": "product_ids must be a non-empty array"}), 400
         
-        wc_api = get_wc_api()
-        deleted_products = []
-        failed_deletions = []
-        
-        for product_id in product_ids:
-            try:
-                # Eliminar cada producto permanentemente
-                result = wc_api.delete(f"products/{product_id}", params={"force": True})
-                if result.status_code == 200:
-                    deleted_products.append(product_id)
-                else:
-                    failed_deletions.append({
-                        "id": product_id,
-                        "error": f"Status code: {result.status_code}"
-                    })
-            except Exception as e:
-                failed_deletions.append({
-                    "id": product_id,
-                    "error": str(e)
-                })
-        
-        return jsonify({
-            "deleted": deleted_products,
-            "failed": failed_deletions,
-            "total_deleted": len(deleted_products),
-            "total_failed": len(failed_deletions)
-        })
+        # Se ejecuta como trabajo en segundo plano (ver /api/jobs/<id>)
+        return respond_with_job('products.bulk_delete', {'product_ids': product_ids}, total=len(product_ids))
         
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
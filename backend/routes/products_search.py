@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
 from utils.woocommerce_api import get_wc_api
+from utils.category_tree import get_category_tree
+from utils.product_index import get_product_search, product_summary
 import logging
 
 products_search_bp = Blueprint('products_search_bp', __name__)
@@ -8,14 +10,31 @@ products_search_bp = Blueprint('products_search_bp', __name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def search_category_ids(category):
+    """
+    Ids de la categoría pedida y sus subcategorías (como hace WooCommerce), o sólo
+    la pedida si el árbol no está disponible.
+    """
+    category_id = int(category)
+    try:
+        tree = get_category_tree()
+    except Exception as e:
+        logger.warning(f"Category tree unavailable for search filter: {e}")
+        return {category_id}
+    if category_id not in tree:
+        return {category_id}
+    return tree.subtree_ids(category_id)
+
 @products_search_bp.route('/products/search', methods=['GET'])
 def search_products():
     """
     Busca productos por diferentes criterios con información completa para pedidos.
+
+    Responde desde el índice local (SKU exacto, prefijos y coincidencias
+    aproximadas sin acentos). Mientras el índice se construye por primera vez se
+    usa la búsqueda de WooCommerce.
     """
     try:
-        wc_api = get_wc_api()
-        
         # Obtener parámetros de búsqueda
         query = request.args.get('q', '')
         limit = request.args.get('limit', 10, type=int)
@@ -25,6 +44,15 @@ def search_products():
         if not query:
             return jsonify({"products": []})
         
+        if category and not category.isdigit():
+            return jsonify({"error": "category debe ser un id numérico"}), 400
+        
+        search = get_product_search()
+        if search is not None and search.ready():
+            category_ids = search_category_ids(category) if category else None
+            products = search.search(query, min(limit, 50), category_ids, in_stock)
+            return jsonify({"products": products, "source": "index"})
+        
         # Buscar por nombre, SKU, descripción, etc.
         search_params = {
             'search': query,
@@ -40,58 +68,14 @@ def search_products():
         if in_stock:
             search_params['stock_status'] = 'instock'
         
-        products = wc_api.get("products", params=search_params).json()
+        products = get_wc_api().get("products", params=search_params).json()
         
         # Enriquecer datos de productos para la interfaz de pedidos
         enhanced_products = []
         if isinstance(products, list):
-            for product in products:
-                # Obtener categorías del producto
-                categories = []
-                if product.get('categories'):
-                    for cat in product['categories']:
-                        categories.append(cat.get('name', ''))
-                
-                # Determinar disponibilidad y stock
-                manage_stock = product.get('manage_stock', False)
-                stock_quantity = product.get('stock_quantity')
-                stock_status = product.get('stock_status', 'outofstock')
-                in_stock_status = stock_status == 'instock'
-                
-                # Obtener imagen principal
-                image_url = None
-                if product.get('images') and len(product['images']) > 0:
-                    image_url = product['images'][0].get('src')
-                
-                # Obtener precio
-                price = float(product.get('price', 0)) if product.get('price') else 0
-                regular_price = float(product.get('regular_price', 0)) if product.get('regular_price') else 0
-                sale_price = float(product.get('sale_price', 0)) if product.get('sale_price') else 0
-                
-                enhanced_product = {
-                    'id': product.get('id'),
-                    'name': product.get('name', ''),
-                    'sku': product.get('sku', ''),
-                    'price': price,
-                    'regular_price': regular_price,
-                    'sale_price': sale_price,
-                    'stock_quantity': stock_quantity if manage_stock else None,
-                    'manage_stock': manage_stock,
-                    'in_stock': in_stock_status,
-                    'stock_status': stock_status,
-                    'image': image_url,
-                    'type': product.get('type', 'simple'),
-                    'categories': categories,
-                    'short_description': product.get('short_description', ''),
-                    'weight': product.get('weight', ''),
-                    'dimensions': product.get('dimensions', {}),
-                    'shipping_required': product.get('shipping_required', True),
-                    'virtual': product.get('virtual', False),
-                    'downloadable': product.get('downloadable', False)
-                }
-                enhanced_products.append(enhanced_product)
+            enhanced_products = [product_summary(product) for product in products]
         
-        return jsonify({"products": enhanced_products})
+        return jsonify({"products": enhanced_products, "source": "woocommerce"})
         
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
@@ -100,6 +84,16 @@ def search_products():
         logger.error(f"Error searching products: {e}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
+@products_search_bp.route('/products/search/index', methods=['GET'])
+def product_search_index_stats():
+    """
+    Estado del índice de búsqueda de productos de este worker.
+    """
+    search = get_product_search()
+    if search is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **search.stats()})
+
 @products_search_bp.route('/products/by-category/<int:category_id>', methods=['GET'])
 def get_products_by_category(category_id):
     """
@@ -1,21 +1,154 @@
 from flask import Blueprint, request, jsonify
-import json
+import base64
+import hashlib
+import hmac
+import logging
+
+from config import Config
+from utils.catalog_cache import ATTRIBUTES, CATEGORIES, ORISHAS, invalidate_catalog
+from utils.order_store import get_order_store
+from utils.product_index import record_product_changes
 
 webhooks_bp = Blueprint('webhooks_bp', __name__)
 
+logger = logging.getLogger(__name__)
+
+
+def verify_webhook_signature():
+    """
+    Comprueba la firma X-WC-Webhook-Signature si hay un secreto configurado.
+    """
+    if not Config.WC_WEBHOOK_SECRET:
+        return True
+
+    signature = request.headers.get('X-WC-Webhook-Signature', '')
+    digest = hmac.new(Config.WC_WEBHOOK_SECRET.encode(), request.get_data(), hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), signature)
+
+
 @webhooks_bp.route('/webhooks/orders', methods=['POST'])
 def handle_order_webhook():
     """
     Handles order-related webhooks from WooCommerce.
+
+    Mantiene la réplica local de pedidos al día: order.created/updated/restored
+    guardan el pedido recibido y order.deleted lo elimina.
+    """
+    if not verify_webhook_signature():
+        return jsonify({"error": "Invalid signature"}), 401
+
+    data = request.get_json(silent=True)
+    topic = request.headers.get('X-WC-Webhook-Topic', '')
+
+    # WooCommerce envía un ping (webhook_id=...) al crear el webhook
+    if not isinstance(data, dict) or not data.get('id'):
+        return jsonify({"status": "received"}), 200
+
+    try:
+        store = get_order_store()
+        if topic == 'order.deleted':
+            store.delete_order(data['id'])
+        else:
+            store.upsert_orders([data])
+        logger.info(f"Order webhook {topic or 'unknown'} applied to order {data['id']}")
+    except Exception as e:
+        logger.error(f"Error applying order webhook for order {data.get('id')}: {e}")
+        return jsonify({"error": "Error procesando el webhook"}), 500
+
+    return jsonify({"status": "received"}), 200
+
+
+@webhooks_bp.route('/webhooks/customers', methods=['POST'])
+def handle_customer_webhook():
+    """
+    Mantiene al día los clientes registrados del directorio de búsqueda:
+    customer.created/updated guardan el cliente recibido y customer.deleted lo quita.
+    """
+    if not verify_webhook_signature():
+        return jsonify({"error": "Invalid signature"}), 401
+
+    data = request.get_json(silent=True)
+    topic = request.headers.get('X-WC-Webhook-Topic', '')
+
+    # Ping de WooCommerce al crear el webhook
+    if not isinstance(data, dict) or not data.get('id'):
+        return jsonify({"status": "received"}), 200
+
+    try:
+        store = get_order_store()
+        if topic == 'customer.deleted':
+            store.delete_customer(data['id'])
+        else:
+            store.upsert_customers([data])
+        logger.info(f"Customer webhook {topic or 'unknown'} applied to customer {data['id']}")
+    except Exception as e:
+        logger.error(f"Error applying customer webhook for customer {data.get('id')}: {e}")
+        return jsonify({"error": "Error procesando el webhook"}), 500
+
+    return jsonify({"status": "received"}), 200
+
+
+@webhooks_bp.route('/webhooks/products', methods=['POST'])
+def handle_product_webhook():
     """
-    data = request.get_json()
-    
-    # Process the webhook data here
-    # For now, we'll just print it to the console
-    print("Received order webhook:")
-    print(json.dumps(data, indent=2))
-    
-    # You should add your logic here to process the order update.
-    # For example, update your own database, send notifications, etc.
-
-    return jsonify({"status": "received"}), 200 
\ No newline at end of file
+    Mantiene al día el índice de búsqueda de productos con los cambios hechos
+    fuera del panel: product.created/updated/restored anotan el producto recibido
+    y product.deleted lo quita.
+    """
+    if not verify_webhook_signature():
+        return jsonify({"error": "Invalid signature"}), 401
+
+    data = request.get_json(silent=True)
+    topic = request.headers.get('X-WC-Webhook-Topic', '')
+
+    # Ping de WooCommerce al crear el webhook
+    if not isinstance(data, dict) or not data.get('id'):
+        return jsonify({"status": "received"}), 200
+
+    if topic == 'product.deleted':
+        record_product_changes(deleted_ids=[data['id']])
+    else:
+        record_product_changes([data])
+    if topic in ('product.created', 'product.deleted', 'product.restored'):
+        # El recuento de productos de las categorías cambia
+        invalidate_catalog(CATEGORIES)
+    logger.info(f"Product webhook {topic or 'unknown'} applied to product {data['id']}")
+    return jsonify({"status": "received"}), 200
+
+
+def catalog_namespaces_for_topic(topic):
+    """
+    Espacios de la caché del catálogo afectados por un webhook. WooCommerce no
+    tiene temas propios para taxonomías: se configuran webhooks de acción
+    (action.created_product_cat, action.edited_pa_talla,
+    action.woocommerce_attribute_updated, ...).
+    """
+    topic = topic.lower()
+    namespaces = []
+    if 'product_cat' in topic:
+        namespaces.append(CATEGORIES)
+    if 'product_brand' in topic:
+        namespaces.append(ORISHAS)
+    if '_pa_' in topic or 'woocommerce_attribute' in topic:
+        namespaces.append(ATTRIBUTES)
+    return namespaces
+
+
+@webhooks_bp.route('/webhooks/catalog', methods=['POST'])
+def handle_catalog_webhook():
+    """
+    Invalida la caché de categorías, atributos u orishas cuando cambian fuera del
+    panel (wp-admin, importaciones). Un tema que no se reconoce invalida todo.
+    """
+    if not verify_webhook_signature():
+        return jsonify({"error": "Invalid signature"}), 401
+
+    topic = request.headers.get('X-WC-Webhook-Topic', '')
+    # Ping de WooCommerce al crear el webhook
+    if not topic:
+        return jsonify({"status": "received"}), 200
+
+    namespaces = catalog_namespaces_for_topic(topic) or [CATEGORIES, ATTRIBUTES, ORISHAS]
+    invalidate_catalog(*namespaces)
+    logger.info(f"Catalog webhook {topic} invalidated {', '.join(namespaces)}")
+    return jsonify({"status": "received", "invalidated": namespaces}), 200
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Gestión de la réplica local de pedidos (DATA_DIR/orders.db).
+
+Uso:
+    python sync_orders.py backfill            # Descarga todos los pedidos de WooCommerce
+    python sync_orders.py backfill --reset    # Vacía la réplica antes de descargar
+    python sync_orders.py resync              # Trae lo modificado desde la marca de agua
+    python sync_orders.py resync --since 2024-01-01T00:00:00
+    python sync_orders.py rollups             # Recalcula los agregados de ventas por hora/día
+    python sync_orders.py customers           # Descarga los clientes registrados al directorio de búsqueda
+    python sync_orders.py status              # Muestra el estado de la réplica
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+from utils.order_store import get_order_store
+from utils.order_sync import backfill_orders, sync_customers, sync_modified_orders
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplica local de pedidos de WooCommerce")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backfill_parser = subparsers.add_parser('backfill', help="Descarga completa de pedidos")
+    backfill_parser.add_argument('--reset', action='store_true', help="Vaciar la réplica antes de descargar")
+
+    resync_parser = subparsers.add_parser('resync', help="Sincronización incremental (modified_after)")
+    resync_parser.add_argument('--since', help="Fecha GMT ISO desde la que resincronizar")
+
+    subparsers.add_parser('rollups', help="Recalcular los agregados de ventas desde los pedidos")
+    subparsers.add_parser('customers', help="Descargar los clientes registrados al directorio de búsqueda")
+    subparsers.add_parser('status', help="Estado de la réplica")
+
+    args = parser.parse_args()
+    store = get_order_store()
+    started = time.time()
+
+    try:
+        if args.command == 'backfill':
+            if args.reset:
+                store.clear()
+                print("🗑️  Réplica vaciada")
+            total = backfill_orders(store)
+            print(f"✅ Backfill completado: {total} pedidos en {time.time() - started:.1f}s")
+        elif args.command == 'resync':
+            total = sync_modified_orders(store, since=args.since)
+            print(f"✅ Resincronización completada: {total} pedidos actualizados en {time.time() - started:.1f}s")
+        elif args.command == 'rollups':
+            store.rebuild_revenue_rollups()
+            print(f"✅ Agregados de ventas recalculados en {time.time() - started:.1f}s")
+        elif args.command == 'customers':
+            total = sync_customers(store)
+            print(f"✅ Directorio de clientes actualizado: {total} clientes registrados en {time.time() - started:.1f}s")
+
+        _, total_orders = store.query_orders(per_page=1)
+        print(json.dumps({
+            'orders': total_orders,
+            'ready': store.is_ready(),
+            'backfill_completed_at': store.get_state('backfill_completed_at'),
+            'revenue_rollups_built_at': store.get_state('revenue_rollups_built_at'),
+            'customers_synced_at': store.get_state('customers_synced_at'),
+            **store.freshness()
+        }, indent=2))
+    except ValueError as e:
+        print(f"❌ Error de configuración: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Comprueba el directorio de clientes de la réplica local (búsqueda de /customers/search)
+contra una búsqueda por fuerza bruta sobre los mismos clientes.
+
+Usa una base de datos temporal: no necesita WooCommerce ni toca DATA_DIR.
+
+Uso:
+    python test_customer_search.py [--orders 3000] [--customers 300] [--seed 7]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from utils.api_helpers import build_guest_customers
+from utils.customer_directory import MAX_CANDIDATES, customer_search_text
+from utils.order_store import OrderStore
+from utils.text_index import match_score, query_tokens
+
+FIRST_NAMES = ['María', 'José', 'Ángel', 'Lucía', 'Oshún', 'Raúl', 'Inés', 'Iván', 'Nicolás', 'Yolanda']
+LAST_NAMES = ['Pérez', 'García', 'Núñez', 'Martínez', 'López', 'Hernández', 'Díaz', 'Álvarez']
+CITIES = ['Mérida', 'México', 'Cancún', 'Querétaro', 'León']
+STATUSES = ['completed', 'processing', 'pending', 'cancelled', 'checkout-draft']
+
+
+def random_billing(rnd, email):
+    return {
+        'first_name': rnd.choice(FIRST_NAMES),
+        'last_name': rnd.choice(LAST_NAMES),
+        'email': email,
+        'phone': f"+52 55 {rnd.randrange(1000, 9999)} {rnd.randrange(1000, 9999)}",
+        'city': rnd.choice(CITIES)
+    }
+
+
+def random_order(rnd, order_id, customers):
+    customer_id = rnd.choice([0, 0, 0] + list(customers))
+    email = customers[customer_id]['email'] if customer_id else f"invitado{rnd.randrange(400)}@example.com"
+    return {
+        'id': order_id,
+        'number': str(order_id),
+        'status': rnd.choice(STATUSES),
+        'customer_id': customer_id,
+        'total': f"{rnd.uniform(1, 900):.2f}",
+        'date_created': f"2025-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}T10:00:00",
+        'billing': random_billing(rnd, email)
+    }
+
+
+def random_customer(rnd, customer_id):
+    billing = random_billing(rnd, f"cliente{customer_id}@example.com")
+    return {
+        'id': customer_id,
+        'first_name': billing['first_name'],
+        'last_name': billing['last_name'],
+        'email': billing['email'],
+        'username': f"user{customer_id}",
+        'role': rnd.choice(['customer', 'customer', 'administrator']),
+        'billing': billing
+    }
+
+
+def word_start_match(tokens, search_text):
+    """True si cada palabra de la consulta es una palabra o el inicio de una."""
+    words = search_text.split()
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def brute_search(customers, orders, query, word_start=False):
+    """
+    Claves de los clientes que deberían aparecer, recorriéndolos todos (con
+    word_start=True, sólo las coincidencias exactas o de prefijo).
+    """
+    guest_orders = sorted(
+        (o for o in orders.values() if not o['customer_id'] and o['status'] not in ('checkout-draft', 'trash')),
+        key=lambda o: (o['date_created'], o['id']), reverse=True
+    )
+    entries = {f"c:{c['id']}": c for c in customers.values()}
+    for guest in build_guest_customers(guest_orders, list(customers.values()), include_links=False):
+        entries[f"g:{guest['email'].strip().lower()}"] = guest
+    tokens = query_tokens(query)
+    if word_start:
+        return {key for key, entry in entries.items() if word_start_match(tokens, customer_search_text(entry))}
+    return {key for key, entry in entries.items() if match_score(tokens, customer_search_text(entry)) is not None}
+
+
+def result_keys(results):
+    return {
+        f"c:{c['id']}" if c.get('role') != 'guest' else f"g:{c['email'].strip().lower()}"
+        for c in results
+    }
+
+
+def check(store, customers, orders, rnd, label):
+    queries = ['maria', 'MARÍA pérez', 'garc', 'nunez', 'oshun', 'example', 'invitado1', 'cliente2@', 'user1',
+               'merida', '55', 'x', 'zzz']
+    queries += [str(rnd.randrange(1000, 9999)) for _ in range(20)]
+    queries += [rnd.choice(FIRST_NAMES)[:rnd.randrange(1, 5)] for _ in range(20)]
+    for query in queries:
+        expected = brute_search(customers, orders, query)
+        actual = result_keys(store.search_customers(query, limit=100000))
+        if len(expected) > MAX_CANDIDATES:
+            # Consultas muy amplias: sólo se puntúan MAX_CANDIDATES candidatos, empezando
+            # por las coincidencias exactas y de prefijo
+            assert actual <= expected, f"{label}: '{query}' devuelve clientes que no coinciden"
+            word_start = brute_search(customers, orders, query, word_start=True)
+            if len(word_start) <= MAX_CANDIDATES:
+                assert word_start <= actual, f"{label}: '{query}' pierde coincidencias de prefijo {word_start - actual}"
+            continue
+        assert actual == expected, f"{label}: '{query}' distinto\nsobran {actual - expected}\nfaltan {expected - actual}"
+    print(f"✅ {label}: {len(queries)} búsquedas coinciden con la fuerza bruta")
+
+
+def check_broad_substring_query():
+    """
+    Un nombre corto que aparece como subcadena en muchos clientes ("ana" en
+    "Mariana") no pierde a los que se llaman así.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        store = OrderStore(os.path.join(tmp, 'orders.db'))
+        customers = [
+            {'id': i, 'first_name': 'Mariana', 'last_name': 'Gómez', 'email': f"mariana{i}@example.com", 'role': 'customer'}
+            for i in range(1, MAX_CANDIDATES * 2 + 1)
+        ]
+        customers.append({'id': 9999, 'first_name': 'Ana', 'last_name': 'Ruiz', 'email': 'ana@example.com',
+                          'role': 'customer'})
+        store.replace_customers(customers)
+        results = store.search_customers('ana', limit=5)
+        assert results and results[0]['id'] == 9999, f"'ana' no devuelve primero a Ana Ruiz: {[c['id'] for c in results]}"
+        assert len(results) == 5
+    print("✅ Consulta amplia: las coincidencias de palabra van antes que las de subcadena")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=3000)
+    parser.add_argument('--customers', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = OrderStore(os.path.join(tmp, 'orders.db'))
+        customers = {i: random_customer(rnd, i) for i in range(1, args.customers + 1)}
+        store.replace_customers(list(customers.values()))
+        check_broad_substring_query()
+
+        # 1. Alta inicial de pedidos en lotes, como el backfill
+        orders = {i: random_order(rnd, i, customers) for i in range(1, args.orders + 1)}
+        batch = list(orders.values())
+        for offset in range(0, len(batch), 100):
+            store.upsert_orders(batch[offset:offset + 100])
+        check(store, customers, orders, rnd, "Backfill")
+
+        # 2. Cambios incrementales de pedidos y clientes
+        for _ in range(args.orders // 2):
+            action = rnd.random()
+            order_id = rnd.randrange(1, args.orders + 200)
+            if action < 0.1 and order_id in orders:
+                store.delete_order(order_id)
+                del orders[order_id]
+            elif action < 0.6:
+                orders[order_id] = random_order(rnd, order_id, customers)
+                store.upsert_orders([orders[order_id]])
+            elif action < 0.8:
+                customer_id = rnd.choice(list(customers))
+                customers[customer_id] = random_customer(rnd, customer_id)
+                store.upsert_customers([customers[customer_id]])
+            elif action < 0.85:
+                customer_id = rnd.choice(list(customers))
+                if not any(o['customer_id'] == customer_id for o in orders.values()):
+                    del customers[customer_id]
+                    store.delete_customer(customer_id)
+        check(store, customers, orders, rnd, "Cambios incrementales")
+
+        # 3. Reconstruir los invitados desde cero deja el mismo índice
+        conn = store.connection()
+        snapshot = {
+            table: sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {table}"))
+            for table in ('customer_directory', 'customer_grams', 'customer_gram_counts')
+        }
+        store.rebuild_guest_directory()
+        for table, rows in snapshot.items():
+            assert rows == sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {table}")), f"{table} difiere"
+        print("✅ Recálculo completo idéntico al mantenimiento incremental")
+
+        started = time.perf_counter()
+        queries = ['mar', 'garcia', 'cliente12', '1234', 'oshun mer', 'example']
+        for query in queries:
+            store.search_customers(query, limit=10)
+        print(f"⏱️  {(time.perf_counter() - started) / len(queries) * 1000:.2f} ms por búsqueda")
+
+
+if __name__ == '__main__':
+    main()
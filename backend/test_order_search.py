@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Comprueba el índice de búsqueda de pedidos de la réplica local (/orders/search)
+contra una búsqueda por fuerza bruta sobre los mismos pedidos.
+
+Usa una base de datos temporal: no necesita WooCommerce ni toca DATA_DIR.
+
+Uso:
+    python test_order_search.py [--orders 5000] [--seed 11]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from utils.order_index import EXCLUDED_STATUSES, MAX_CANDIDATES, _search_tokens, order_search_text
+from utils.order_store import OrderStore
+from utils.text_index import match_score
+
+FIRST_NAMES = ['María', 'José', 'Ángel', 'Lucía', 'Oshún', 'Raúl', 'Inés', 'Iván', 'Nicolás', 'Yolanda']
+LAST_NAMES = ['Pérez', 'García', 'Núñez', 'Martínez', 'López', 'Hernández', 'Díaz', 'Álvarez']
+STATUSES = ['completed', 'processing', 'pending', 'cancelled', 'checkout-draft', 'trash']
+
+
+def random_order(rnd, order_id):
+    first_name = rnd.choice(FIRST_NAMES)
+    return {
+        'id': order_id,
+        'number': str(order_id),
+        'status': rnd.choice(STATUSES),
+        'customer_id': rnd.choice([0, rnd.randrange(1, 300)]),
+        'total': f"{rnd.uniform(1, 900):.2f}",
+        'currency': 'MXN',
+        'date_created': f"2025-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}T{rnd.randrange(24):02d}:00:00",
+        'billing': {
+            'first_name': first_name,
+            'last_name': rnd.choice(LAST_NAMES),
+            'email': f"{first_name.lower()}{rnd.randrange(500)}@example.com",
+            'phone': f"+52 55 {rnd.randrange(1000, 9999)} {rnd.randrange(1000, 9999)}"
+        },
+        'line_items': [
+            {'sku': f"SKU-{rnd.randrange(200)}", 'quantity': rnd.randrange(1, 4)}
+            for _ in range(rnd.randrange(0, 4))
+        ]
+    }
+
+
+def word_start_match(tokens, search_text):
+    """True si cada palabra de la consulta es una palabra o el inicio de una."""
+    words = search_text.split()
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def brute_search(orders, query, word_start=False):
+    """
+    IDs de los pedidos que deberían aparecer, recorriéndolos todos, y cuántos
+    coinciden contando los estados excluidos (el límite de candidatos los incluye).
+    Con word_start=True, sólo las coincidencias exactas o de prefijo.
+    """
+    tokens = _search_tokens(query)
+    if word_start:
+        matching = [order for order in orders.values() if word_start_match(tokens, order_search_text(order))]
+    else:
+        matching = [order for order in orders.values() if match_score(tokens, order_search_text(order)) is not None]
+    return {order['id'] for order in matching if order['status'] not in EXCLUDED_STATUSES}, len(matching)
+
+
+def check(store, orders, rnd, label):
+    queries = ['maria', 'MARÍA pérez', 'garc', 'nunez', 'oshun', 'example', 'sku-1', 'SKU-17',
+               '55', 'x', 'zzz', '#12', '+52 55']
+    queries += [str(rnd.choice(list(orders))) for _ in range(20)]
+    queries += [f"#{rnd.choice(list(orders))}" for _ in range(5)]
+    queries += [str(rnd.randrange(1000, 9999)) for _ in range(20)]
+    queries += [rnd.choice(list(orders.values()))['billing']['email'][:rnd.randrange(3, 12)] for _ in range(10)]
+    queries += [rnd.choice(list(orders.values()))['billing']['email'] for _ in range(5)]
+    for query in queries:
+        expected, matching = brute_search(orders, query)
+        results = store.search_orders(query, limit=100000)
+        actual = {order['id'] for order in results}
+        assert len(actual) == len(results), f"{label}: '{query}' devuelve pedidos repetidos"
+        number = query.lstrip('#')
+        if number.isdigit() and int(number) in expected:
+            assert results[0]['id'] == int(number), f"{label}: '{query}' no devuelve primero el pedido {number}"
+        if matching > MAX_CANDIDATES:
+            # Consultas muy amplias: sólo se puntúan MAX_CANDIDATES pedidos, empezando por
+            # las coincidencias exactas y de prefijo
+            assert actual <= expected, f"{label}: '{query}' devuelve pedidos que no coinciden"
+            word_start, word_start_matching = brute_search(orders, query, word_start=True)
+            if word_start_matching <= MAX_CANDIDATES:
+                assert word_start <= actual, f"{label}: '{query}' pierde coincidencias de prefijo {word_start - actual}"
+            continue
+        assert actual == expected, f"{label}: '{query}' distinto\nsobran {actual - expected}\nfaltan {expected - actual}"
+        scores = [match_score(_search_tokens(query), order_search_text(orders[o['id']])) for o in results]
+        assert all(a >= b for a, b in zip(scores[1:], scores[2:])), f"{label}: '{query}' mal ordenado"
+    print(f"✅ {label}: {len(queries)} búsquedas coinciden con la fuerza bruta")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = OrderStore(os.path.join(tmp, 'orders.db'))
+
+        # 1. Alta inicial de pedidos en lotes, como el backfill
+        orders = {i: random_order(rnd, i) for i in range(1, args.orders + 1)}
+        batch = list(orders.values())
+        for offset in range(0, len(batch), 100):
+            store.upsert_orders(batch[offset:offset + 100])
+        check(store, orders, rnd, "Backfill")
+
+        # 2. Cambios incrementales (sondeo de modificaciones y webhooks)
+        for _ in range(args.orders // 2):
+            order_id = rnd.randrange(1, args.orders + 200)
+            if rnd.random() < 0.1 and order_id in orders:
+                store.delete_order(order_id)
+                del orders[order_id]
+            else:
+                orders[order_id] = random_order(rnd, order_id)
+                store.upsert_orders([orders[order_id]])
+        check(store, orders, rnd, "Cambios incrementales")
+
+        # 3. Reindexar desde cero deja el mismo índice
+        conn = store.connection()
+        snapshot = {
+            table: sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {table}"))
+            for table in ('order_index', 'order_grams', 'order_gram_counts')
+        }
+        store.rebuild_order_index()
+        for table, rows in snapshot.items():
+            assert rows == sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {table}")), f"{table} difiere"
+        print("✅ Reindexado completo idéntico al mantenimiento incremental")
+
+        started = time.perf_counter()
+        queries = ['1234', '#42', 'maria', 'garcia lopez', 'sku-17', 'maria12@', '55 1234', 'example']
+        for query in queries:
+            store.search_orders(query, limit=10)
+        print(f"⏱️  {(time.perf_counter() - started) / len(queries) * 1000:.2f} ms por búsqueda")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Prueba la generación de fotos con IA contra un Replicate local de pega.
+
+Levanta un servidor HTTP que imita /v1/predictions (la predicción pasa por
+'starting' y 'processing' con logs de avance antes de 'succeeded') y sirve la
+imagen resultante. Comprueba que /ai/generate-product-photo?async=1 responde al
+momento, que el stream SSE emite el progreso y el resultado, que la imagen y
+el índice de imágenes se escriben en segundo plano, que el sondeo usa espera exponencial y
+que repetir la misma petición sale de la caché de generaciones sin llamar a Replicate.
+
+No necesita credenciales reales: usa un DATA_DIR y un directorio de imágenes temporales.
+
+Uso:
+    python test_replicate_job.py [--polls 6]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class FakeReplicate(BaseHTTPRequestHandler):
+    polls_until_done = 6
+    poll_times = []
+    created = []
+    image = png_bytes()
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/v1/predictions':
+            assert self.headers.get('Authorization') == 'Token test-token'
+            FakeReplicate.created.append(json.loads(body))
+            self.send_json(201, {'id': 'pred-1', 'status': 'starting', 'output': None, 'logs': ''})
+        else:
+            self.send_json(200, {'id': 'pred-1', 'status': 'canceled'})
+
+    def do_GET(self):
+        if self.path == '/output.png':
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(self.image)))
+            self.end_headers()
+            self.wfile.write(self.image)
+            return
+
+        FakeReplicate.poll_times.append(time.monotonic())
+        polls = len(FakeReplicate.poll_times)
+        if polls >= self.polls_until_done:
+            host = self.headers.get('Host')
+            self.send_json(200, {
+                'id': 'pred-1', 'status': 'succeeded', 'logs': '100%|##########| 4/4',
+                'output': [f"http://{host}/output.png"]
+            })
+        else:
+            percent = int(100 * polls / self.polls_until_done)
+            self.send_json(200, {'id': 'pred-1', 'status': 'processing', 'output': None,
+                                 'logs': f" {percent}%|#####     | {polls}/{self.polls_until_done}"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polls', type=int, default=6)
+    args = parser.parse_args()
+    FakeReplicate.polls_until_done = args.polls
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeReplicate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        'REPLICATE_API_TOKEN': 'test-token',
+        'REPLICATE_API_URL': f"http://127.0.0.1:{server.server_port}/v1",
+        'REPLICATE_POLL_INITIAL': '0.1',
+        'REPLICATE_POLL_MAX': '0.4',
+        'DATA_DIR': os.path.join(tmp, 'data'),
+        'GENERATED_IMAGES_DIR': os.path.join(tmp, 'generated-images'),
+        'ORDER_SYNC_INTERVAL': '0',
+        'JOB_POLL_INTERVAL': '0.1'
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    client = app.test_client()
+
+    # 1. La petición responde al momento con el id del trabajo
+    started = time.monotonic()
+    response = client.post('/api/ai/generate-product-photo?async=1', data={
+        'prompt': 'collar de cuentas',
+        'image': (io.BytesIO(png_bytes()), 'input.png')
+    }, content_type='multipart/form-data')
+    elapsed = time.monotonic() - started
+    assert response.status_code == 202, response.get_json()
+    job_id = response.get_json()['job_id']
+    assert elapsed < 1, f"La petición tardó {elapsed:.2f}s"
+    print(f"✅ 202 en {elapsed * 1000:.0f} ms (job {job_id})")
+
+    # 2. El stream SSE emite progreso y termina con 'done'
+    stream = client.get(f'/api/ai/generate-product-photo/{job_id}/events')
+    assert stream.headers['Content-Type'].startswith('text/event-stream')
+    events = []
+    for block in stream.get_data(as_text=True).split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if line and not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    names = [name for name, _ in events]
+    assert names[-1] == 'done', events
+    percents = [data.get('percent') for name, data in events if name == 'progress' and data.get('percent') is not None]
+    assert percents == sorted(percents) and percents, percents
+    result = events[-1][1]
+    print(f"✅ SSE: {len(events)} eventos, avance {percents}, resultado {result['fileName']}")
+
+    # 3. Imagen e índice escritos fuera de la petición
+    images_dir = os.environ['GENERATED_IMAGES_DIR']
+    assert os.path.getsize(os.path.join(images_dir, result['fileName'])) == len(FakeReplicate.image)
+    listing = client.get('/api/ai/generated-images?search=CUENTAS').get_json()
+    assert listing['total'] == 1 and listing['images'][0]['fileName'] == result['fileName'], listing
+    assert listing['images'][0]['prompt'] == 'collar de cuentas'
+    print("✅ Imagen descargada y registrada en el índice")
+
+    # 4. Espera exponencial entre sondeos (limitada por REPLICATE_POLL_MAX)
+    gaps = [b - a for a, b in zip(FakeReplicate.poll_times, FakeReplicate.poll_times[1:])]
+    assert len(FakeReplicate.poll_times) == args.polls, FakeReplicate.poll_times
+    assert all(gap >= 0.09 for gap in gaps) and gaps[-1] > gaps[0], gaps
+    print(f"✅ {len(FakeReplicate.poll_times)} sondeos, esperas {[round(g, 2) for g in gaps]}")
+
+    # 5. Estado final en el endpoint del trabajo
+    job = client.get(f'/api/ai/generate-product-photo/{job_id}').get_json()
+    assert job['status'] == 'succeeded' and job['result'] == result
+    print("✅ Estado del trabajo: succeeded")
+
+    # 6. La misma imagen y el mismo prompt salen de la caché, sin nueva predicción
+    response = client.post('/api/ai/generate-product-photo?async=1', data={
+        'prompt': '  collar de  cuentas',
+        'image': (io.BytesIO(png_bytes()), 'input.png')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200 and response.get_json()['cached'] is True, response.get_json()
+    assert response.get_json()['fileName'] == result['fileName'] and len(FakeReplicate.created) == 1
+    response = client.post('/api/ai/generate-product-photo?async=1&force=1', data={
+        'prompt': 'collar de cuentas',
+        'image': (io.BytesIO(png_bytes()), 'input.png')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 202 and len(FakeReplicate.created) == 2
+    print("✅ Caché: petición repetida servida al momento; force=1 vuelve a generar")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Comprueba los agregados de ventas de la réplica local (revenue_hourly/revenue_daily)
+contra un recálculo por fuerza bruta sobre los pedidos.
+
+Usa una base de datos temporal: no necesita WooCommerce ni toca DATA_DIR.
+
+Uso:
+    python test_revenue_rollups.py [--orders 3000] [--seed 7]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from utils.order_store import OrderStore
+
+STATUSES = ['completed', 'processing', 'pending', 'cancelled', 'on-hold', 'refunded', 'checkout-draft']
+CURRENCIES = ['MXN', 'USD']
+
+
+def random_order(rnd, order_id, start):
+    created = start + timedelta(minutes=rnd.randrange(0, 60 * 24 * 400))
+    return {
+        'id': order_id,
+        'number': str(order_id),
+        'status': rnd.choice(STATUSES),
+        'currency': rnd.choice(CURRENCIES),
+        'total': f"{rnd.uniform(1, 900):.2f}",
+        'customer_id': rnd.randrange(0, 50),
+        'date_created': created.strftime('%Y-%m-%dT%H:%M:%S'),
+        'date_modified_gmt': created.strftime('%Y-%m-%dT%H:%M:%S'),
+        'billing': {'email': f"c{order_id % 97}@example.com"}
+    }
+
+
+def brute_summary(orders, after=None, before=None, exclude_statuses=()):
+    """Mismo resultado que revenue_summary, recorriendo todos los pedidos."""
+    start = after[:13] if after else None
+    end = before[:13] if before else None
+    summary = {}
+    for order in orders.values():
+        hour = order['date_created'][:13]
+        if order['status'] in exclude_statuses:
+            continue
+        if (start and hour < start) or (end and hour >= end):
+            continue
+        entry = summary.setdefault(order['status'], {'orders': 0, 'cents': 0})
+        entry['orders'] += 1
+        entry['cents'] += int(round(float(order['total']) * 100))
+    return {status: {'orders': e['orders'], 'revenue': e['cents'] / 100} for status, e in summary.items()}
+
+
+def brute_series(orders, length, statuses=('completed', 'processing')):
+    series = {}
+    for order in orders.values():
+        if order['status'] not in statuses:
+            continue
+        entry = series.setdefault(order['date_created'][:length], {'orders': 0, 'cents': 0})
+        entry['orders'] += 1
+        entry['cents'] += int(round(float(order['total']) * 100))
+    return [
+        {'period': period, 'orders': e['orders'], 'revenue': e['cents'] / 100}
+        for period, e in sorted(series.items())
+    ]
+
+
+def random_bound(rnd, start):
+    moment = start + timedelta(minutes=rnd.randrange(0, 60 * 24 * 420))
+    return rnd.choice([
+        moment.strftime('%Y-%m-%dT%H:%M:%S'),
+        moment.strftime('%Y-%m-%dT00:00:00'),
+        moment.strftime('%Y-%m-%d')
+    ])
+
+
+def check(store, orders, rnd, start, label):
+    for granularity, length in (('hour', 13), ('day', 10), ('month', 7), ('year', 4)):
+        assert store.revenue_series(granularity) == brute_series(orders, length), f"{label}: serie '{granularity}' distinta"
+
+    ranges = [(None, None)]
+    for _ in range(200):
+        after, before = random_bound(rnd, start), random_bound(rnd, start)
+        ranges.append((min(after, before), max(after, before)))
+        ranges.append((after, None))
+        ranges.append((None, before))
+    for after, before in ranges:
+        expected = brute_summary(orders, after, before, exclude_statuses=('checkout-draft',))
+        actual = store.revenue_summary(after=after, before=before, exclude_statuses=['checkout-draft'])
+        assert actual == expected, f"{label}: resumen distinto para [{after}, {before})\n{actual}\n{expected}"
+    print(f"✅ {label}: series y {len(ranges)} rangos coinciden con el recálculo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    start = datetime(2024, 1, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = OrderStore(os.path.join(tmp, 'orders.db'))
+        orders = {}
+
+        # 1. Alta inicial en lotes, como el backfill
+        batch = [random_order(rnd, i + 1, start) for i in range(args.orders)]
+        for offset in range(0, len(batch), 100):
+            store.upsert_orders(batch[offset:offset + 100])
+        orders.update({o['id']: o for o in batch})
+        check(store, orders, rnd, start, "Backfill")
+
+        # 2. Cambios incrementales: estado, importe, fecha, moneda y borrados
+        for _ in range(args.orders):
+            order_id = rnd.randrange(1, args.orders + 200)
+            action = rnd.random()
+            if action < 0.15 and order_id in orders:
+                store.delete_order(order_id)
+                del orders[order_id]
+            elif order_id in orders:
+                order = dict(orders[order_id])
+                field = rnd.choice(['status', 'total', 'date_created', 'currency'])
+                changed = random_order(rnd, order_id, start)
+                order[field] = changed[field]
+                store.upsert_orders([order])
+                orders[order_id] = order
+            else:
+                order = random_order(rnd, order_id, start)
+                store.upsert_orders([order])
+                orders[order_id] = order
+        check(store, orders, rnd, start, "Cambios incrementales")
+
+        # 3. Una versión anterior del pedido (webhook retrasado) no deshace la guardada
+        order_id = next(iter(orders))
+        stale = dict(orders[order_id], status='cancelled', total='1.00', date_modified_gmt='2000-01-01T00:00:00')
+        assert store.upsert_orders([stale]) == 0, "se guarda una versión anterior del pedido"
+        check(store, orders, rnd, start, "Versión anterior ignorada")
+
+        # 4. El recálculo completo produce las mismas tablas que el mantenimiento incremental
+        conn = store.connection()
+        before_rebuild = {
+            table: conn.execute(f"SELECT * FROM {table} ORDER BY bucket, status, currency").fetchall()
+            for table in ('revenue_hourly', 'revenue_daily')
+        }
+        store.rebuild_revenue_rollups()
+        for table, rows in before_rebuild.items():
+            rebuilt = conn.execute(f"SELECT * FROM {table} ORDER BY bucket, status, currency").fetchall()
+            assert [tuple(r) for r in rows] == [tuple(r) for r in rebuilt], f"{table} difiere tras el recálculo"
+        print("✅ Recálculo completo idéntico al mantenimiento incremental")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_cache (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_ai_cache_last_access ON ai_cache (last_access);
+
+CREATE TABLE IF NOT EXISTS ai_cache_stats (
+    kind TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    stores INTEGER NOT NULL DEFAULT 0,
+    evictions INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def normalize_text(text):
+    """
+    Normaliza texto libre para la clave: espacios colapsados y sin espacios en los extremos.
+    """
+    return ' '.join(str(text or '').split())
+
+
+def normalize_terms(terms):
+    """
+    Normaliza listas sin orden significativo (palabras clave): sin duplicados
+    (sin distinguir mayúsculas, se conserva la primera forma) y ordenadas.
+    """
+    unique = {}
+    for term in terms or []:
+        term = normalize_text(term)
+        if term:
+            unique.setdefault(term.casefold(), term)
+    return [unique[folded] for folded in sorted(unique)]
+
+
+def force_regenerate_requested(data=None):
+    """
+    Saltarse la caché: "forceRegenerate": true en el JSON o el formulario, o ?force=1.
+    """
+    if isinstance(data, dict) and data.get('forceRegenerate') is True:
+        return True
+    flag = request.form.get('forceRegenerate') or request.args.get('force') or ''
+    return flag.lower() in ('1', 'true')
+
+
+def cache_key(kind, **parts):
+    """
+    Clave de contenido: SHA-256 del JSON canónico de la petición normalizada.
+    """
+    canonical = json.dumps({'kind': kind, **parts}, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class AICache:
+    """
+    Caché en disco (SQLite) de generaciones de IA, compartida por los workers.
+
+    Las entradas caducan a los AI_CACHE_MAX_AGE_DAYS días y, si el total supera
+    AI_CACHE_MAX_BYTES, se expulsan las usadas hace más tiempo. Los contadores de
+    aciertos y fallos se guardan por tipo de generación.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _count(self, conn, kind, counter, amount=1):
+        conn.execute(
+            f"INSERT INTO ai_cache_stats (kind, {counter}) VALUES (?, ?) "
+            f"ON CONFLICT (kind) DO UPDATE SET {counter} = {counter} + excluded.{counter}",
+            (kind, amount)
+        )
+
+    def get(self, kind, key):
+        """
+        Devuelve el valor guardado o None (y cuenta el acierto o el fallo).
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute("SELECT value, created_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row['created_at'] > Config.AI_CACHE_MAX_AGE_DAYS * 86400:
+                conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                self._count(conn, kind, 'evictions')
+                row = None
+            if row is None:
+                self._count(conn, kind, 'misses')
+                return None
+            conn.execute("UPDATE ai_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._count(conn, kind, 'hits')
+        return json.loads(row['value'])
+
+    def put(self, kind, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, kind, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, data, len(data.encode('utf-8')), now, now)
+            )
+            self._count(conn, kind, 'stores')
+            self._evict(conn, now)
+
+    def invalidate(self, key):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+
+    def _evict(self, conn, now):
+        expired = conn.execute(
+            "SELECT kind, COUNT(*) AS n FROM ai_cache WHERE created_at < ? GROUP BY kind",
+            (now - Config.AI_CACHE_MAX_AGE_DAYS * 86400,)
+        ).fetchall()
+        for row in expired:
+            self._count(conn, row['kind'], 'evictions', row['n'])
+        conn.execute("DELETE FROM ai_cache WHERE created_at < ?", (now - Config.AI_CACHE_MAX_AGE_DAYS * 86400,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) AS total FROM ai_cache").fetchone()['total']
+        if total <= Config.AI_CACHE_MAX_BYTES:
+            return
+        for row in conn.execute("SELECT key, kind, size FROM ai_cache ORDER BY last_access").fetchall():
+            if total <= Config.AI_CACHE_MAX_BYTES:
+                break
+            conn.execute("DELETE FROM ai_cache WHERE key = ?", (row['key'],))
+            self._count(conn, row['kind'], 'evictions')
+            total -= row['size']
+
+    def stats(self):
+        conn = self.connection()
+        usage = {
+            row['kind']: {'entries': row['entries'], 'bytes': row['bytes']}
+            for row in conn.execute(
+                "SELECT kind, COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes FROM ai_cache GROUP BY kind"
+            )
+        }
+        kinds = {}
+        for row in conn.execute("SELECT * FROM ai_cache_stats"):
+            lookups = row['hits'] + row['misses']
+            kinds[row['kind']] = {
+                'hits': row['hits'],
+                'misses': row['misses'],
+                'hit_rate': round(row['hits'] / lookups, 3) if lookups else None,
+                'stores': row['stores'],
+                'evictions': row['evictions'],
+                **usage.get(row['kind'], {'entries': 0, 'bytes': 0})
+            }
+        return {
+            'kinds': kinds,
+            'total_bytes': sum(u['bytes'] for u in usage.values()),
+            'max_bytes': Config.AI_CACHE_MAX_BYTES,
+            'max_age_days': Config.AI_CACHE_MAX_AGE_DAYS
+        }
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM ai_cache")
+
+
+def get_ai_cache():
+    """
+    Devuelve la caché de generaciones compartida por el proceso, o None si está desactivada.
+    """
+    global _cache
+
+    if not Config.AI_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AICache(os.path.join(Config.DATA_DIR, 'ai_cache.db'))
+    return _cache
+
+
+def cached_lookup(kind, key):
+    """
+    Consulta la caché sin que un fallo de la caché rompa la generación.
+    """
+    try:
+        cache = get_ai_cache()
+        return cache.get(kind, key) if cache else None
+    except Exception as e:
+        logger.warning(f"AI cache lookup failed: {e}")
+        return None
+
+
+def cached_store(kind, key, value):
+    try:
+        cache = get_ai_cache()
+        if cache:
+            cache.put(kind, key, value)
+    except Exception as e:
+        logger.warning(f"AI cache store failed: {e}")
@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
 from functools import wraps
 from flask import jsonify
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,6 +22,18 @@ def handle_wc_errors(f):
             }), 500
     return decorated_function
 
+def utc_now_iso():
+    """
+    Fecha y hora UTC actual en ISO 8601 sin zona, como las fechas *_gmt de WooCommerce.
+    """
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+def sse_event(event, data):
+    """
+    Formatea un evento Server-Sent Events con datos JSON.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 def transform_order_for_frontend(order):
     """
     Transforma los datos de pedido de WooCommerce para el frontend.
@@ -227,4 +241,71 @@ def calculate_order_totals(line_items, shipping_total=0, tax_rate=0.21):
         'tax_total': round(tax_total, 2),
         'shipping_total': round(shipping_total, 2),
         'total': round(total, 2)
-    } 
\ No newline at end of file
+    }
+
+def build_guest_customers(orders, registered_customers, include_links=True):
+    """
+    Construye los clientes invitados a partir de sus pedidos en una sola pasada.
+
+    Los pedidos se agrupan por email (normalizado) en un diccionario, así que el
+    coste es O(pedidos + clientes registrados). Se omiten los emails de clientes
+    registrados con rol 'customer'. Los datos de facturación/envío se toman del
+    primer pedido recibido de cada email (el más reciente si vienen ordenados
+    por fecha descendente, como devuelve WooCommerce).
+    """
+    registered_emails = {
+        (customer.get('email') or '').strip().lower()
+        for customer in registered_customers
+        if customer.get('role') == 'customer'
+    }
+
+    guests = {}
+    for order in orders:
+        billing = order.get('billing') or {}
+        email_addr = (billing.get('email') or '').strip().lower()
+        if not email_addr or email_addr in registered_emails:
+            continue
+
+        date_created = order.get('date_created') or ''
+        guest = guests.get(email_addr)
+        if guest is None:
+            guest = {
+                'id': f"guest_{email_addr.replace('@', '_').replace('.', '_')}",  # ID único para invitados
+                'first_name': billing.get('first_name', ''),
+                'last_name': billing.get('last_name', ''),
+                'email': billing.get('email', ''),
+                'username': '',
+                'role': 'guest',
+                'date_created': date_created,
+                'date_modified': order.get('date_modified') or '',
+                'last_order_date': date_created,
+                'is_paying_customer': False,
+                'orders_count': 0,
+                'total_spent': 0,
+                'avatar_url': '',
+                'billing': billing,
+                'shipping': order.get('shipping', {})
+            }
+            if include_links:
+                guest['_links'] = {'self': [{'href': f'guest_customer_{email_addr}'}]}
+            guests[email_addr] = guest
+
+        guest['orders_count'] += 1
+        if order.get('status') in ['completed', 'processing']:
+            try:
+                guest['total_spent'] += float(order.get('total') or 0)
+            except (TypeError, ValueError):
+                pass
+
+        # Primer y último pedido por fecha de creación
+        if date_created < guest['date_created']:
+            guest['date_created'] = date_created
+        if date_created >= guest['last_order_date']:
+            guest['last_order_date'] = date_created
+            guest['date_modified'] = order.get('date_modified') or ''
+
+    for guest in guests.values():
+        guest['is_paying_customer'] = guest['total_spent'] > 0
+        guest['total_spent'] = str(guest['total_spent'])
+
+    return list(guests.values())
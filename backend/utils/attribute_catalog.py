@@ -0,0 +1,80 @@
+from config import Config
+from utils.catalog_cache import ATTRIBUTES, fetch_all_pages, fetch_page, get_catalog_cache, total_pages
+from utils.fanout import map_bounded
+from utils.woocommerce_api import get_wc_api
+
+
+class AttributeCatalog:
+    """
+    Atributos globales con todos sus términos, ordenados por nombre.
+    """
+
+    def __init__(self, attributes, terms_by_attribute):
+        self.attributes = sorted(attributes, key=lambda a: (a.get('name') or '').casefold())
+        self.by_id = {attribute['id']: attribute for attribute in self.attributes}
+        self.terms = {
+            attribute_id: sorted(terms, key=lambda t: (t.get('name') or '').casefold())
+            for attribute_id, terms in terms_by_attribute.items()
+        }
+
+    def __contains__(self, attribute_id):
+        return attribute_id in self.by_id
+
+    def terms_for(self, attribute_id):
+        return self.terms.get(attribute_id, [])
+
+    def term_names(self, attribute_id):
+        """
+        Nombres de los términos existentes de un atributo, sin mayúsculas, para
+        no volver a crearlos.
+        """
+        return {(term.get('name') or '').casefold() for term in self.terms_for(attribute_id)}
+
+    def as_list(self):
+        return [{**attribute, 'terms': self.terms_for(attribute['id'])} for attribute in self.attributes]
+
+
+def fetch_attribute_catalog():
+    """
+    Descarga los atributos y todas las páginas de términos de cada uno: primero,
+    en paralelo, la primera página de cada atributo y después, también en
+    paralelo, todas las que falten.
+
+    Las dos tandas se lanzan desde este hilo, sin anidar tareas en el pool de fanout.
+    """
+    wc_api = get_wc_api()
+    attributes = fetch_all_pages(wc_api, "products/attributes")
+
+    def fetch_terms(item):
+        attribute_id, page = item
+        return fetch_page(wc_api, f"products/attributes/{attribute_id}/terms", None, page)
+
+    first_pages = [(attribute['id'], 1) for attribute in attributes]
+    terms_by_attribute = {}
+    remaining_pages = []
+    for (attribute_id, _), (response, error) in zip(
+        first_pages, map_bounded(fetch_terms, first_pages, Config.WC_BATCH_CONCURRENCY)
+    ):
+        if error is not None:
+            raise error
+        terms_by_attribute[attribute_id] = list(response.json())
+        remaining_pages += [(attribute_id, page) for page in range(2, total_pages(response) + 1)]
+
+    for (attribute_id, _), (response, error) in zip(
+        remaining_pages, map_bounded(fetch_terms, remaining_pages, Config.WC_BATCH_CONCURRENCY)
+    ):
+        if error is not None:
+            raise error
+        terms_by_attribute[attribute_id].extend(response.json())
+    return AttributeCatalog(attributes, terms_by_attribute)
+
+
+def get_attribute_catalog():
+    """
+    Devuelve el catálogo de atributos y términos, desde la caché del catálogo si
+    está activa (se invalida con cualquier escritura de atributos o términos).
+    """
+    cache = get_catalog_cache()
+    if cache is None:
+        return fetch_attribute_catalog()
+    return cache.get(ATTRIBUTES, 'catalog', fetch_attribute_catalog)
@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+from utils.api_helpers import utc_now_iso
+from utils.fanout import map_bounded
+from utils.woocommerce_api import get_wc_api
+
+logger = logging.getLogger(__name__)
+
+# Colecciones del catálogo que cambian poco y se cachean en memoria
+CATEGORIES = 'categories'
+ATTRIBUTES = 'attributes'
+ORISHAS = 'orishas'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    namespace TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Cabeceras de paginación de WooCommerce que se guardan con cada respuesta
+PAGINATION_HEADERS = ('X-WP-Total', 'X-WP-TotalPages')
+
+# Tamaño de página al descargar una colección completa
+PAGE_SIZE = 100
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class UpstreamError(Exception):
+    """
+    WooCommerce respondió con error: la respuesta no se cachea y se devuelve tal cual.
+    """
+
+    def __init__(self, status, data):
+        super().__init__(f"WooCommerce responded {status}")
+        self.status = status
+        self.data = data
+
+
+class CatalogCache:
+    """
+    Caché en memoria (por worker) de las colecciones del catálogo con TTL y
+    stale-while-revalidate.
+
+    - Hasta CATALOG_CACHE_TTL segundos una entrada se sirve sin más.
+    - Hasta CATALOG_CACHE_STALE_TTL se sirve igualmente y se refresca en segundo
+      plano (una sola recarga por clave).
+    - Pasado ese tiempo la petición espera a la recarga; si varias piden la misma
+      clave a la vez sólo una llama a WooCommerce.
+
+    Las escrituras propias y los webhooks llaman a invalidate(), que incrementa la
+    versión del espacio en DATA_DIR/catalog_cache.db. Cada lectura compara esa
+    versión, así que una invalidación en un worker vacía la caché de todos.
+    """
+
+    def __init__(self, path, ttl, stale_ttl):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self._entries = {}
+        self._loading = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'invalidations': 0}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def version(self, namespace):
+        row = self.connection().execute(
+            "SELECT version FROM catalog_versions WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row['version'] if row else 0
+
+    def invalidate(self, *namespaces):
+        """
+        Descarta las entradas de los espacios indicados en todos los workers.
+        """
+        with self.transaction() as conn:
+            for namespace in namespaces:
+                conn.execute(
+                    "INSERT INTO catalog_versions (namespace, version, updated_at) VALUES (?, 1, ?) "
+                    "ON CONFLICT(namespace) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                    (namespace, utc_now_iso())
+                )
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in namespaces]:
+                del self._entries[key]
+            self._stats['invalidations'] += len(namespaces)
+
+    def get(self, namespace, key, loader, allow_stale=True):
+        """
+        Devuelve el valor cacheado de (namespace, key) o lo obtiene con loader().
+        Las excepciones de loader se propagan y no se cachean. Con
+        allow_stale=False una entrada pasada de TTL se recarga antes de responder
+        (para validaciones que no deben usar datos de hace una hora).
+        """
+        version = self.version(namespace)
+        cache_key = (namespace, key)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry['version'] == version:
+                age = now - entry['loaded_at']
+                if age < self.ttl:
+                    self._stats['hits'] += 1
+                    return entry['value']
+                if allow_stale and age < self.stale_ttl:
+                    self._stats['stale_hits'] += 1
+                    if cache_key not in self._refreshing:
+                        self._refreshing.add(cache_key)
+                        # Hilo propio: el loader usa el pool de fanout y no puede esperar dentro de él
+                        threading.Thread(
+                            target=self._refresh, args=(cache_key, version, loader),
+                            name='catalog-refresh', daemon=True
+                        ).start()
+                    return entry['value']
+            self._stats['misses'] += 1
+            loading = self._loading.get(cache_key)
+            owner = loading is None
+            if owner:
+                loading = self._loading[cache_key] = {'event': threading.Event()}
+
+        if not owner:
+            # Otra petición ya está cargando esta clave: se espera a su resultado
+            loading['event'].wait(Config.WC_READ_TIMEOUT * 2)
+            if 'error' in loading:
+                raise loading['error']
+            if 'value' in loading:
+                return loading['value']
+            return loader()
+
+        try:
+            value = loader()
+            loading['value'] = value
+            self._store(cache_key, version, value)
+            return value
+        except Exception as e:
+            loading['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(cache_key, None)
+            loading['event'].set()
+
+    def _store(self, cache_key, version, value):
+        # Si se invalidó durante la carga, el valor ya puede estar desfasado
+        if self.version(cache_key[0]) != version:
+            return
+        with self._lock:
+            self._entries[cache_key] = {'value': value, 'version': version, 'loaded_at': time.monotonic()}
+
+    def _refresh(self, cache_key, version, loader):
+        try:
+            self._store(cache_key, version, loader())
+            with self._lock:
+                self._stats['refreshes'] += 1
+        except Exception as e:
+            logger.warning(f"Background refresh of {cache_key[0]}:{cache_key[1]} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+    def stats(self):
+        with self._lock:
+            namespaces = {}
+            for namespace, _ in self._entries:
+                namespaces[namespace] = namespaces.get(namespace, 0) + 1
+            return {**self._stats, 'entries': namespaces, 'ttl': self.ttl, 'stale_ttl': self.stale_ttl}
+
+
+def get_catalog_cache():
+    """
+    Devuelve la caché del catálogo del proceso, o None si CATALOG_CACHE_TTL es 0.
+    """
+    global _cache
+
+    if Config.CATALOG_CACHE_TTL <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CatalogCache(os.path.join(Config.DATA_DIR, 'catalog_cache.db'),
+                                      Config.CATALOG_CACHE_TTL, Config.CATALOG_CACHE_STALE_TTL)
+    return _cache
+
+
+def cached_wc_get(namespace, endpoint, params=None):
+    """
+    GET a WooCommerce a través de la caché del catálogo.
+
+    Devuelve (datos, cabeceras de paginación). Las respuestas de error lanzan
+    UpstreamError con el código y el cuerpo de WooCommerce.
+    """
+    params = dict(params or {})
+
+    def load():
+        response = get_wc_api().get(endpoint, params=dict(params))
+        try:
+            data = response.json()
+        except ValueError:
+            data = {'message': response.text}
+        if response.status_code != 200:
+            raise UpstreamError(response.status_code, data)
+        headers = {name: response.headers[name] for name in PAGINATION_HEADERS if name in response.headers}
+        return data, headers
+
+    cache = get_catalog_cache()
+    if cache is None:
+        return load()
+    key = f"{endpoint}?{json.dumps(params, sort_keys=True, default=str)}"
+    return cache.get(namespace, key, load)
+
+
+def fetch_page(wc_api, endpoint, params, page):
+    """
+    Una página de PAGE_SIZE elementos de una colección; lanza UpstreamError si
+    WooCommerce responde con error.
+    """
+    response = wc_api.get(endpoint, params={**(params or {}), "per_page": PAGE_SIZE, "page": page})
+    if response.status_code != 200:
+        raise UpstreamError(response.status_code, response.json())
+    return response
+
+
+def total_pages(response):
+    return int(response.headers.get('X-WP-TotalPages', 1) or 1)
+
+
+def fetch_all_pages(wc_api, endpoint, params=None):
+    """
+    Descarga todas las páginas de una colección de WooCommerce: la primera indica
+    el total de páginas y el resto se piden en paralelo.
+
+    Usa el pool de fanout y espera a sus tareas: no debe llamarse desde una tarea
+    de ese mismo pool.
+    """
+    def fetch(page):
+        return fetch_page(wc_api, endpoint, params, page)
+
+    first = fetch(1)
+    items = list(first.json())
+    for response, error in map_bounded(fetch, list(range(2, total_pages(first) + 1)), Config.WC_BATCH_CONCURRENCY):
+        if error is not None:
+            raise error
+        items.extend(response.json())
+    return items
+
+
+def invalidate_catalog(*namespaces):
+    """
+    Invalida espacios de la caché del catálogo tras una escritura. Los errores se
+    registran y no hacen fallar la escritura (la entrada caduca por TTL).
+    """
+    cache = get_catalog_cache()
+    if cache is None:
+        return
+    try:
+        cache.invalidate(*namespaces)
+    except Exception as e:
+        logger.error(f"Could not invalidate catalog cache {namespaces}: {e}")
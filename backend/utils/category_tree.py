@@ -0,0 +1,151 @@
+import logging
+
+from utils.catalog_cache import CATEGORIES, fetch_all_pages, get_catalog_cache
+from utils.woocommerce_api import get_wc_api
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryTree:
+    """
+    Árbol de categorías de productos construido en una sola pasada.
+
+    Guarda cada categoría por id, la lista ordenada de hijos de cada padre, la
+    ruta de ancestros y la profundidad de cada nodo, y el número de productos de
+    cada subárbol. Las migas de pan y la validación de padres circulares se
+    resuelven en O(profundidad) sin consultar WooCommerce.
+    """
+
+    def __init__(self, categories):
+        self.by_id = {category['id']: category for category in categories}
+        self.parent = {}
+        self.children = {0: []}
+        for category in sorted(categories, key=lambda c: (c.get('menu_order', 0), c.get('name', ''), c['id'])):
+            # Un padre que no existe (borrado a medias) cuelga la categoría de la raíz
+            parent = category.get('parent') or 0
+            self.parent[category['id']] = parent if parent in self.by_id else 0
+            self.children.setdefault(self.parent[category['id']], []).append(category['id'])
+
+        self.ancestors = {}
+        order = self._walk(0)
+        # Lo que no cuelga de la raíz forma un ciclo en WooCommerce: se rompe en la raíz
+        unreachable = [category_id for category_id in self.by_id if category_id not in self.ancestors]
+        if unreachable:
+            logger.warning(f"Categories unreachable from the root (circular parents): {unreachable}")
+        for category_id in unreachable:
+            if category_id not in self.ancestors:
+                self.children[self.parent[category_id]].remove(category_id)
+                self.parent[category_id] = 0
+                self.children[0].append(category_id)
+                order.extend(self._walk(category_id, ()))
+
+        # Productos por subárbol: cada nodo suma al padre después de sus hijos
+        self.subtree_count = {category_id: self.by_id[category_id].get('count', 0) for category_id in order}
+        for category_id in reversed(order):
+            if self.parent[category_id]:
+                self.subtree_count[self.parent[category_id]] += self.subtree_count[category_id]
+
+    def _walk(self, root, root_path=None):
+        """
+        Recorre en anchura desde `root` asignando la ruta de ancestros de cada nodo.
+        Devuelve los nodos visitados en orden (padres antes que hijos).
+        """
+        order = []
+        if root:
+            self.ancestors[root] = root_path
+            order.append(root)
+        queue = [root]
+        for node in queue:
+            path = self.ancestors[node] + (node,) if node else ()
+            for child in self.children.get(node, []):
+                if child not in self.ancestors:
+                    self.ancestors[child] = path
+                    order.append(child)
+                    queue.append(child)
+        return order
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, category_id):
+        return category_id in self.by_id
+
+    def get(self, category_id):
+        return self.by_id.get(category_id)
+
+    def depth(self, category_id):
+        return len(self.ancestors[category_id])
+
+    def child_ids(self, category_id):
+        return self.children.get(category_id, [])
+
+    def subtree_ids(self, category_id):
+        """
+        La categoría y todos sus descendientes.
+        """
+        ids = [category_id]
+        for node in ids:
+            ids.extend(self.children.get(node, []))
+        return set(ids)
+
+    def breadcrumb(self, category_id):
+        """
+        Categorías desde la raíz hasta `category_id` (incluida), o None si no existe.
+        """
+        if category_id not in self.by_id:
+            return None
+        return [
+            {'id': node, 'name': self.by_id[node].get('name'), 'slug': self.by_id[node].get('slug')}
+            for node in self.ancestors[category_id] + (category_id,)
+        ]
+
+    def creates_cycle(self, category_id, parent_id):
+        """
+        True si poner `parent_id` como padre de `category_id` crearía un ciclo,
+        es decir, si el nuevo padre es la propia categoría o uno de sus descendientes.
+        """
+        if not parent_id:
+            return False
+        if parent_id == category_id:
+            return True
+        return category_id in self.ancestors.get(parent_id, ())
+
+    def hierarchy(self):
+        """
+        Lista anidada de categorías con 'level', 'path', 'subtree_count' y 'children'.
+        """
+        def node(category_id):
+            return {
+                **self.by_id[category_id],
+                'level': len(self.ancestors[category_id]),
+                'path': list(self.ancestors[category_id]),
+                'subtree_count': self.subtree_count.get(category_id, 0),
+                'children': []
+            }
+
+        roots = [node(category_id) for category_id in self.children[0]]
+        stack = list(roots)
+        while stack:
+            current = stack.pop()
+            current['children'] = [node(child) for child in self.children.get(current['id'], [])]
+            stack.extend(current['children'])
+        return roots
+
+
+def fetch_all_categories(wc_api=None):
+    """
+    Descarga todas las categorías (todas las páginas).
+    """
+    return fetch_all_pages(wc_api or get_wc_api(), "products/categories")
+
+
+def get_category_tree(allow_stale=True):
+    """
+    Devuelve el árbol de categorías, desde la caché del catálogo si está activa
+    (se invalida con cualquier escritura de categorías). Las comprobaciones antes
+    de borrar piden allow_stale=False para no fiarse de recuentos antiguos.
+    """
+    cache = get_catalog_cache()
+    if cache is None:
+        return CategoryTree(fetch_all_categories())
+    return cache.get(CATEGORIES, 'tree', lambda: CategoryTree(fetch_all_categories()), allow_stale=allow_stale)
@@ -0,0 +1,201 @@
+import json
+
+from utils.api_helpers import build_guest_customers
+from utils.text_index import GramIndex, digits, fold, match_score, query_tokens
+
+# Directorio de clientes del selector de clientes, dentro de la réplica de pedidos
+# (DATA_DIR/orders.db). Los invitados se recalculan en la misma transacción que los
+# pedidos que los forman; los registrados se guardan al sincronizar /customers y con
+# las escrituras y webhooks de clientes. Cada cliente tiene un texto normalizado y
+# sus trigramas en un índice invertido con la frecuencia de cada trigrama.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customer_directory (
+    key TEXT PRIMARY KEY,
+    customer_id INTEGER NOT NULL DEFAULT 0,
+    role TEXT NOT NULL DEFAULT '',
+    email TEXT NOT NULL DEFAULT '',
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    search_text TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_customer_directory_email ON customer_directory (email);
+"""
+
+# Trigramas del texto de búsqueda: customer_grams y customer_gram_counts
+GRAMS = GramIndex('customer', 'customer_directory', 'key')
+SCHEMA += GRAMS.schema
+
+# Estados de pedido que no forman clientes invitados (igual que /customers)
+GUEST_EXCLUDED_STATUSES = ('checkout-draft', 'trash')
+
+# Candidatos que se puntúan como máximo en una búsqueda
+MAX_CANDIDATES = 500
+
+# Campos que se guardan de un cliente registrado
+REGISTERED_FIELDS = ('id', 'first_name', 'last_name', 'email', 'username', 'role', 'date_created',
+                     'avatar_url', 'billing', 'shipping', 'is_paying_customer')
+
+def customer_search_text(customer):
+    billing = customer.get('billing') or {}
+    phone = billing.get('phone') or ''
+    parts = [
+        customer.get('first_name'),
+        customer.get('last_name'),
+        customer.get('email') or billing.get('email'),
+        customer.get('username'),
+        phone,
+        digits(phone) if digits(phone) != phone else '',
+        billing.get('city')
+    ]
+    return ' '.join(fold(part) for part in parts if part)
+
+
+def _write(conn, key, customer_id, role, email, customer):
+    data = json.dumps(customer, ensure_ascii=False, sort_keys=True)
+    previous = conn.execute("SELECT search_text, data FROM customer_directory WHERE key = ?", (key,)).fetchone()
+    if previous is not None and previous['data'] == data:
+        return
+    search_text = customer_search_text(customer)
+    # Los pedidos de los registrados salen de customer_stats; los de los invitados se guardan aquí
+    orders_count = customer.get('orders_count', 0) if not customer_id else 0
+    conn.execute(
+        "INSERT OR REPLACE INTO customer_directory (key, customer_id, role, email, orders_count, search_text, data) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, customer_id, role, email, orders_count, search_text, data)
+    )
+    GRAMS.update(conn, key, previous['search_text'] if previous is not None else None, search_text)
+
+
+def _remove(conn, key):
+    previous = conn.execute("SELECT search_text FROM customer_directory WHERE key = ?", (key,)).fetchone()
+    if previous is None:
+        return
+    conn.execute("DELETE FROM customer_directory WHERE key = ?", (key,))
+    GRAMS.update(conn, key, previous['search_text'], None)
+
+
+def upsert_registered(conn, customers):
+    saved = 0
+    for customer in customers:
+        if not isinstance(customer, dict) or not customer.get('id'):
+            continue
+        entry = {field: customer.get(field) for field in REGISTERED_FIELDS if field in customer}
+        _write(conn, f"c:{int(customer['id'])}", int(customer['id']), customer.get('role') or '',
+               (customer.get('email') or '').strip().lower(), entry)
+        saved += 1
+    return saved
+
+
+def remove_registered(conn, customer_id):
+    _remove(conn, f"c:{int(customer_id)}")
+
+
+def prune_registered(conn, customer_ids):
+    """
+    Quita los clientes registrados que no están en `customer_ids`.
+    """
+    keep = {int(customer_id) for customer_id in customer_ids}
+    stored = [row['customer_id'] for row in conn.execute("SELECT customer_id FROM customer_directory WHERE customer_id > 0")]
+    for customer_id in stored:
+        if customer_id not in keep:
+            remove_registered(conn, customer_id)
+
+
+def refresh_guests(conn, emails):
+    """
+    Recalcula el cliente invitado de cada email a partir de sus pedidos como
+    invitado (o lo quita si ya no tiene ninguno).
+    """
+    excluded = ','.join('?' * len(GUEST_EXCLUDED_STATUSES))
+    for email in emails:
+        if not email:
+            continue
+        rows = conn.execute(
+            # Con el índice por email: el de (customer_id, fecha) recorrería todos los pedidos de invitados
+            f"SELECT data FROM orders INDEXED BY idx_orders_email WHERE customer_id = 0 AND billing_email = ? AND status NOT IN ({excluded}) "
+            f"ORDER BY date_created DESC, id DESC",
+            (email, *GUEST_EXCLUDED_STATUSES)
+        ).fetchall()
+        guests = build_guest_customers((json.loads(row['data']) for row in rows), [], include_links=False)
+        if guests:
+            _write(conn, f"g:{email}", 0, 'guest', email, guests[0])
+        else:
+            _remove(conn, f"g:{email}")
+
+
+def rebuild_guests(conn):
+    for row in conn.execute("SELECT key FROM customer_directory WHERE customer_id = 0").fetchall():
+        _remove(conn, row['key'])
+    emails = [row['billing_email'] for row in conn.execute(
+        "SELECT DISTINCT billing_email FROM orders WHERE customer_id = 0 AND billing_email != ''"
+    )]
+    refresh_guests(conn, emails)
+
+
+def guests(conn):
+    """
+    Clientes invitados del directorio (como build_guest_customers sin _links),
+    el del pedido más reciente primero.
+    """
+    rows = conn.execute("SELECT data FROM customer_directory WHERE customer_id = 0").fetchall()
+    return sorted((json.loads(row['data']) for row in rows),
+                  key=lambda guest: guest.get('last_order_date') or '', reverse=True)
+
+
+def clear(conn):
+    conn.execute("DELETE FROM customer_directory")
+    GRAMS.clear(conn)
+
+
+def search(conn, query, limit=10):
+    """
+    Clientes registrados e invitados que contienen todas las palabras de la
+    consulta, los más relevantes primero y a igualdad los que más pedidos tienen.
+
+    Los invitados cuyo email es el de un cliente registrado con rol 'customer' se
+    omiten, como en /customers.
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return []
+    keys = GRAMS.ranked_candidates(conn, tokens, MAX_CANDIDATES)
+    if not keys:
+        return []
+    rows = conn.execute(
+        f"SELECT d.key, d.customer_id, d.search_text, COALESCE(s.orders_count, d.orders_count) AS orders_count "
+        f"FROM customer_directory d "
+        f"LEFT JOIN customer_stats s ON d.customer_id > 0 AND s.customer_id = d.customer_id "
+        f"WHERE d.key IN ({','.join('?' * len(keys))}) "
+        f"AND NOT (d.customer_id = 0 AND EXISTS (SELECT 1 FROM customer_directory r "
+        f"WHERE r.email = d.email AND r.customer_id > 0 AND r.role = 'customer'))",
+        keys
+    ).fetchall()
+
+    matches = []
+    for row in rows:
+        score = match_score(tokens, row['search_text'])
+        if score is not None:
+            # El texto de búsqueda empieza por nombre y apellidos: sirve para desempatar
+            matches.append((-score, -(row['orders_count'] or 0), row['search_text'], row['key']))
+    top = [match[3] for match in sorted(matches)[:limit]]
+    if not top:
+        return []
+
+    details = {
+        row['key']: row for row in conn.execute(
+            f"SELECT d.key, d.customer_id, d.data, s.orders_count, s.total_spent, s.last_order_date "
+            f"FROM customer_directory d LEFT JOIN customer_stats s ON d.customer_id > 0 AND s.customer_id = d.customer_id "
+            f"WHERE d.key IN ({','.join('?' * len(top))})",
+            top
+        )
+    }
+    results = []
+    for key in top:
+        row = details[key]
+        customer = json.loads(row['data'])
+        if row['customer_id']:
+            customer['orders_count'] = row['orders_count'] or 0
+            customer['total_spent'] = str(row['total_spent'] or 0)
+            customer['last_order_date'] = row['last_order_date']
+        results.append(customer)
+    return results
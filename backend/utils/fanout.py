@@ -0,0 +1,92 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Pool de hilos acotado y compartido por el proceso para llamadas concurrentes a
+    WooCommerce/WordPress. Se recrea tras un fork.
+    """
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(max_workers=Config.FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+            _executor_pid = pid
+    return _executor
+
+
+def _submit(executor, fn, *args):
+    # Cada tarea corre en una copia del contexto de quien la lanza, para que vea el
+    # estado de la petición en curso (p. ej. el memo de GETs a WooCommerce)
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def run_parallel(tasks, timeout=None):
+    """
+    Ejecuta en paralelo un diccionario {nombre: función sin argumentos}.
+
+    Devuelve (resultados, degradados): los resultados de las tareas que terminaron
+    a tiempo y un diccionario {nombre: motivo} con las que fallaron o superaron el
+    timeout. Una tarea lenta o con error nunca hace fallar al resto.
+    """
+    timeout = Config.FANOUT_TIMEOUT if timeout is None else timeout
+    executor = get_executor()
+    futures = {name: _submit(executor, fn) for name, fn in tasks.items()}
+    deadline = time.monotonic() + timeout
+
+    results = {}
+    degraded = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            future.cancel()
+            degraded[name] = 'timeout'
+            logger.warning(f"Parallel task '{name}' timed out after {timeout}s")
+        except Exception as e:
+            degraded[name] = str(e)
+            logger.warning(f"Parallel task '{name}' failed: {e}")
+    return results, degraded
+
+
+def map_bounded(fn, items, max_concurrency):
+    """
+    Aplica fn a cada elemento con como mucho `max_concurrency` llamadas en vuelo.
+
+    Devuelve una lista alineada con `items` de tuplas (resultado, excepción); una
+    de las dos es siempre None.
+    """
+    executor = get_executor()
+    results = [None] * len(items)
+    pending = {}
+    next_index = 0
+
+    while next_index < len(items) or pending:
+        while next_index < len(items) and len(pending) < max(max_concurrency, 1):
+            pending[_submit(executor, fn, items[next_index])] = next_index
+            next_index += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                results[index] = (future.result(), None)
+            except Exception as e:
+                results[index] = (None, e)
+    return results
@@ -0,0 +1,150 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import UnidentifiedImageError
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Tipos que se recodifican; GIF (animaciones), SVG y el resto se suben tal cual
+OPTIMIZABLE_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/tiff', 'image/bmp')
+
+OUTPUT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg')
+}
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_optimize_pool():
+    """
+    Devuelve el pool de procesos de optimización del worker actual.
+
+    Usa 'spawn' para no hacer fork de un worker de gunicorn con hilos en marcha.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(Config.MEDIA_OPTIMIZE_WORKERS, 1),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def optimize_image_bytes(data, max_edge, output_format, quality):
+    """
+    Redimensiona al lado máximo, aplica la orientación EXIF, elimina los metadatos
+    EXIF y recodifica. Se ejecuta en el pool de procesos.
+
+    Devuelve (bytes, info) o None si la imagen no se puede o no merece la pena
+    optimizar (animaciones, o el resultado no es más pequeño).
+    """
+    from PIL import Image, ImageOps
+
+    pil_format, mimetype, extension = OUTPUT_FORMATS[output_format]
+    with Image.open(io.BytesIO(data)) as image:
+        if getattr(image, 'n_frames', 1) > 1:
+            return None
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if pil_format == 'JPEG' or not has_alpha:
+            if has_alpha:
+                # JPEG no tiene transparencia: fondo blanco
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image.convert('RGBA'), mask=image.convert('RGBA').split()[-1])
+                image = background
+            else:
+                image = image.convert('RGB')
+        else:
+            image = image.convert('RGBA')
+
+        options = {'quality': quality}
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        if pil_format == 'JPEG':
+            options.update(optimize=True, progressive=True)
+        else:
+            options['method'] = 4
+
+        output = io.BytesIO()
+        image.save(output, format=pil_format, **options)
+
+    optimized = output.getvalue()
+    if len(optimized) >= len(data):
+        return None
+    return optimized, {
+        'width': image.width,
+        'height': image.height,
+        'mimetype': mimetype,
+        'extension': extension
+    }
+
+
+def optimize_upload(data, filename, content_type):
+    """
+    Optimiza una imagen antes de subirla a WordPress.
+
+    Devuelve (bytes, nombre, content_type, informe). Si la optimización no aplica
+    o falla se devuelven los datos originales y el informe lo indica.
+    """
+    report = {
+        'applied': False,
+        'original_bytes': len(data),
+        'optimized_bytes': len(data),
+        'bytes_saved': 0
+    }
+    if content_type not in OPTIMIZABLE_TYPES:
+        report['reason'] = 'unsupported_type'
+        return data, filename, content_type, report
+
+    try:
+        result = get_optimize_pool().submit(
+            optimize_image_bytes, data, Config.MEDIA_OPTIMIZE_MAX_EDGE,
+            Config.MEDIA_OPTIMIZE_FORMAT, Config.MEDIA_OPTIMIZE_QUALITY
+        ).result(timeout=Config.MEDIA_OPTIMIZE_TIMEOUT)
+    except UnidentifiedImageError:
+        report['reason'] = 'not_an_image'
+        return data, filename, content_type, report
+    except Exception as e:
+        logger.warning(f"Image optimisation of {filename} failed, uploading original: {e}")
+        if isinstance(e, BrokenProcessPool):
+            # Un proceso del pool murió (p. ej. sin memoria): el siguiente uso crea otro pool
+            global _pool
+            _pool = None
+        report['reason'] = 'error'
+        return data, filename, content_type, report
+
+    if result is None:
+        report['reason'] = 'not_smaller'
+        return data, filename, content_type, report
+
+    optimized, info = result
+    report.update({
+        'applied': True,
+        'optimized_bytes': len(optimized),
+        'bytes_saved': len(data) - len(optimized),
+        'width': info['width'],
+        'height': info['height'],
+        'format': info['mimetype']
+    })
+    new_filename = f"{os.path.splitext(filename)[0]}{info['extension']}"
+    return optimized, new_filename, info['mimetype'], report
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import Config
+from utils.image_variants import prune_orphan_variants
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    file_name TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL DEFAULT '',
+    prompt_search TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_images_created_at ON images (created_at);
+
+CREATE TABLE IF NOT EXISTS image_store_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_store = None
+_store_lock = threading.Lock()
+_reconciler_started = False
+
+
+def _image_row(row):
+    file_name = row['file_name']
+    url = f"/panel/api/static/generated-images/{file_name}"
+    return {
+        'id': file_name,
+        'fileName': file_name,
+        'prompt': row['prompt'],
+        'timestamp': row['created_at'],
+        'size': row['size'],
+        'url': url,
+        'localUrl': url,
+        'thumbUrl': f"{url}?variant=thumb",
+        'mediumUrl': f"{url}?variant=medium"
+    }
+
+
+class GeneratedImageStore:
+    """
+    Índice SQLite de las imágenes generadas con IA (sustituye a metadata.json).
+
+    Cada alta es un INSERT atómico, así que los workers de gunicorn no se pisan,
+    y el listado es una consulta paginada por índice en vez de leer el JSON entero
+    y comprobar cada archivo. reconcile() ajusta el índice al contenido real del
+    directorio (archivos borrados a mano o copiados sin registrar).
+    """
+
+    def __init__(self, path, images_dir):
+        self.path = path
+        self.images_dir = images_dir
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def get_state(self, key, default=None):
+        row = self.connection().execute("SELECT value FROM image_store_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def _insert(self, conn, file_name, prompt, created_at, size, replace=True):
+        conn.execute(
+            f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO images "
+            "(file_name, prompt, prompt_search, created_at, size) VALUES (?, ?, ?, ?, ?)",
+            (file_name, prompt or '', (prompt or '').casefold(), created_at, size)
+        )
+
+    def add_image(self, file_name, prompt, created_at=None, size=None):
+        if size is None:
+            try:
+                size = os.path.getsize(os.path.join(self.images_dir, file_name))
+            except OSError:
+                pass
+        with self.transaction() as conn:
+            self._insert(conn, file_name, prompt, created_at or datetime.now().isoformat(), size)
+
+    def remove_image(self, file_name):
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM images WHERE file_name = ?", (file_name,)).rowcount > 0
+
+    def get_image(self, file_name):
+        row = self.connection().execute("SELECT * FROM images WHERE file_name = ?", (file_name,)).fetchone()
+        return _image_row(row) if row else None
+
+    def query_images(self, page=1, per_page=50, search=None, order='desc'):
+        """
+        Devuelve (imágenes, total) ordenadas por fecha, con búsqueda opcional en el prompt.
+        """
+        where, params = '', []
+        if search:
+            where = "WHERE prompt_search LIKE ?"
+            params.append(f"%{search.casefold()}%")
+        direction = 'ASC' if order == 'asc' else 'DESC'
+        conn = self.connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM images {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM images {where} ORDER BY created_at {direction}, file_name {direction} LIMIT ? OFFSET ?",
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+        return [_image_row(row) for row in rows], total
+
+    def import_legacy_metadata(self):
+        """
+        Importa una sola vez las entradas de metadata.json (el archivo se deja como estaba).
+        """
+        if self.get_state('metadata_json_imported_at') is not None:
+            return 0
+        metadata_file = os.path.join(self.images_dir, 'metadata.json')
+        entries = []
+        if os.path.exists(metadata_file):
+            try:
+                with open(metadata_file, 'r') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read {metadata_file}: {e}")
+                return 0
+        with self.transaction() as conn:
+            for entry in entries:
+                if entry.get('fileName'):
+                    self._insert(conn, entry['fileName'], entry.get('prompt'),
+                                 entry.get('timestamp') or datetime.now().isoformat(), None, replace=False)
+            conn.execute(
+                "INSERT OR REPLACE INTO image_store_state (key, value) VALUES ('metadata_json_imported_at', ?)",
+                (datetime.now().isoformat(),)
+            )
+        return len(entries)
+
+    def reconcile(self):
+        """
+        Ajusta el índice al directorio: quita las imágenes cuyo archivo ya no
+        existe y registra (sin prompt) las que están en disco pero no en el índice.
+        También rellena el tamaño de las entradas importadas y borra las
+        miniaturas de imágenes eliminadas.
+        """
+        # El índice se lee antes que el directorio: una imagen que se registre
+        # entretanto aparece en disco y no se toma por borrada
+        indexed = {
+            row['file_name']: row['size']
+            for row in self.connection().execute("SELECT file_name, size FROM images")
+        }
+        on_disk = {}
+        with os.scandir(self.images_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    stat = entry.stat()
+                    on_disk[entry.name] = (stat.st_size, stat.st_mtime)
+        missing = [name for name in indexed if name not in on_disk]
+        added = [name for name in on_disk if name not in indexed]
+        sized = [name for name, size in indexed.items() if size is None and name in on_disk]
+
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM images WHERE file_name = ?", [(name,) for name in missing])
+            for name in added:
+                size, mtime = on_disk[name]
+                self._insert(conn, name, '', datetime.fromtimestamp(mtime).isoformat(), size, replace=False)
+            conn.executemany("UPDATE images SET size = ? WHERE file_name = ?",
+                             [(on_disk[name][0], name) for name in sized])
+            conn.execute(
+                "INSERT OR REPLACE INTO image_store_state (key, value) VALUES ('reconciled_at', ?)",
+                (datetime.now().isoformat(),)
+            )
+        return {'added': len(added), 'removed': len(missing),
+                'variants_removed': prune_orphan_variants(on_disk, self.images_dir)}
+
+
+def get_image_store():
+    """
+    Devuelve el índice de imágenes generadas compartido por el proceso.
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = GeneratedImageStore(os.path.join(Config.DATA_DIR, 'generated_images.db'),
+                                            Config.GENERATED_IMAGES_DIR)
+                store.import_legacy_metadata()
+                _store = store
+    return _store
+
+
+def _reconcile_once(lock_path):
+    """
+    Reconcilia el índice si ningún otro worker lo está haciendo.
+    """
+    with open(lock_path, 'w') as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+        return get_image_store().reconcile()
+
+
+def start_image_reconciler():
+    """
+    Arranca un hilo que reconcilia el índice con el directorio al iniciar y
+    cada GENERATED_IMAGES_RECONCILE_INTERVAL segundos (flock en
+    DATA_DIR/image_reconcile.lock para que sólo lo haga un worker a la vez).
+    """
+    global _reconciler_started
+
+    if _reconciler_started or Config.GENERATED_IMAGES_RECONCILE_INTERVAL <= 0:
+        return
+
+    os.makedirs(Config.DATA_DIR, exist_ok=True)
+    lock_path = os.path.join(Config.DATA_DIR, 'image_reconcile.lock')
+
+    def reconcile():
+        while True:
+            try:
+                changes = _reconcile_once(lock_path)
+                if changes and (changes['added'] or changes['removed']):
+                    logger.info(f"Generated images reconciled: {changes['added']} added, {changes['removed']} removed")
+            except Exception as e:
+                logger.error(f"Generated image reconciliation failed: {e}")
+            time.sleep(Config.GENERATED_IMAGES_RECONCILE_INTERVAL)
+
+    threading.Thread(target=reconcile, name='image-reconcile', daemon=True).start()
+    _reconciler_started = True
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+from PIL import Image, features
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Lado mayor en píxeles de cada variante
+VARIANTS = {
+    'thumb': 320,
+    'medium': 1024
+}
+
+FORMAT_MIMETYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp'
+}
+
+SAVE_OPTIONS = {
+    'avif': {'quality': 60},
+    'webp': {'quality': 80, 'method': 4}
+}
+
+VARIANTS_DIRNAME = 'variants'
+
+
+def available_formats():
+    """
+    Formatos de variante que soporta el Pillow instalado, del más al menos eficiente.
+    AVIF necesita Pillow >= 11.3 con libavif; si no está se usa sólo WebP.
+    """
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+def variants_dir(images_dir=None):
+    return os.path.join(images_dir or Config.GENERATED_IMAGES_DIR, VARIANTS_DIRNAME)
+
+
+def variant_path(file_name, variant, fmt, images_dir=None):
+    stem = os.path.splitext(file_name)[0]
+    return os.path.join(variants_dir(images_dir), f"{stem}.{variant}.{fmt}")
+
+
+def create_variant(file_name, variant, fmt, images_dir=None):
+    """
+    Genera (si no existe) una variante reducida de una imagen y devuelve su ruta.
+
+    Se escribe en un temporal propio (mkstemp) y se renombra, así dos hilos o
+    workers que generen la misma variante a la vez no sirven nunca un archivo a
+    medias ni se pisan el temporal.
+    """
+    path = variant_path(file_name, variant, fmt, images_dir)
+    if os.path.exists(path):
+        return path
+
+    source = os.path.join(images_dir or Config.GENERATED_IMAGES_DIR, file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        with Image.open(source) as image:
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            image.thumbnail((VARIANTS[variant], VARIANTS[variant]), Image.LANCZOS)
+            image.save(tmp_path, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+        # mkstemp crea el archivo con 0600; nginx (X-Accel-Redirect) debe poder leerlo
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def create_all_variants(file_name, images_dir=None):
+    """
+    Genera todas las variantes de una imagen recién creada. Los fallos se
+    registran y la variante se volverá a intentar al pedirla.
+    """
+    for variant in VARIANTS:
+        for fmt in available_formats():
+            try:
+                create_variant(file_name, variant, fmt, images_dir)
+            except Exception as e:
+                logger.warning(f"Could not create {variant}/{fmt} variant of {file_name}: {e}")
+
+
+def prune_orphan_variants(file_names, images_dir=None):
+    """
+    Borra las variantes cuya imagen original ya no existe. Devuelve cuántas se borraron.
+    Las de la última hora se respetan (su original puede ser posterior a `file_names`).
+    """
+    stems = {os.path.splitext(name)[0] for name in file_names}
+    recent = time.time() - 3600
+    directory = variants_dir(images_dir)
+    if not os.path.isdir(directory):
+        return 0
+    removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            stem = entry.name.rsplit('.', 2)[0]
+            if entry.is_file() and stem not in stems and entry.stat().st_mtime < recent:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+
+def file_etag(path):
+    """
+    ETag fuerte de un archivo que no cambia una vez escrito: nombre, tamaño y mtime.
+    """
+    stat = os.stat(path)
+    return hashlib.sha1(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+
+def negotiate_format(accept_header):
+    """
+    Elige el mejor formato de variante que acepta el navegador según Accept,
+    o None si no acepta ninguno (se sirve entonces la imagen original).
+    """
+    for fmt in available_formats():
+        if FORMAT_MIMETYPES[fmt] in (accept_header or ''):
+            return fmt
+    return None
@@ -0,0 +1,439 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from flask import jsonify, request
+
+from config import Config
+from utils.api_helpers import utc_now_iso
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER,
+    partial TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    heartbeat_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+# Estados de un trabajo
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+_handlers = {}
+_queue = None
+_queue_lock = threading.Lock()
+_workers_started = False
+
+
+def _utc_iso_ago(seconds):
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+# Identificador aleatorio de este proceso: tras reiniciar un contenedor el hostname y
+# los PIDs de gunicorn pueden repetirse, y el worker nuevo no debe latir por los
+# trabajos del muerto
+_process_token = uuid.uuid4().hex[:12]
+
+
+def _reset_process_token():
+    global _process_token
+    _process_token = uuid.uuid4().hex[:12]
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_process_token)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{_process_token}"
+
+
+class JobCancelled(Exception):
+    """
+    La lanza un manejador cuando se ha pedido cancelar el trabajo.
+    """
+
+
+def job_handler(job_type):
+    """
+    Registra la función que ejecuta los trabajos de un tipo.
+
+    La función recibe un Job y devuelve el resultado final (serializable a JSON).
+    Los manejadores se registran al importar los módulos de rutas, así que todos
+    los workers de gunicorn conocen todos los tipos.
+    """
+    def decorator(fn):
+        _handlers[job_type] = fn
+        return fn
+    return decorator
+
+
+class Job:
+    """
+    Trabajo en ejecución tal y como lo ve su manejador.
+    """
+
+    def __init__(self, queue, row):
+        self.queue = queue
+        self.id = row['id']
+        self.type = row['type']
+        self.payload = json.loads(row['payload'])
+        # Resultados parciales guardados por una ejecución anterior (p. ej. antes de un reinicio)
+        self.partial = json.loads(row['partial']) if row['partial'] else None
+
+    def progress(self, done, total=None, partial=None):
+        """
+        Guarda el avance (y los resultados parciales) y lanza JobCancelled si se
+        ha pedido cancelar el trabajo.
+        """
+        if partial is not None:
+            self.partial = partial
+        self.queue.update_progress(self.id, done, total, partial)
+        if self.queue.cancel_requested(self.id):
+            raise JobCancelled()
+
+
+def run_in_chunks(job, items, chunk_size, process_chunk):
+    """
+    Procesa `items` por trozos con `process_chunk(trozo) -> [resultado por elemento]`,
+    guardando el avance tras cada trozo.
+
+    Si el trabajo se reanuda tras un reinicio continúa desde el primer elemento sin
+    resultado. Devuelve la lista de resultados alineada con `items`.
+    """
+    results = list(job.partial or [])[:len(items)]
+    job.progress(len(results), len(items), results)
+    for start in range(len(results), len(items), chunk_size):
+        results.extend(process_chunk(items[start:start + chunk_size]))
+        job.progress(len(results), len(items), results)
+    return results
+
+
+class JobQueue:
+    """
+    Cola de trabajos persistente en SQLite (DATA_DIR/jobs.db) compartida por
+    todos los workers de gunicorn.
+
+    Un trabajo se reclama dentro de una transacción BEGIN IMMEDIATE, así que sólo
+    lo ejecuta un hilo. Los trabajos 'running' cuyo worker deja de dar señales de
+    vida (reinicio, timeout de gunicorn) vuelven a la cola y se reanudan.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection().executescript(SCHEMA)
+        self.wakeup = threading.Event()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    # ==================== ENCOLAR Y CONSULTAR ====================
+
+    def submit(self, job_type, payload, total=None):
+        if job_type not in _handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {job_type}")
+        job_id = uuid.uuid4().hex
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, type, status, payload, progress_total, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, QUEUED, json.dumps(payload, ensure_ascii=False), total, utc_now_iso())
+            )
+        self.wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self.connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        if status:
+            rows = self.connection().execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = self.connection().execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row, include_results=False) for row in rows]
+
+    def cancel(self, job_id):
+        """
+        Cancela un trabajo en cola al momento; uno en ejecución se detiene en su
+        próximo punto de control. Devuelve el trabajo o None si no existe.
+        """
+        with self.transaction() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row['status'] == QUEUED:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ?",
+                    (CANCELLED, utc_now_iso(), job_id)
+                )
+            elif row['status'] == RUNNING:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        return self.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """
+        Espera hasta `timeout` segundos a que termine un trabajo y lo devuelve.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in FINISHED_STATUSES or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.2)
+
+    def _to_dict(self, row, include_results=True):
+        job = {
+            'id': row['id'],
+            'type': row['type'],
+            'status': row['status'],
+            'progress': {
+                'done': row['progress_done'],
+                'total': row['progress_total']
+            },
+            'error': row['error'],
+            'cancel_requested': bool(row['cancel_requested']),
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+        if include_results:
+            job['partial_results'] = json.loads(row['partial']) if row['partial'] else None
+            job['result'] = json.loads(row['result']) if row['result'] else None
+        return job
+
+    # ==================== EJECUCIÓN ====================
+
+    def update_progress(self, job_id, done, total=None, partial=None):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress_done = ?, progress_total = COALESCE(?, progress_total), "
+                "partial = COALESCE(?, partial), heartbeat_at = ? WHERE id = ?",
+                (done, total, json.dumps(partial, ensure_ascii=False) if partial is not None else None,
+                 utc_now_iso(), job_id)
+            )
+
+    def cancel_requested(self, job_id):
+        row = self.connection().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def heartbeat(self, worker):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker = ?",
+                (utc_now_iso(), RUNNING, worker)
+            )
+
+    def requeue_stale(self):
+        """
+        Devuelve a la cola los trabajos cuyo worker dejó de latir; los que ya
+        agotaron sus intentos se marcan como fallidos.
+        """
+        stale_before = _utc_iso_ago(Config.JOB_STALE_SECONDS)
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'Worker lost too many times', finished_at = ? "
+                "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                (FAILED, utc_now_iso(), RUNNING, stale_before, Config.JOB_MAX_ATTEMPTS)
+            )
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, stale_before)
+            ).rowcount
+        if requeued:
+            logger.warning(f"Requeued {requeued} jobs from lost workers")
+        return requeued
+
+    def claim(self, worker):
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = utc_now_iso()
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                "started_at = COALESCE(started_at, ?), heartbeat_at = ? WHERE id = ?",
+                (RUNNING, worker, now, now, row['id'])
+            )
+            return Job(self, row)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, heartbeat_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, utc_now_iso(), utc_now_iso(), job_id)
+            )
+
+    def run(self, job):
+        handler = _handlers.get(job.type)
+        if handler is None:
+            self._finish(job.id, FAILED, error=f"Tipo de trabajo desconocido: {job.type}")
+            return
+        try:
+            if self.cancel_requested(job.id):
+                raise JobCancelled()
+            result = handler(job)
+            self._finish(job.id, SUCCEEDED, result=result)
+            logger.info(f"Job {job.id} ({job.type}) succeeded")
+        except JobCancelled:
+            self._finish(job.id, CANCELLED)
+            logger.info(f"Job {job.id} ({job.type}) cancelled")
+        except Exception as e:
+            self._finish(job.id, FAILED, error=str(e))
+            logger.error(f"Job {job.id} ({job.type}) failed: {e}")
+
+    def purge_finished(self):
+        with self.transaction() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED_STATUSES))}) AND finished_at < ?",
+                (*FINISHED_STATUSES, _utc_iso_ago(Config.JOB_RETENTION_DAYS * 86400))
+            )
+
+
+def get_job_queue():
+    """
+    Devuelve la cola de trabajos compartida por el proceso.
+    """
+    global _queue
+
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(os.path.join(Config.DATA_DIR, 'jobs.db'))
+    return _queue
+
+
+def submit_job(job_type, payload, total=None):
+    return get_job_queue().submit(job_type, payload, total)
+
+
+def respond_with_job(job_type, payload, total=None):
+    """
+    Encola un trabajo desde una ruta y construye la respuesta HTTP.
+
+    Si el trabajo termina dentro de JOB_SYNC_WAIT segundos se devuelve su
+    resultado con la misma forma que la ruta síncrona (más 'job_id'); si no, o si
+    la petición incluye async=1 (query) o "async": true (JSON), se responde 202
+    con el id del trabajo para consultar /api/jobs/<id>.
+    """
+    queue = get_job_queue()
+    job_id = queue.submit(job_type, payload, total)
+
+    body = request.get_json(silent=True)
+    wants_async = request.args.get('async', '').lower() in ('1', 'true') or (
+        isinstance(body, dict) and body.get('async') is True
+    )
+    job = queue.get(job_id) if wants_async else queue.wait(job_id, Config.JOB_SYNC_WAIT)
+
+    if job['status'] == SUCCEEDED and isinstance(job['result'], dict):
+        return jsonify({**job['result'], 'job_id': job_id})
+    if job['status'] == FAILED:
+        return jsonify({"error": job['error'], "job_id": job_id}), 500
+    if job['status'] == CANCELLED:
+        return jsonify(job)
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job['progress'],
+        'status_url': f"/api/jobs/{job_id}"
+    }), 202
+
+
+def start_job_workers():
+    """
+    Arranca JOB_WORKERS hilos que ejecutan trabajos de la cola y un hilo que
+    mantiene el latido de los trabajos de este proceso y recupera los huérfanos.
+    """
+    global _workers_started
+
+    if _workers_started or Config.JOB_WORKERS <= 0:
+        return
+
+    queue = get_job_queue()
+    worker = worker_name()
+
+    def work():
+        while True:
+            try:
+                job = queue.claim(worker)
+                if job is not None:
+                    queue.run(job)
+                    continue
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+            queue.wakeup.wait(Config.JOB_POLL_INTERVAL)
+            queue.wakeup.clear()
+
+    def maintain():
+        last_purge = 0
+        while True:
+            try:
+                queue.heartbeat(worker)
+                if queue.requeue_stale():
+                    queue.wakeup.set()
+                if time.monotonic() - last_purge > 3600:
+                    queue.purge_finished()
+                    last_purge = time.monotonic()
+            except Exception as e:
+                logger.error(f"Job maintenance error: {e}")
+            time.sleep(max(Config.JOB_STALE_SECONDS / 4, 1))
+
+    for index in range(Config.JOB_WORKERS):
+        threading.Thread(target=work, name=f'job-worker-{index}', daemon=True).start()
+    threading.Thread(target=maintain, name='job-maintenance', daemon=True).start()
+    _workers_started = True
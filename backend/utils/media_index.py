@@ -0,0 +1,255 @@
+import hashlib
+import logging
+import os
+import posixpath
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from config import Config
+from utils.api_helpers import utc_now_iso
+from utils.fanout import map_bounded
+from utils.jobs import job_handler, get_job_queue, QUEUED, RUNNING
+from utils.wordpress_api import get_wp_api, get_wp_session
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_digests (
+    sha256 TEXT PRIMARY KEY,
+    media_id INTEGER NOT NULL,
+    source_url TEXT,
+    size INTEGER,
+    origin TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_media_digests_media_id ON media_digests (media_id);
+
+CREATE TABLE IF NOT EXISTS media_index_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+BACKFILL_PAGE_SIZE = 100
+# Tras un backfill fallido no se vuelve a lanzar hasta pasado este tiempo
+BACKFILL_RETRY_SECONDS = 3600
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def sha256_stream(stream, chunk_size=256 * 1024):
+    """
+    SHA-256 de un archivo recibido leyéndolo por bloques; deja el stream al principio.
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class MediaIndex:
+    """
+    Índice local SHA-256 del contenido -> id del medio en WordPress.
+
+    Se alimenta con cada subida (el hash de lo recibido y el de lo enviado, si la
+    optimización lo cambió) y con un backfill en segundo plano que descarga y
+    resume la biblioteca de medios existente.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def get_state(self, key, default=None):
+        row = self.connection().execute("SELECT value FROM media_index_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_state(self, key, value):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO media_index_state (key, value) VALUES (?, ?)", (key, value))
+
+    def lookup(self, sha256):
+        row = self.connection().execute("SELECT * FROM media_digests WHERE sha256 = ?", (sha256,)).fetchone()
+        return dict(row) if row else None
+
+    def record(self, sha256, media_id, source_url=None, size=None, origin='upload'):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media_digests (sha256, media_id, source_url, size, origin, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, media_id, source_url, size, origin, utc_now_iso())
+            )
+
+    def forget_media(self, media_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM media_digests WHERE media_id = ?", (media_id,))
+
+    def indexed_media_ids(self, media_ids):
+        if not media_ids:
+            return set()
+        placeholders = ','.join('?' * len(media_ids))
+        rows = self.connection().execute(
+            f"SELECT DISTINCT media_id FROM media_digests WHERE media_id IN ({placeholders})", list(media_ids)
+        )
+        return {row['media_id'] for row in rows}
+
+    def stats(self):
+        conn = self.connection()
+        by_origin = {
+            row['origin']: row['n']
+            for row in conn.execute("SELECT origin, COUNT(*) AS n FROM media_digests GROUP BY origin")
+        }
+        return {
+            'digests': sum(by_origin.values()),
+            'by_origin': by_origin,
+            'backfill_completed_at': self.get_state('backfill_completed_at'),
+            'backfill_job_id': self.get_state('backfill_job_id'),
+            'backfill_page': int(self.get_state('backfill_page', '0'))
+        }
+
+    def ensure_backfill(self, force=False):
+        """
+        Encola el backfill de la biblioteca si no está hecho ni en marcha.
+        Devuelve el id del trabajo activo o None.
+        """
+        if not force and self.get_state('backfill_completed_at') is not None:
+            return None
+        queue = get_job_queue()
+        with self.transaction() as conn:
+            state = {row['key']: row['value'] for row in conn.execute("SELECT key, value FROM media_index_state")}
+            job = queue.get(state['backfill_job_id']) if state.get('backfill_job_id') else None
+            if job is not None and job['status'] in (QUEUED, RUNNING):
+                return job['id']
+            submitted_at = state.get('backfill_submitted_at')
+            retry_after = (datetime.now(timezone.utc) - timedelta(seconds=BACKFILL_RETRY_SECONDS)).isoformat()
+            if not force and job is not None and submitted_at and submitted_at > retry_after:
+                return None
+            if force:
+                conn.execute("DELETE FROM media_index_state WHERE key IN ('backfill_completed_at', 'backfill_page')")
+            job_id = queue.submit('media.index_backfill', {})
+            conn.executemany(
+                "INSERT OR REPLACE INTO media_index_state (key, value) VALUES (?, ?)",
+                [('backfill_job_id', job_id), ('backfill_submitted_at', utc_now_iso())]
+            )
+        return job_id
+
+
+def get_media_index():
+    """
+    Devuelve el índice de hashes de medios compartido por el proceso.
+    """
+    global _index
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = MediaIndex(os.path.join(Config.DATA_DIR, 'media_index.db'))
+    return _index
+
+
+def original_file_url(media):
+    """
+    URL del archivo tal y como se subió: WordPress sirve una copia '-scaled' de las
+    imágenes grandes y guarda el nombre del original en media_details.original_image.
+    """
+    source_url = media.get('source_url')
+    original = (media.get('media_details') or {}).get('original_image')
+    if source_url and original:
+        return posixpath.join(posixpath.dirname(source_url), original)
+    return source_url
+
+
+def _hash_remote_file(url):
+    digest = hashlib.sha256()
+    size = 0
+    with get_wp_session().get(url, stream=True, timeout=(Config.WP_CONNECT_TIMEOUT, Config.WP_UPLOAD_TIMEOUT)) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=256 * 1024):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@job_handler('media.index_backfill')
+def backfill_media_index(job):
+    """
+    Recorre /wp/v2/media por páginas, descarga cada archivo aún no indexado y
+    guarda su SHA-256. La página alcanzada se guarda en el índice, así que tras
+    un reinicio continúa donde se quedó.
+    """
+    index = get_media_index()
+    wp_api = get_wp_api()
+    # La última página guardada se repite: los medios ya indexados se saltan
+    page = max(int(index.get_state('backfill_page', '0')), 1)
+    hashed = failed = 0
+
+    while True:
+        try:
+            response = wp_api.get('media', params={
+                'per_page': BACKFILL_PAGE_SIZE,
+                'page': page,
+                'orderby': 'id',
+                'order': 'asc',
+                '_fields': 'id,source_url,media_details.original_image'
+            })
+        except requests.exceptions.HTTPError as e:
+            # WordPress responde 400 a una página fuera de rango (se borraron medios)
+            if page > 1 and e.response.status_code == 400:
+                break
+            raise
+        items = response.json()
+        total = int(response.headers.get('X-WP-Total', 0)) or None
+        total_pages = int(response.headers.get('X-WP-TotalPages', 0))
+
+        indexed = index.indexed_media_ids([item['id'] for item in items])
+        pending = [item for item in items if item['id'] not in indexed and original_file_url(item)]
+        outcomes = map_bounded(lambda item: _hash_remote_file(original_file_url(item)), pending,
+                               Config.MEDIA_INDEX_BACKFILL_CONCURRENCY)
+        for item, (result, error) in zip(pending, outcomes):
+            if error is not None:
+                logger.warning(f"Could not hash media {item['id']}: {error}")
+                failed += 1
+                continue
+            sha256, size = result
+            index.record(sha256, item['id'], item.get('source_url'), size, origin='backfill')
+            hashed += 1
+
+        index.set_state('backfill_page', str(page))
+        job.progress(min(page * BACKFILL_PAGE_SIZE, total or 0), total, {'page': page, 'hashed': hashed, 'failed': failed})
+        if not items or page >= total_pages:
+            break
+        page += 1
+
+    index.set_state('backfill_completed_at', utc_now_iso())
+    return {'success': True, 'hashed': hashed, 'failed': failed, 'pages': page}
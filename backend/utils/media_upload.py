@@ -0,0 +1,215 @@
+import io
+import logging
+import mimetypes
+import os
+
+import requests
+from flask import request
+from werkzeug.utils import secure_filename
+
+from config import Config
+from utils.fanout import map_bounded
+from utils.image_optimize import optimize_upload
+from utils.media_index import get_media_index, sha256_stream
+from utils.wordpress_api import get_wp_api
+
+logger = logging.getLogger(__name__)
+
+
+class MediaUploadError(Exception):
+    """
+    Error de subida con el mensaje y el código HTTP que se devuelven al cliente.
+    """
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def stream_size(stream):
+    """
+    Tamaño de un archivo recibido (werkzeug lo guarda en memoria o en un temporal)
+    sin leerlo: se mide con seek y se vuelve al principio.
+    """
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def guess_content_type(filename, declared=None):
+    if declared and declared != 'application/octet-stream':
+        return declared
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def check_request_size(max_files=1):
+    """
+    Rechaza antes de leer el cuerpo las peticiones que declaran más bytes de los
+    que pueden traer `max_files` archivos. Devuelve un MediaUploadError o None.
+    """
+    limit = Config.MEDIA_MAX_UPLOAD_BYTES * max_files + 64 * 1024
+    if request.content_length is not None and request.content_length > limit:
+        return MediaUploadError(f"La petición supera el tamaño máximo de {limit // (1024 * 1024)} MB", 413)
+    return None
+
+
+def optimize_requested():
+    """
+    Optimizar las imágenes de esta petición: campo o parámetro 'optimize' (1/0)
+    o, si no se indica, MEDIA_OPTIMIZE_ENABLED.
+    """
+    flag = request.form.get('optimize') or request.args.get('optimize')
+    if flag is None:
+        return Config.MEDIA_OPTIMIZE_ENABLED
+    return flag.lower() in ('1', 'true')
+
+
+def dedupe_requested():
+    """
+    Reutilizar medios ya subidos con el mismo contenido: desactivado con el campo
+    o parámetro 'force_new' (1/true) o con MEDIA_DEDUPE_ENABLED=false.
+    """
+    flag = request.form.get('force_new') or request.args.get('force_new') or ''
+    return Config.MEDIA_DEDUPE_ENABLED and flag.lower() not in ('1', 'true')
+
+
+def wordpress_client():
+    try:
+        return get_wp_api()
+    except ValueError:
+        raise MediaUploadError("Credenciales de WordPress no configuradas", 500)
+
+
+def find_existing_media(sha256, wp_api):
+    """
+    Busca en el índice de hashes un medio con el mismo contenido y comprueba que
+    sigue existiendo en WordPress. Devuelve su JSON o None.
+    """
+    index = get_media_index()
+    entry = index.lookup(sha256)
+    if entry is None:
+        # Primer uso: el índice se completa en segundo plano con la biblioteca existente
+        index.ensure_backfill()
+        return None
+    try:
+        response = wp_api.request('GET', f"{wp_api.api_url}/media/{entry['media_id']}", headers=wp_api.headers)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Could not check indexed media {entry['media_id']}: {e}")
+        return None
+    if response.status_code in (404, 410):
+        index.forget_media(entry['media_id'])
+        return None
+    if not response.ok:
+        return None
+    return response.json()
+
+
+def upload_file_storage(file, alt_text=None, wp_api=None, optimize=False, dedupe=False):
+    """
+    Sube un archivo recibido (werkzeug FileStorage) a /wp-json/wp/v2/media.
+
+    El archivo se envía como cuerpo de la petición en bloques desde su stream, sin
+    montar un multipart en memoria. Con `optimize` las imágenes se redimensionan y
+    recodifican antes en el pool de procesos (utils.image_optimize) y el medio
+    devuelto incluye 'optimization' con los bytes ahorrados.
+
+    Con `dedupe` se calcula el SHA-256 del archivo y, si ya se subió antes (o está
+    en la biblioteca indexada), se devuelve el medio existente marcado con
+    'deduplicated' sin volver a enviarlo.
+
+    Devuelve el JSON del medio creado o lanza MediaUploadError.
+    """
+    if file is None or not file.filename:
+        raise MediaUploadError("No se seleccionó ningún archivo", 400)
+
+    filename = secure_filename(file.filename)
+    if not filename:
+        raise MediaUploadError("Nombre de archivo no válido", 400)
+
+    size = stream_size(file.stream)
+    if size == 0:
+        raise MediaUploadError(f"{filename} está vacío", 400)
+    if size > Config.MEDIA_MAX_UPLOAD_BYTES:
+        raise MediaUploadError(
+            f"{filename} supera el tamaño máximo de {Config.MEDIA_MAX_UPLOAD_BYTES // (1024 * 1024)} MB", 413
+        )
+
+    wp_api = wp_api or wordpress_client()
+    original_sha256 = None
+    if dedupe:
+        original_sha256 = sha256_stream(file.stream)
+        existing = find_existing_media(original_sha256, wp_api)
+        if existing is not None:
+            logger.info(f"Media {filename} already uploaded as ID {existing['id']}, skipping upload")
+            existing['deduplicated'] = True
+            return existing
+
+    content_type = guess_content_type(filename, file.mimetype)
+    body, report = file.stream, None
+    if optimize:
+        data, filename, content_type, report = optimize_upload(file.stream.read(), filename, content_type)
+        body, size = io.BytesIO(data), len(data)
+
+    try:
+        response = wp_api.upload_media(body, filename, alt_text=alt_text, content_type=content_type,
+                                       content_length=size)
+    except requests.exceptions.HTTPError as e:
+        message = 'Error desconocido'
+        try:
+            message = e.response.json().get('message', message)
+        except ValueError:
+            pass
+        raise MediaUploadError(f"Error al subir el archivo: {message}", e.response.status_code)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Media upload of {filename} failed: {e}")
+        raise MediaUploadError("Error de conexión con WordPress al subir el archivo", 502)
+
+    media = response.json()
+    # Comprobar si la subida falló silenciosamente
+    if not media.get('id'):
+        raise MediaUploadError(media.get('message', 'WordPress returned null data after upload.'), 500)
+
+    if report is not None:
+        media['optimization'] = report
+    if dedupe:
+        _record_upload(media, original_sha256, body if report and report['applied'] else None)
+    logger.info(f"Uploaded media {filename} ({size} bytes) as ID {media['id']}")
+    return media
+
+
+def _record_upload(media, original_sha256, sent_body=None):
+    """
+    Registra el hash de lo recibido y, si la optimización cambió el archivo, el de
+    lo enviado (es lo que guarda WordPress y lo que encontrará el backfill).
+    """
+    try:
+        index = get_media_index()
+        index.record(original_sha256, media['id'], media.get('source_url'))
+        if sent_body is not None:
+            index.record(sha256_stream(sent_body), media['id'], media.get('source_url'))
+    except Exception as e:
+        logger.warning(f"Could not index media {media['id']}: {e}")
+
+
+def upload_many(files, alt_texts=None, concurrency=None, optimize=False, dedupe=False):
+    """
+    Sube varios archivos a la vez, como mucho MEDIA_UPLOAD_CONCURRENCY en vuelo.
+
+    Devuelve una lista alineada con `files` de tuplas (medio, MediaUploadError).
+    """
+    alt_texts = alt_texts or []
+    wp_api = wordpress_client() if files else None
+    items = [(file, alt_texts[index] if index < len(alt_texts) else None) for index, file in enumerate(files)]
+
+    def upload(item):
+        return upload_file_storage(item[0], alt_text=item[1], wp_api=wp_api, optimize=optimize, dedupe=dedupe)
+
+    results = []
+    for media, error in map_bounded(upload, items, concurrency or Config.MEDIA_UPLOAD_CONCURRENCY):
+        if error is not None and not isinstance(error, MediaUploadError):
+            logger.error(f"Unexpected media upload error: {error}")
+            error = MediaUploadError("Error al subir el archivo", 500)
+        results.append((media, error))
+    return results
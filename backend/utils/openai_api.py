@@ -0,0 +1,185 @@
+import json
+import logging
+
+import requests
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _headers():
+    return {
+        'Authorization': f'Bearer {Config.OPENAI_API_KEY}',
+        'Content-Type': 'application/json'
+    }
+
+
+def stream_chat_completion(payload, timeout):
+    """
+    Llamada a chat/completions con stream=true.
+
+    Genera los fragmentos de texto según llegan y, al final, un diccionario con
+    'model', 'usage' y 'finish_reason'. `timeout` es el máximo entre fragmentos,
+    no la duración total.
+    """
+    response = requests.post(
+        f"{Config.OPENAI_API_URL}/chat/completions",
+        headers=_headers(),
+        json={**payload, 'stream': True, 'stream_options': {'include_usage': True}},
+        timeout=timeout,
+        stream=True
+    )
+    with response:
+        if not response.ok:
+            error_data = response.json() if response.content else {"error": "No response content"}
+            logger.error(f"OpenAI API error: {error_data}")
+            response.raise_for_status()
+
+        summary = {'model': payload.get('model'), 'usage': {}, 'finish_reason': None}
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            chunk = json.loads(data)
+            summary['model'] = chunk.get('model') or summary['model']
+            if chunk.get('usage'):
+                summary['usage'] = chunk['usage']
+            for choice in chunk.get('choices') or []:
+                if choice.get('finish_reason'):
+                    summary['finish_reason'] = choice['finish_reason']
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    yield text
+        yield summary
+
+
+class IncrementalJSONObject:
+    """
+    Analiza un objeto JSON que llega por fragmentos (p. ej. tokens de OpenAI)
+    y avisa en cuanto se completa cada miembro de primer nivel y cada elemento
+    de un array de primer nivel, sin volver a recorrer lo ya leído.
+
+    Ignora el texto antes de la primera '{' (como las vallas ```json).
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.expect = 'object'
+        self.key = None
+        self.value_start = None
+        self.value_is_array = False
+        self.item_start = None
+        self.item_index = 0
+        self.complete = False
+
+    def feed(self, text):
+        """
+        Añade texto y devuelve la lista de novedades: ('field', clave, valor) e
+        ('item', clave, índice, valor).
+        """
+        self.buffer += text
+        events = []
+        while self.pos < len(self.buffer) and not self.complete:
+            self._step(self.buffer[self.pos], events)
+            self.pos += 1
+        return events
+
+    def _decode(self, start, end):
+        try:
+            return json.loads(self.buffer[start:end])
+        except json.JSONDecodeError:
+            return None
+
+    def _finish_value(self, end, events):
+        events.append(('field', self.key, self._decode(self.value_start, end)))
+        self.expect = 'comma'
+
+    def _finish_item(self, end, events):
+        events.append(('item', self.key, self.item_index, self._decode(self.item_start, end)))
+        self.item_index += 1
+        self.item_start = None
+
+    def _step(self, ch, events):
+        pos = self.pos
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif ch == '\\':
+                self.escape = True
+            elif ch == '"':
+                self.in_string = False
+                if self.depth == 1 and self.expect == 'key_end':
+                    self.key = self._decode(self.value_start, pos + 1)
+                    self.expect = 'colon'
+                elif self.depth == 1 and self.expect == 'in_value':
+                    self._finish_value(pos + 1, events)
+                elif self.depth == 2 and self.value_is_array and self.item_start is not None \
+                        and self.buffer[self.item_start] == '"':
+                    self._finish_item(pos + 1, events)
+            return
+
+        if self.depth == 0:
+            if ch == '{' and self.expect == 'object':
+                self.depth = 1
+                self.expect = 'key'
+            return
+
+        if ch.isspace():
+            return
+
+        # Inicio de un elemento de un array de primer nivel
+        if self.depth == 2 and self.value_is_array and self.item_start is None and ch not in ',]':
+            self.item_start = pos
+
+        if ch == '"':
+            self.in_string = True
+            if self.depth == 1 and self.expect == 'key':
+                self.value_start = pos
+                self.expect = 'key_end'
+            elif self.depth == 1 and self.expect == 'value':
+                self.value_start = pos
+                self.value_is_array = False
+                self.expect = 'in_value'
+        elif ch in '{[':
+            if self.depth == 1 and self.expect == 'value':
+                self.value_start = pos
+                self.value_is_array = ch == '['
+                self.item_index = 0
+                self.item_start = None
+                self.expect = 'in_value'
+            self.depth += 1
+        elif ch in '}]':
+            if self.depth == 2 and self.value_is_array and self.item_start is not None:
+                self._finish_item(pos, events)
+            self.depth -= 1
+            if self.depth == 0:
+                if self.expect == 'in_value':
+                    self._finish_value(pos, events)
+                self.complete = True
+            elif self.depth == 1 and self.expect == 'in_value':
+                self._finish_value(pos + 1, events)
+            elif self.depth == 2 and self.value_is_array and self.item_start is not None:
+                self._finish_item(pos + 1, events)
+        elif ch == ',':
+            if self.depth == 1 and self.expect == 'in_value':
+                self._finish_value(pos, events)
+                self.expect = 'key'
+            elif self.depth == 1 and self.expect == 'comma':
+                self.expect = 'key'
+            elif self.depth == 2 and self.value_is_array and self.item_start is not None:
+                self._finish_item(pos, events)
+        elif ch == ':':
+            if self.depth == 1 and self.expect == 'colon':
+                self.expect = 'value'
+        elif self.depth == 1 and self.expect == 'value':
+            # Número, true, false o null
+            self.value_start = pos
+            self.value_is_array = False
+            self.expect = 'in_value'
@@ -0,0 +1,194 @@
+import json
+
+from utils.text_index import GramIndex, digits, fold, match_score, query_tokens
+
+# Índice de búsqueda de pedidos (/orders/search), dentro de la réplica de pedidos
+# (DATA_DIR/orders.db). Se mantiene en la misma transacción que guarda o borra cada
+# pedido, así que lo actualizan igual el sondeo de modificaciones, los webhooks y
+# las escrituras del panel. Cada pedido tiene un texto normalizado (número, email,
+# nombres, teléfono y SKUs), sus trigramas y un resumen para la respuesta.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_index (
+    order_id INTEGER PRIMARY KEY,
+    search_text TEXT NOT NULL DEFAULT '',
+    summary TEXT NOT NULL
+);
+"""
+
+# Trigramas del texto de búsqueda: order_grams y order_gram_counts
+GRAMS = GramIndex('order', 'order_index', 'order_id', key_type='INTEGER')
+SCHEMA += GRAMS.schema
+
+# Estados que no se devuelven en la búsqueda (carritos abandonados y papelera)
+EXCLUDED_STATUSES = ('checkout-draft', 'trash')
+
+# Candidatos que se puntúan como máximo en una búsqueda
+MAX_CANDIDATES = 500
+
+# Puntos extra cuando la consulta es exactamente el número del pedido
+NUMBER_MATCH_BONUS = 10
+
+# Pedidos por transacción al reconstruir el índice
+REBUILD_CHUNK = 1000
+
+
+def order_search_text(order):
+    """
+    Texto de búsqueda de un pedido; empieza siempre por el número del pedido.
+    """
+    billing = order.get('billing') or {}
+    phone = billing.get('phone') or ''
+    number = str(order.get('number') or order.get('id') or '')
+    parts = [
+        number,
+        str(order.get('id')) if str(order.get('id')) != number else '',
+        billing.get('email'),
+        billing.get('first_name'),
+        billing.get('last_name'),
+        (order.get('shipping') or {}).get('first_name'),
+        (order.get('shipping') or {}).get('last_name'),
+        phone,
+        digits(phone) if digits(phone) != phone else '',
+        *[item.get('sku') for item in order.get('line_items') or [] if isinstance(item, dict)]
+    ]
+    words = []
+    for part in parts:
+        for word in fold(part).split() if part else ():
+            if word not in words:
+                words.append(word)
+    return ' '.join(words)
+
+
+def order_summary(order):
+    billing = order.get('billing') or {}
+    return {
+        'id': order.get('id'),
+        'number': order.get('number'),
+        'status': order.get('status'),
+        'date_created': order.get('date_created'),
+        'total': order.get('total'),
+        'currency': order.get('currency'),
+        'customer_id': order.get('customer_id'),
+        'billing': {
+            'first_name': billing.get('first_name', ''),
+            'last_name': billing.get('last_name', ''),
+            'email': billing.get('email', ''),
+            'phone': billing.get('phone', '')
+        },
+        'items_count': sum(
+            item.get('quantity') or 0 for item in order.get('line_items') or [] if isinstance(item, dict)
+        )
+    }
+
+
+def write(conn, order):
+    order_id = int(order['id'])
+    search_text = order_search_text(order)
+    summary = json.dumps(order_summary(order), ensure_ascii=False)
+    previous = conn.execute("SELECT search_text, summary FROM order_index WHERE order_id = ?", (order_id,)).fetchone()
+    if previous is not None and previous['search_text'] == search_text and previous['summary'] == summary:
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO order_index (order_id, search_text, summary) VALUES (?, ?, ?)",
+        (order_id, search_text, summary)
+    )
+    GRAMS.update(conn, order_id, previous['search_text'] if previous is not None else None, search_text)
+
+
+def remove(conn, order_id):
+    previous = conn.execute("SELECT search_text FROM order_index WHERE order_id = ?", (int(order_id),)).fetchone()
+    if previous is None:
+        return
+    conn.execute("DELETE FROM order_index WHERE order_id = ?", (int(order_id),))
+    GRAMS.update(conn, int(order_id), previous['search_text'], None)
+
+
+def clear(conn):
+    conn.execute("DELETE FROM order_index")
+    GRAMS.clear(conn)
+
+
+def rebuild(transaction):
+    """
+    Vuelve a indexar todos los pedidos de la réplica, REBUILD_CHUNK pedidos por
+    transacción (`transaction` es OrderStore.transaction) para no bloquear la
+    sincronización. Los pedidos guardados mientras tanto se indexan al guardarse y
+    aquí se saltan; las frecuencias de los trigramas se cuentan al final.
+    """
+    with transaction() as conn:
+        clear(conn)
+    last_id = 0
+    while True:
+        with transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, data FROM orders WHERE id > ? ORDER BY id LIMIT ?", (last_id, REBUILD_CHUNK)
+            ).fetchall()
+            entries = []
+            for row in rows:
+                order = json.loads(row['data'])
+                search_text = order_search_text(order)
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO order_index (order_id, search_text, summary) VALUES (?, ?, ?)",
+                    (row['id'], search_text, json.dumps(order_summary(order), ensure_ascii=False))
+                ).rowcount
+                if inserted:
+                    entries.append((row['id'], search_text))
+            GRAMS.insert_many(conn, entries)
+        if len(rows) < REBUILD_CHUNK:
+            break
+        last_id = rows[-1]['id']
+    with transaction() as conn:
+        GRAMS.recount(conn)
+
+
+def _search_tokens(query):
+    # "#1234" es el número de pedido 1234
+    return [token for token in (t.lstrip('#') for t in query_tokens(query)) if token]
+
+
+def search(conn, query, limit=10):
+    """
+    Resúmenes de los pedidos que contienen todas las palabras de la consulta: primero
+    el pedido cuyo número es la consulta, después por puntuación (palabra exacta,
+    prefijo, subcadena) y a igualdad los más recientes.
+
+    Entre muchas coincidencias sólo se puntúan MAX_CANDIDATES: las exactas y de
+    prefijo de los pedidos más recientes y, si queda hueco, las de subcadena. El
+    número exacto y el email exacto se buscan además directamente.
+    """
+    tokens = _search_tokens(query)
+    if not tokens:
+        return []
+    keys = GRAMS.ranked_candidates(conn, tokens, MAX_CANDIDATES, newest_first=True)
+    if len(tokens) == 1:
+        keys += [row['id'] for row in conn.execute(
+            "SELECT id FROM orders WHERE number = ? OR billing_email = ?", (tokens[0], tokens[0])
+        )]
+    if not keys:
+        return []
+    excluded = ','.join('?' * len(EXCLUDED_STATUSES))
+    rows = conn.execute(
+        f"SELECT i.order_id, i.search_text, o.date_created FROM order_index i "
+        f"JOIN orders o ON o.id = i.order_id "
+        f"WHERE i.order_id IN ({','.join('?' * len(set(keys)))}) AND o.status NOT IN ({excluded})",
+        [*set(keys), *EXCLUDED_STATUSES]
+    ).fetchall()
+
+    matches = []
+    for row in rows:
+        score = match_score(tokens, row['search_text'])
+        if score is None:
+            continue
+        if len(tokens) == 1 and row['search_text'].split(' ', 1)[0] == tokens[0]:
+            score += NUMBER_MATCH_BONUS
+        matches.append((score, row['date_created'] or '', row['order_id']))
+    top = [match[2] for match in sorted(matches, reverse=True)[:limit]]
+    if not top:
+        return []
+
+    summaries = {
+        row['order_id']: row['summary'] for row in conn.execute(
+            f"SELECT order_id, summary FROM order_index WHERE order_id IN ({','.join('?' * len(top))})", top
+        )
+    }
+    return [json.loads(summaries[order_id]) for order_id in top]
@@ -0,0 +1,685 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+from config import Config
+from utils.api_helpers import utc_now_iso
+from utils import customer_directory, order_index
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    number TEXT,
+    status TEXT NOT NULL,
+    customer_id INTEGER NOT NULL DEFAULT 0,
+    billing_email TEXT NOT NULL DEFAULT '',
+    currency TEXT,
+    total REAL NOT NULL DEFAULT 0,
+    date_created TEXT,
+    date_created_gmt TEXT,
+    date_modified_gmt TEXT,
+    search_text TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders (status, date_created);
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (date_created);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders (customer_id, date_created);
+CREATE INDEX IF NOT EXISTS idx_orders_email ON orders (billing_email);
+CREATE INDEX IF NOT EXISTS idx_orders_number ON orders (number);
+CREATE INDEX IF NOT EXISTS idx_orders_modified ON orders (date_modified_gmt);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id INTEGER PRIMARY KEY,
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    total_spent REAL NOT NULL DEFAULT 0,
+    first_order_date TEXT,
+    last_order_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS revenue_hourly (
+    bucket TEXT NOT NULL,
+    status TEXT NOT NULL,
+    currency TEXT NOT NULL DEFAULT '',
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue_cents INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, status, currency)
+);
+
+CREATE TABLE IF NOT EXISTS revenue_daily (
+    bucket TEXT NOT NULL,
+    status TEXT NOT NULL,
+    currency TEXT NOT NULL DEFAULT '',
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue_cents INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, status, currency)
+);
+"""
+
+# Mismos criterios que usaba /customers al calcular las estadísticas en vivo
+EXCLUDED_CUSTOMER_STATUSES = ('checkout-draft', 'failed', 'cancelled')
+PAID_STATUSES = ('completed', 'processing')
+
+_IN_EXCLUDED = f"({','.join(repr(s) for s in EXCLUDED_CUSTOMER_STATUSES)})"
+_IN_PAID = f"({','.join(repr(s) for s in PAID_STATUSES)})"
+
+CUSTOMER_STATS_SELECT = f"""
+SELECT customer_id,
+       COUNT(*) AS orders_count,
+       COALESCE(SUM(CASE WHEN status IN {_IN_PAID} THEN total ELSE 0 END), 0) AS total_spent,
+       MIN(date_created) AS first_order_date,
+       MAX(date_created) AS last_order_date
+FROM orders
+WHERE customer_id {{customer_filter}} AND status NOT IN {_IN_EXCLUDED}
+GROUP BY customer_id
+"""
+
+# Campos de ordenación aceptados por /orders (mismos nombres que WooCommerce)
+ORDERBY_COLUMNS = {
+    'date': 'date_created',
+    'id': 'id',
+    'modified': 'date_modified_gmt',
+    'total': 'total'
+}
+
+# Tablas de agregados de ventas y longitud del prefijo de date_created que forma
+# el bucket ('YYYY-MM-DDTHH' por hora, 'YYYY-MM-DD' por día)
+ROLLUP_TABLES = {
+    'revenue_hourly': 13,
+    'revenue_daily': 10
+}
+
+# Granularidades de revenue_series: (tabla, longitud del prefijo del bucket)
+ROLLUP_GRANULARITIES = {
+    'hour': ('revenue_hourly', 13),
+    'day': ('revenue_daily', 10),
+    'month': ('revenue_daily', 7),
+    'year': ('revenue_daily', 4)
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _order_search_text(order):
+    billing = order.get('billing') or {}
+    parts = [
+        str(order.get('id', '')),
+        str(order.get('number', '')),
+        billing.get('first_name', ''),
+        billing.get('last_name', ''),
+        billing.get('email', ''),
+        billing.get('phone', ''),
+        billing.get('company', '')
+    ]
+    return ' '.join(p for p in parts if p).lower()
+
+
+def _to_cents(total):
+    return int(round(float(total or 0) * 100))
+
+
+def _rollup_range_parts(after=None, before=None):
+    """
+    Divide el rango [after, before) en trozos que cubren las horas sueltas de los
+    extremos con revenue_hourly y los días completos con revenue_daily.
+
+    Los límites se redondean a la hora. Devuelve [(tabla, desde, hasta)] con
+    desde inclusive, hasta exclusive y None como límite abierto.
+    """
+    start = after[:13] if after else None
+    end = before[:13] if before else None
+    if start and len(start) == 10:
+        start += 'T00'
+    if end and len(end) == 10:
+        end += 'T00'
+    if start and end and start >= end:
+        return []
+
+    first_full_day = None
+    if start:
+        first_full_day = start[:10]
+        if not start.endswith('T00'):
+            first_full_day = (date.fromisoformat(start[:10]) + timedelta(days=1)).isoformat()
+    end_day = end[:10] if end else None
+
+    parts = []
+    if start and not start.endswith('T00'):
+        head_end = f"{first_full_day}T00"
+        parts.append(('revenue_hourly', start, min(head_end, end) if end else head_end))
+    if first_full_day is None or end_day is None or first_full_day < end_day:
+        parts.append(('revenue_daily', first_full_day, end_day))
+    if end and not end.endswith('T00') and (first_full_day is None or end_day >= first_full_day):
+        parts.append(('revenue_hourly', f"{end_day}T00", end))
+    return parts
+
+
+def _order_row(order):
+    billing = order.get('billing') or {}
+    try:
+        total = float(order.get('total') or 0)
+    except (TypeError, ValueError):
+        total = 0.0
+    return (
+        int(order['id']),
+        str(order.get('number') or order['id']),
+        order.get('status') or 'pending',
+        int(order.get('customer_id') or 0),
+        (billing.get('email') or '').strip().lower(),
+        order.get('currency'),
+        total,
+        order.get('date_created'),
+        order.get('date_created_gmt'),
+        order.get('date_modified_gmt'),
+        _order_search_text(order),
+        json.dumps(order, ensure_ascii=False)
+    )
+
+
+class OrderStore:
+    """
+    Réplica local en SQLite de los pedidos de WooCommerce.
+
+    Guarda el JSON completo de cada pedido junto con las columnas necesarias para
+    filtrar y agregar, de modo que los endpoints de lectura devuelven exactamente
+    la misma forma que la API de WooCommerce.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection().executescript(SCHEMA + customer_directory.SCHEMA + order_index.SCHEMA)
+        self._ensure_derived_tables()
+
+    def connection(self):
+        """
+        Conexión SQLite propia del hilo (y del proceso) actual.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    # ==================== ESCRITURA ====================
+
+    def _ensure_derived_tables(self):
+        """
+        Reconstruye las tablas derivadas que aún no se han calculado sobre los
+        pedidos existentes (p. ej. tras actualizar una réplica creada antes).
+        """
+        if self.get_state('customer_stats_built_at') is None:
+            self.rebuild_customer_stats()
+        if self.get_state('revenue_rollups_built_at') is None:
+            self.rebuild_revenue_rollups()
+        if self.get_state('guest_directory_built_at') is None:
+            self.rebuild_guest_directory()
+        if self.get_state('order_index_built_at') is None:
+            self.rebuild_order_index()
+
+    def rebuild_customer_stats(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM customer_stats")
+            conn.execute(
+                "INSERT INTO customer_stats (customer_id, orders_count, total_spent, first_order_date, last_order_date) "
+                + CUSTOMER_STATS_SELECT.format(customer_filter='> 0')
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('customer_stats_built_at', ?)",
+                (utc_now_iso(),)
+            )
+
+    def _refresh_customer_stats(self, conn, customer_ids):
+        """
+        Recalcula los agregados sólo de los clientes afectados por un cambio.
+        """
+        for customer_id in customer_ids:
+            if not customer_id:
+                continue
+            conn.execute("DELETE FROM customer_stats WHERE customer_id = ?", (customer_id,))
+            conn.execute(
+                "INSERT INTO customer_stats (customer_id, orders_count, total_spent, first_order_date, last_order_date) "
+                + CUSTOMER_STATS_SELECT.format(customer_filter='= ?'),
+                (customer_id,)
+            )
+
+    def rebuild_revenue_rollups(self):
+        """
+        Recalcula desde cero los agregados de ventas por hora y por día.
+        """
+        with self.transaction() as conn:
+            for table, length in ROLLUP_TABLES.items():
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(
+                    f"INSERT INTO {table} (bucket, status, currency, orders, revenue_cents) "
+                    f"SELECT substr(date_created, 1, {length}), status, COALESCE(currency, ''), COUNT(*), "
+                    f"SUM(CAST(ROUND(total * 100) AS INTEGER)) "
+                    f"FROM orders WHERE date_created IS NOT NULL "
+                    f"GROUP BY substr(date_created, 1, {length}), status, COALESCE(currency, '')"
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('revenue_rollups_built_at', ?)",
+                (utc_now_iso(),)
+            )
+
+    def rebuild_guest_directory(self):
+        """
+        Recalcula desde los pedidos los clientes invitados del directorio de clientes.
+        """
+        with self.transaction() as conn:
+            customer_directory.rebuild_guests(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('guest_directory_built_at', ?)",
+                (utc_now_iso(),)
+            )
+
+    def rebuild_order_index(self):
+        """
+        Vuelve a indexar todos los pedidos para la búsqueda de pedidos.
+        """
+        order_index.rebuild(self.transaction)
+        self.set_state('order_index_built_at', utc_now_iso())
+
+    def _apply_rollup(self, conn, previous, sign):
+        """
+        Suma (sign=1) o resta (sign=-1) la contribución de un pedido a los agregados
+        de ventas. `previous` es la fila de orders (o None si no existía).
+        """
+        if previous is None or not previous['date_created']:
+            return
+        cents = _to_cents(previous['total']) * sign
+        currency = previous['currency'] or ''
+        for table, length in ROLLUP_TABLES.items():
+            bucket = previous['date_created'][:length]
+            conn.execute(
+                f"INSERT INTO {table} (bucket, status, currency, orders, revenue_cents) VALUES (?, ?, ?, ?, ?) "
+                f"ON CONFLICT (bucket, status, currency) DO UPDATE SET "
+                f"orders = orders + excluded.orders, revenue_cents = revenue_cents + excluded.revenue_cents",
+                (bucket, previous['status'], currency, sign, cents)
+            )
+            if sign < 0:
+                conn.execute(
+                    f"DELETE FROM {table} WHERE bucket = ? AND status = ? AND currency = ? AND orders <= 0",
+                    (bucket, previous['status'], currency)
+                )
+
+    def _previous_order(self, conn, order_id):
+        return conn.execute(
+            "SELECT customer_id, billing_email, status, currency, total, date_created, date_modified_gmt "
+            "FROM orders WHERE id = ?",
+            (order_id,)
+        ).fetchone()
+
+    def upsert_orders(self, orders):
+        """
+        Inserta o actualiza pedidos. Devuelve el número de pedidos guardados.
+
+        Los agregados por cliente y de ventas se actualizan en la misma transacción.
+        Un pedido más antiguo (date_modified_gmt) que el guardado se ignora: un
+        webhook retrasado no deshace un cambio que ya trajo el sondeo.
+        """
+        saved = 0
+        touched_customers = set()
+        touched_guests = set()
+        with self.transaction() as conn:
+            for order in orders:
+                if not isinstance(order, dict) or not order.get('id'):
+                    continue
+                previous = self._previous_order(conn, int(order['id']))
+                if previous is not None:
+                    if (previous['date_modified_gmt'] and order.get('date_modified_gmt')
+                            and order['date_modified_gmt'] < previous['date_modified_gmt']):
+                        continue
+                    touched_customers.add(previous['customer_id'])
+                    if not previous['customer_id']:
+                        touched_guests.add(previous['billing_email'])
+                touched_customers.add(int(order.get('customer_id') or 0))
+                row = _order_row(order)
+                if not row[3]:
+                    touched_guests.add(row[4])
+                conn.execute(
+                    "INSERT OR REPLACE INTO orders (id, number, status, customer_id, billing_email, currency, "
+                    "total, date_created, date_created_gmt, date_modified_gmt, search_text, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                order_index.write(conn, order)
+                self._apply_rollup(conn, previous, -1)
+                self._apply_rollup(conn, {
+                    'status': row[2], 'currency': row[5], 'total': row[6], 'date_created': row[7]
+                }, 1)
+                saved += 1
+            self._refresh_customer_stats(conn, touched_customers)
+            customer_directory.refresh_guests(conn, touched_guests)
+        return saved
+
+    def delete_order(self, order_id):
+        with self.transaction() as conn:
+            previous = self._previous_order(conn, int(order_id))
+            if previous is None:
+                return
+            conn.execute("DELETE FROM orders WHERE id = ?", (int(order_id),))
+            order_index.remove(conn, order_id)
+            self._apply_rollup(conn, previous, -1)
+            self._refresh_customer_stats(conn, {previous['customer_id']})
+            if not previous['customer_id']:
+                customer_directory.refresh_guests(conn, {previous['billing_email']})
+
+    def upsert_customers(self, customers):
+        """
+        Guarda clientes registrados (respuestas de /customers) en el directorio de clientes.
+        """
+        with self.transaction() as conn:
+            return customer_directory.upsert_registered(conn, customers)
+
+    def replace_customers(self, customers):
+        """
+        Sustituye todos los clientes registrados del directorio por la lista dada,
+        en transacciones cortas para no bloquear la escritura de pedidos.
+        """
+        for start in range(0, len(customers), 500):
+            with self.transaction() as conn:
+                customer_directory.upsert_registered(conn, customers[start:start + 500])
+        with self.transaction() as conn:
+            customer_directory.prune_registered(conn, [c['id'] for c in customers if c.get('id')])
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('customers_synced_at', ?)",
+                (utc_now_iso(),)
+            )
+
+    def delete_customer(self, customer_id):
+        with self.transaction() as conn:
+            customer_directory.remove_registered(conn, customer_id)
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM orders")
+            conn.execute("DELETE FROM customer_stats")
+            for table in ROLLUP_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            customer_directory.clear(conn)
+            order_index.clear(conn)
+            conn.execute("DELETE FROM sync_state WHERE key NOT LIKE '%_built_at'")
+
+    # ==================== ESTADO DE SINCRONIZACIÓN ====================
+
+    def get_state(self, key, default=None):
+        row = self.connection().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_state(self, key, value):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def customers_ready(self):
+        """
+        True cuando el directorio de clientes ya tiene los clientes registrados.
+        """
+        return self.is_ready() and self.get_state('customers_synced_at') is not None
+
+    def is_ready(self):
+        """
+        True cuando ya se hizo el backfill inicial y la réplica puede responder lecturas.
+        """
+        return self.get_state('backfill_completed_at') is not None
+
+    def max_modified_gmt(self):
+        row = self.connection().execute("SELECT MAX(date_modified_gmt) AS m FROM orders").fetchone()
+        return row['m']
+
+    def freshness(self):
+        """
+        Marca de frescura que se incluye en las respuestas servidas desde la réplica.
+        """
+        synced_at = self.get_state('last_synced_at')
+        age_seconds = None
+        if synced_at:
+            synced = datetime.fromisoformat(synced_at).replace(tzinfo=timezone.utc)
+            age_seconds = int((datetime.now(timezone.utc) - synced).total_seconds())
+        return {
+            'source': 'local',
+            'synced_at': synced_at,
+            'watermark': self.max_modified_gmt(),
+            'age_seconds': age_seconds
+        }
+
+    # ==================== LECTURA ====================
+
+    def get_order(self, order_id):
+        row = self.connection().execute("SELECT data FROM orders WHERE id = ?", (int(order_id),)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def _filters(self, statuses=None, exclude_statuses=None, customer_id=None, email=None,
+                 after=None, before=None, search=None):
+        where = []
+        args = []
+        if statuses:
+            where.append(f"status IN ({','.join('?' * len(statuses))})")
+            args.extend(statuses)
+        if exclude_statuses:
+            where.append(f"status NOT IN ({','.join('?' * len(exclude_statuses))})")
+            args.extend(exclude_statuses)
+        if customer_id is not None:
+            where.append("customer_id = ?")
+            args.append(int(customer_id))
+        if email:
+            where.append("billing_email = ?")
+            args.append(email.strip().lower())
+        if after:
+            where.append("date_created > ?")
+            args.append(after)
+        if before:
+            where.append("date_created < ?")
+            args.append(before)
+        if search:
+            where.append("search_text LIKE ?")
+            args.append(f"%{search.strip().lower()}%")
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        return clause, args
+
+    def query_orders(self, page=1, per_page=20, orderby='date', order='desc', **filters):
+        """
+        Lista pedidos filtrados y paginados. Devuelve (pedidos, total).
+        """
+        clause, args = self._filters(**filters)
+        conn = self.connection()
+        total = conn.execute(f"SELECT COUNT(*) AS n FROM orders {clause}", args).fetchone()['n']
+
+        column = ORDERBY_COLUMNS.get(orderby, 'date_created')
+        direction = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+        rows = conn.execute(
+            f"SELECT data FROM orders {clause} ORDER BY {column} {direction}, id {direction} LIMIT ? OFFSET ?",
+            args + [per_page, max(page - 1, 0) * per_page]
+        ).fetchall()
+        return [json.loads(row['data']) for row in rows], total
+
+    def iter_orders(self, orderby='date', order='desc', **filters):
+        """
+        Recorre todos los pedidos que cumplen los filtros sin cargarlos a la vez en memoria.
+        """
+        clause, args = self._filters(**filters)
+        column = ORDERBY_COLUMNS.get(orderby, 'date_created')
+        direction = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+        cursor = self.connection().execute(
+            f"SELECT data FROM orders {clause} ORDER BY {column} {direction}, id {direction}",
+            args
+        )
+        for row in cursor:
+            yield json.loads(row['data'])
+
+    def status_summary(self, **filters):
+        """
+        Conteo de pedidos e importe total agrupados por estado.
+        """
+        clause, args = self._filters(**filters)
+        rows = self.connection().execute(
+            f"SELECT status, COUNT(*) AS orders, COALESCE(SUM(total), 0) AS revenue FROM orders {clause} GROUP BY status",
+            args
+        ).fetchall()
+        return {row['status']: {'orders': row['orders'], 'revenue': row['revenue']} for row in rows}
+
+    def _rollup_filters(self, statuses=None, exclude_statuses=None, currency=None):
+        where = []
+        args = []
+        if statuses:
+            where.append(f"status IN ({','.join('?' * len(statuses))})")
+            args.extend(statuses)
+        if exclude_statuses:
+            where.append(f"status NOT IN ({','.join('?' * len(exclude_statuses))})")
+            args.extend(exclude_statuses)
+        if currency:
+            where.append("currency = ?")
+            args.append(currency)
+        return where, args
+
+    def revenue_summary(self, after=None, before=None, statuses=None, exclude_statuses=None, currency=None):
+        """
+        Conteo de pedidos e importe agrupados por estado para un rango de fechas,
+        leído de los agregados (coste proporcional al número de buckets, no de pedidos).
+
+        Las fechas usan el mismo formato que date_created y se redondean a la hora:
+        se incluyen las horas desde `after` (inclusive) hasta `before` (exclusive).
+        """
+        base_where, base_args = self._rollup_filters(statuses, exclude_statuses, currency)
+        conn = self.connection()
+        summary = {}
+        for table, start, end in _rollup_range_parts(after, before):
+            where = list(base_where)
+            args = list(base_args)
+            if start:
+                where.append("bucket >= ?")
+                args.append(start)
+            if end:
+                where.append("bucket < ?")
+                args.append(end)
+            clause = f"WHERE {' AND '.join(where)}" if where else ''
+            rows = conn.execute(
+                f"SELECT status, SUM(orders) AS orders, SUM(revenue_cents) AS cents FROM {table} {clause} GROUP BY status",
+                args
+            ).fetchall()
+            for row in rows:
+                entry = summary.setdefault(row['status'], {'orders': 0, 'cents': 0})
+                entry['orders'] += row['orders']
+                entry['cents'] += row['cents']
+        return {
+            status: {'orders': entry['orders'], 'revenue': entry['cents'] / 100}
+            for status, entry in summary.items()
+        }
+
+    def revenue_series(self, granularity='month', after=None, before=None, statuses=PAID_STATUSES,
+                       exclude_statuses=None, currency=None):
+        """
+        Serie temporal de ventas: [{'period', 'orders', 'revenue'}] ordenada por periodo.
+
+        `granularity` es 'hour', 'day', 'month' o 'year'; `after`/`before` se
+        comparan con el bucket (inclusive/exclusive) y sólo aparecen los periodos
+        con pedidos.
+        """
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"Granularidad no válida: {granularity}")
+        table, length = ROLLUP_GRANULARITIES[granularity]
+        where, args = self._rollup_filters(statuses, exclude_statuses, currency)
+        if after:
+            where.append("bucket >= ?")
+            args.append(after[:ROLLUP_TABLES[table]])
+        if before:
+            where.append("bucket < ?")
+            args.append(before[:ROLLUP_TABLES[table]])
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        rows = self.connection().execute(
+            f"SELECT substr(bucket, 1, {length}) AS period, SUM(orders) AS orders, SUM(revenue_cents) AS cents "
+            f"FROM {table} {clause} GROUP BY period ORDER BY period",
+            args
+        ).fetchall()
+        return [{'period': row['period'], 'orders': row['orders'], 'revenue': row['cents'] / 100} for row in rows]
+
+    def customer_stats(self, customer_ids):
+        """
+        Agregados de pedidos de varios clientes registrados en una sola consulta.
+
+        Devuelve {customer_id: {'orders_count', 'total_spent', 'first_order_date',
+        'last_order_date'}}; los clientes sin pedidos no aparecen.
+        """
+        ids = [int(c) for c in customer_ids if c]
+        stats = {}
+        # SQLite limita el número de parámetros por consulta
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self.connection().execute(
+                f"SELECT * FROM customer_stats WHERE customer_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for row in rows:
+                stats[row['customer_id']] = dict(row)
+        return stats
+
+    def guest_customers(self):
+        """
+        Clientes invitados del directorio de clientes; ver customer_directory.guests.
+        """
+        return customer_directory.guests(self.connection())
+
+    def search_customers(self, query, limit=10):
+        """
+        Busca en el directorio de clientes (registrados e invitados); ver
+        customer_directory.search.
+        """
+        return customer_directory.search(self.connection(), query, limit)
+
+    def search_orders(self, query, limit=10):
+        """
+        Busca pedidos por número, email, nombres, teléfono o SKU; ver order_index.search.
+        """
+        return order_index.search(self.connection(), query, limit)
+
+
+def get_order_store():
+    """
+    Devuelve la réplica de pedidos compartida por el proceso.
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = OrderStore(os.path.join(Config.DATA_DIR, 'orders.db'))
+    return _store
+
+
+def get_ready_order_store():
+    """
+    Devuelve la réplica local de pedidos si ya está sincronizada, o None para
+    consultar WooCommerce directamente.
+    """
+    try:
+        store = get_order_store()
+        return store if store.is_ready() else None
+    except Exception as e:
+        logger.warning(f"Local order store unavailable: {e}")
+        return None
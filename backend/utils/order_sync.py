@@ -0,0 +1,182 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import Config
+from utils.api_helpers import utc_now_iso
+from utils.catalog_cache import fetch_all_pages
+from utils.order_store import get_order_store
+from utils.woocommerce_api import get_wc_api
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+
+# 'any' no incluye los carritos abandonados, se piden aparte
+SYNC_STATUSES = ('any', 'checkout-draft')
+
+# Tampoco incluye la papelera: los pedidos enviados a la papelera desde la última
+# marca de agua se quitan de la réplica aunque se perdiera su webhook
+TRASH_STATUS = 'trash'
+
+# Solape al consultar modified_after para no perder pedidos modificados en el mismo segundo
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+_poller_started = False
+
+
+def iter_order_pages(wc_api, params):
+    """
+    Recorre todas las páginas de /orders para los parámetros dados.
+    """
+    page = 1
+    while True:
+        response = wc_api.get("orders", params={**params, 'page': page, 'per_page': PAGE_SIZE})
+        if response.status_code != 200:
+            raise RuntimeError(f"WooCommerce returned {response.status_code} while syncing orders: {response.text[:200]}")
+
+        orders = response.json()
+        if not isinstance(orders, list) or not orders:
+            break
+        yield orders
+
+        total_pages = int(response.headers.get('X-WP-TotalPages', page))
+        if page >= total_pages:
+            break
+        page += 1
+
+
+def backfill_orders(store=None, wc_api=None):
+    """
+    Descarga todos los pedidos de WooCommerce a la réplica local.
+    """
+    store = store or get_order_store()
+    wc_api = wc_api or get_wc_api()
+    started_at = utc_now_iso()
+
+    total = 0
+    for status in SYNC_STATUSES:
+        for orders in iter_order_pages(wc_api, {'status': status, 'orderby': 'id', 'order': 'asc'}):
+            total += store.upsert_orders(orders)
+            logger.info(f"Order backfill: {total} orders stored")
+
+    store.set_state('backfill_completed_at', started_at)
+    store.set_state('last_synced_at', started_at)
+    return total
+
+
+def sync_modified_orders(store=None, wc_api=None, since=None):
+    """
+    Trae los pedidos modificados desde la última marca de agua (modified_after) y
+    elimina de la réplica los que se enviaron a la papelera.
+
+    Si la réplica todavía está vacía hace un backfill completo.
+    """
+    store = store or get_order_store()
+    wc_api = wc_api or get_wc_api()
+
+    if since is None:
+        watermark = store.max_modified_gmt()
+        if not store.is_ready() or not watermark:
+            return backfill_orders(store, wc_api)
+        since = (datetime.fromisoformat(watermark) - WATERMARK_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S')
+
+    started_at = utc_now_iso()
+    total = 0
+    for status in (*SYNC_STATUSES, TRASH_STATUS):
+        params = {
+            'status': status,
+            'modified_after': since,
+            'dates_are_gmt': 'true',
+            'orderby': 'id',
+            'order': 'asc'
+        }
+        for orders in iter_order_pages(wc_api, params):
+            if status == TRASH_STATUS:
+                for order in orders:
+                    store.delete_order(order['id'])
+                total += len(orders)
+            else:
+                total += store.upsert_orders(orders)
+
+    store.set_state('last_synced_at', started_at)
+    return total
+
+
+def sync_customers(store=None, wc_api=None):
+    """
+    Descarga todos los clientes registrados al directorio de clientes de la
+    réplica. Sólo se reescriben los que cambiaron y se quitan los borrados.
+    """
+    store = store or get_order_store()
+    customers = fetch_all_pages(wc_api or get_wc_api(), "customers", {'role': 'all'})
+    store.replace_customers(customers)
+    return len(customers)
+
+
+def customers_sync_due(store):
+    synced_at = store.get_state('customers_synced_at')
+    if synced_at is None:
+        return True
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(synced_at).replace(tzinfo=timezone.utc)
+    return age.total_seconds() >= Config.CUSTOMER_SYNC_INTERVAL
+
+
+def _sync_once(lock_path):
+    """
+    Ejecuta una sincronización si ningún otro worker la está haciendo. Los
+    clientes registrados se refrescan cada CUSTOMER_SYNC_INTERVAL segundos.
+    """
+    with open(lock_path, 'w') as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+        synced = sync_modified_orders()
+        store = get_order_store()
+        if Config.CUSTOMER_SYNC_INTERVAL > 0 and customers_sync_due(store):
+            try:
+                logger.info(f"Customer sync: {sync_customers(store)} registered customers")
+            except Exception as e:
+                logger.error(f"Customer sync failed: {e}")
+        return synced
+
+
+def start_order_sync_poller():
+    """
+    Arranca un hilo que sondea WooCommerce cada ORDER_SYNC_INTERVAL segundos.
+
+    Con varios workers de gunicorn cada uno arranca su hilo, pero un flock sobre
+    DATA_DIR/order_sync.lock garantiza que sólo uno sincroniza a la vez.
+    """
+    global _poller_started
+
+    if _poller_started or Config.ORDER_SYNC_INTERVAL <= 0:
+        return
+    if not all([Config.WC_STORE_URL, Config.WC_CONSUMER_KEY, Config.WC_CONSUMER_SECRET]):
+        logger.warning("Order sync poller disabled: WooCommerce credentials are not configured")
+        return
+
+    os.makedirs(Config.DATA_DIR, exist_ok=True)
+    lock_path = os.path.join(Config.DATA_DIR, 'order_sync.lock')
+
+    def poll():
+        while True:
+            try:
+                synced = _sync_once(lock_path)
+                if synced:
+                    logger.info(f"Order sync: {synced} orders updated")
+            except Exception as e:
+                logger.error(f"Order sync failed: {e}")
+            time.sleep(Config.ORDER_SYNC_INTERVAL)
+
+    threading.Thread(target=poll, name='order-sync', daemon=True).start()
+    _poller_started = True
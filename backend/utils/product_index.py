@@ -0,0 +1,453 @@
+import bisect
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from config import Config
+from utils.api_helpers import utc_now_iso
+from utils.catalog_cache import fetch_all_pages
+from utils.text_index import fold, tokenize, trigrams
+from utils.woocommerce_api import get_wc_api
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    data TEXT,
+    created_at TEXT NOT NULL
+);
+"""
+
+# Campos de WooCommerce necesarios para indexar y para el resumen de cada producto
+INDEX_FIELDS = (
+    'id,name,sku,slug,status,type,price,regular_price,sale_price,manage_stock,stock_quantity,'
+    'stock_status,images,categories,short_description,weight,dimensions,shipping_required,'
+    'virtual,downloadable,date_modified_gmt'
+)
+
+# Similitud mínima (coeficiente de Dice sobre trigramas) para aceptar un término aproximado
+FUZZY_THRESHOLD = 0.5
+# Los cambios se conservan el doble del intervalo de reconstrucción completa
+CHANGE_RETENTION_FACTOR = 2
+# Tras fallar la primera construcción no se vuelve a intentar hasta pasado este
+# tiempo: con WooCommerce caído cada búsqueda recorrería el catálogo entero
+BUILD_RETRY_SECONDS = 60
+
+_index = None
+_index_lock = threading.Lock()
+_log = None
+_log_lock = threading.Lock()
+
+
+def _as_float(value):
+    try:
+        return float(value) if value else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def product_summary(product):
+    """
+    Datos de un producto que necesita la interfaz de pedidos.
+    """
+    manage_stock = product.get('manage_stock', False)
+    stock_status = product.get('stock_status', 'outofstock')
+    images = product.get('images') or []
+    return {
+        'id': product.get('id'),
+        'name': product.get('name', ''),
+        'sku': product.get('sku', ''),
+        'price': _as_float(product.get('price')),
+        'regular_price': _as_float(product.get('regular_price')),
+        'sale_price': _as_float(product.get('sale_price')),
+        'stock_quantity': product.get('stock_quantity') if manage_stock else None,
+        'manage_stock': manage_stock,
+        'in_stock': stock_status == 'instock',
+        'stock_status': stock_status,
+        'image': images[0].get('src') if images else None,
+        'type': product.get('type', 'simple'),
+        'categories': [category.get('name', '') for category in product.get('categories') or []],
+        'short_description': product.get('short_description', ''),
+        'weight': product.get('weight', ''),
+        'dimensions': product.get('dimensions', {}),
+        'shipping_required': product.get('shipping_required', True),
+        'virtual': product.get('virtual', False),
+        'downloadable': product.get('downloadable', False)
+    }
+
+
+class ProductIndex:
+    """
+    Índice en memoria (por worker) de los productos publicados.
+
+    - SKU exacto en un diccionario y SKUs ordenados para buscar por prefijo.
+    - Vocabulario ordenado de las palabras del nombre (sin acentos) para buscar
+      por prefijo con bisect, y trigramas de cada palabra para las búsquedas
+      aproximadas ("eleggua" -> "Eleguá").
+    - Las altas, cambios y bajas se aplican en sitio, sin reconstruir.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.meta = {}
+        self.skus = {}
+        self.sku_list = []
+        self.postings = {}
+        self.vocabulary = []
+        self.gram_tokens = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def upsert(self, product):
+        """
+        Añade o actualiza un producto; los que no están publicados se quitan.
+        """
+        product_id = product.get('id')
+        if not product_id:
+            return
+        self.remove(product_id)
+        if product.get('status', 'publish') != 'publish':
+            return
+
+        name = fold(product.get('name'))
+        sku = fold(product.get('sku')).strip()
+        tokens = set(tokenize(name))
+        self.docs[product_id] = product_summary(product)
+        self.meta[product_id] = {
+            'name': name,
+            'sku': sku,
+            'tokens': tokens,
+            'categories': {category.get('id') for category in product.get('categories') or []},
+            'modified': product.get('date_modified_gmt') or ''
+        }
+        if sku:
+            self.skus.setdefault(sku, set()).add(product_id)
+            if len(self.skus[sku]) == 1:
+                bisect.insort(self.sku_list, sku)
+        for token in tokens:
+            ids = self.postings.setdefault(token, set())
+            if not ids:
+                bisect.insort(self.vocabulary, token)
+                for gram in trigrams(token):
+                    self.gram_tokens.setdefault(gram, set()).add(token)
+            ids.add(product_id)
+
+    def remove(self, product_id):
+        meta = self.meta.pop(product_id, None)
+        self.docs.pop(product_id, None)
+        if meta is None:
+            return
+        if meta['sku']:
+            ids = self.skus[meta['sku']]
+            ids.discard(product_id)
+            if not ids:
+                del self.skus[meta['sku']]
+                del self.sku_list[bisect.bisect_left(self.sku_list, meta['sku'])]
+        for token in meta['tokens']:
+            ids = self.postings[token]
+            ids.discard(product_id)
+            if not ids:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                for gram in trigrams(token):
+                    self.gram_tokens[gram].discard(token)
+                    if not self.gram_tokens[gram]:
+                        del self.gram_tokens[gram]
+
+    def modified(self, product_id):
+        meta = self.meta.get(product_id)
+        return meta['modified'] if meta else None
+
+    @staticmethod
+    def _prefixed(sorted_values, prefix):
+        start = bisect.bisect_left(sorted_values, prefix)
+        end = bisect.bisect_left(sorted_values, prefix + '\U0010ffff', start)
+        return sorted_values[start:end]
+
+    def _token_matches(self, token):
+        """
+        Productos que contienen `token` con su puntuación: palabra exacta 1.0,
+        prefijo 0.8 y aproximada hasta 0.6 según la similitud.
+        """
+        scores = {}
+
+        def add(ids, score):
+            for product_id in ids:
+                if scores.get(product_id, 0) < score:
+                    scores[product_id] = score
+
+        for word in self._prefixed(self.vocabulary, token):
+            add(self.postings[word], 1.0 if word == token else 0.8)
+
+        if len(token) >= 3:
+            query_grams = trigrams(token)
+            shared = {}
+            for gram in query_grams:
+                for word in self.gram_tokens.get(gram, ()):
+                    shared[word] = shared.get(word, 0) + 1
+            for word, common in shared.items():
+                similarity = 2 * common / (len(query_grams) + len(trigrams(word)))
+                if similarity >= FUZZY_THRESHOLD:
+                    add(self.postings[word], 0.6 * similarity)
+        return scores
+
+    def search(self, query, limit=10, category_ids=None, in_stock=False):
+        """
+        Devuelve hasta `limit` resúmenes de producto ordenados por relevancia.
+
+        El SKU exacto va primero, después los SKUs que empiezan por la consulta y
+        después los nombres que contienen todas las palabras (por prefijo o
+        aproximadas); un nombre que empieza por la consulta puntúa más.
+        """
+        folded = fold(query).strip()
+        if not folded:
+            return []
+        scores = {}
+
+        for product_id in self.skus.get(folded, ()):
+            scores[product_id] = 100.0
+        if len(folded) >= 2:
+            for sku in self._prefixed(self.sku_list, folded):
+                for product_id in self.skus[sku]:
+                    scores.setdefault(product_id, 50.0)
+
+        tokens = tokenize(folded)
+        if tokens:
+            matched = None
+            for token in tokens:
+                token_scores = self._token_matches(token)
+                if matched is None:
+                    matched = token_scores
+                else:
+                    matched = {
+                        product_id: score + token_scores[product_id]
+                        for product_id, score in matched.items() if product_id in token_scores
+                    }
+                if not matched:
+                    break
+            for product_id, score in (matched or {}).items():
+                if self.meta[product_id]['name'].startswith(folded):
+                    score += 0.5
+                scores[product_id] = max(scores.get(product_id, 0), score)
+
+        results = []
+        for product_id, score in scores.items():
+            doc = self.docs[product_id]
+            if in_stock and not doc['in_stock']:
+                continue
+            if category_ids and not (self.meta[product_id]['categories'] & category_ids):
+                continue
+            name = self.meta[product_id]['name']
+            # A igual puntuación, en stock primero y el nombre más corto (más específico)
+            results.append((-score, not doc['in_stock'], len(name), name, product_id))
+        return [self.docs[product_id] for *_, product_id in heapq.nsmallest(limit, results)]
+
+
+class ProductChangeLog:
+    """
+    Registro compartido (DATA_DIR/product_index.db) de los productos creados,
+    modificados o borrados por las rutas del panel y los webhooks. Cada worker
+    aplica a su índice los cambios posteriores al último que vio.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def record(self, products=(), deleted_ids=()):
+        now = utc_now_iso()
+        rows = [(product['id'], json.dumps(product), now) for product in products if product.get('id')]
+        rows += [(product_id, None, now) for product_id in deleted_ids]
+        if not rows:
+            return
+        with self.transaction() as conn:
+            conn.executemany("INSERT INTO product_changes (product_id, data, created_at) VALUES (?, ?, ?)", rows)
+
+    def last_seq(self):
+        row = self.connection().execute("SELECT MAX(seq) AS seq FROM product_changes").fetchone()
+        return row['seq'] or 0
+
+    def since(self, seq):
+        return self.connection().execute(
+            "SELECT seq, product_id, data FROM product_changes WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+
+    def prune(self, max_age_seconds):
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)).isoformat()
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM product_changes WHERE created_at < ?", (cutoff,))
+
+
+def get_product_change_log():
+    global _log
+
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = ProductChangeLog(os.path.join(Config.DATA_DIR, 'product_index.db'))
+    return _log
+
+
+class ProductSearch:
+    """
+    Índice del worker más su estado: se construye en segundo plano con todas las
+    páginas de productos publicados, se reconstruye cada
+    PRODUCT_INDEX_REFRESH_INTERVAL segundos (cambios de stock por pedidos,
+    ediciones en wp-admin sin webhook) y entre medias aplica el registro de cambios.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.applied_seq = 0
+        self.built_at = None
+        self.last_error = None
+        self.failed_at = None
+        self._building = False
+        self._lock = threading.Lock()
+
+    def _apply(self, index, rows):
+        for row in rows:
+            if row['data'] is None:
+                index.remove(row['product_id'])
+                continue
+            product = json.loads(row['data'])
+            # Una reconstrucción puede haber traído ya una versión más reciente
+            current = index.modified(row['product_id'])
+            if current and product.get('date_modified_gmt') and product['date_modified_gmt'] < current:
+                continue
+            index.upsert(product)
+
+    def _build(self):
+        try:
+            log = get_product_change_log()
+            seq = log.last_seq()
+            products = fetch_all_pages(get_wc_api(), "products", {"status": "publish", "_fields": INDEX_FIELDS})
+            index = ProductIndex()
+            for product in products:
+                index.upsert(product)
+            rows = log.since(seq)
+            self._apply(index, rows)
+            with self._lock:
+                self.index = index
+                self.applied_seq = rows[-1]['seq'] if rows else seq
+                self.built_at = time.monotonic()
+                self.last_error = None
+                self.failed_at = None
+            log.prune(Config.PRODUCT_INDEX_REFRESH_INTERVAL * CHANGE_RETENTION_FACTOR)
+            logger.info(f"Product index built with {len(index)} products")
+        except Exception as e:
+            logger.error(f"Could not build product index: {e}")
+            with self._lock:
+                self.last_error = str(e)
+                # Se reintenta pasado el intervalo de refresco o, sin índice, BUILD_RETRY_SECONDS
+                if self.index is not None:
+                    self.built_at = time.monotonic()
+                else:
+                    self.failed_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _start_build(self):
+        if self._building:
+            return
+        self._building = True
+        # Hilo propio: fetch_all_pages usa el pool de fanout y no puede esperar dentro de él
+        threading.Thread(target=self._build, name='product-index-build', daemon=True).start()
+
+    def ready(self):
+        """
+        Devuelve True si el índice puede responder. La primera llamada lanza la
+        construcción en segundo plano; después se aplican los cambios pendientes y
+        se programa la reconstrucción periódica.
+        """
+        with self._lock:
+            if self.index is None:
+                if self.failed_at is None or time.monotonic() - self.failed_at > BUILD_RETRY_SECONDS:
+                    self._start_build()
+                return False
+            if time.monotonic() - self.built_at > Config.PRODUCT_INDEX_REFRESH_INTERVAL:
+                self._start_build()
+            rows = get_product_change_log().since(self.applied_seq)
+            if rows:
+                self._apply(self.index, rows)
+                self.applied_seq = rows[-1]['seq']
+        return True
+
+    def search(self, query, limit=10, category_ids=None, in_stock=False):
+        with self._lock:
+            return self.index.search(query, limit, category_ids, in_stock)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.index is not None,
+                'products': len(self.index) if self.index is not None else 0,
+                'building': self._building,
+                'age_seconds': round(time.monotonic() - self.built_at) if self.built_at else None,
+                'applied_seq': self.applied_seq,
+                'last_error': self.last_error
+            }
+
+
+def get_product_search():
+    """
+    Devuelve el índice de búsqueda del proceso, o None si PRODUCT_INDEX_ENABLED es False.
+    """
+    global _index
+
+    if not Config.PRODUCT_INDEX_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ProductSearch()
+    return _index
+
+
+def record_product_changes(products=(), deleted_ids=()):
+    """
+    Anota productos escritos o borrados para que todos los workers actualicen su
+    índice. Los errores se registran y no hacen fallar la escritura (la
+    reconstrucción periódica los recoge).
+    """
+    if not Config.PRODUCT_INDEX_ENABLED:
+        return
+    products = [product for product in products if isinstance(product, dict) and product.get('id')]
+    try:
+        get_product_change_log().record(products, deleted_ids)
+    except Exception as e:
+        logger.error(f"Could not record product changes: {e}")
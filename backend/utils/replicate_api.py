@@ -0,0 +1,95 @@
+import logging
+import time
+
+import requests
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('succeeded', 'failed', 'canceled')
+
+
+def _headers():
+    if not Config.REPLICATE_API_TOKEN:
+        raise ValueError("API key de Replicate no configurada")
+    return {
+        'Authorization': f'Token {Config.REPLICATE_API_TOKEN}',
+        'Content-Type': 'application/json'
+    }
+
+
+def create_prediction(version, model_input):
+    """
+    Inicia una predicción en Replicate y devuelve su JSON (status 'starting').
+    """
+    response = requests.post(
+        f"{Config.REPLICATE_API_URL}/predictions",
+        headers=_headers(),
+        json={'version': version, 'input': model_input},
+        timeout=(5, 30)
+    )
+    if response.status_code != 201:
+        raise RuntimeError(f"Replicate returned {response.status_code}: {response.text[:200]}")
+    return response.json()
+
+
+def get_prediction(prediction_id):
+    response = requests.get(
+        f"{Config.REPLICATE_API_URL}/predictions/{prediction_id}",
+        headers=_headers(),
+        timeout=(5, 30)
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def cancel_prediction(prediction_id):
+    try:
+        requests.post(
+            f"{Config.REPLICATE_API_URL}/predictions/{prediction_id}/cancel",
+            headers=_headers(),
+            timeout=(5, 30)
+        )
+    except requests.RequestException as e:
+        logger.warning(f"Could not cancel Replicate prediction {prediction_id}: {e}")
+
+
+def wait_for_prediction(prediction_id, on_poll=None):
+    """
+    Sondea una predicción hasta que termina, con espera exponencial entre
+    consultas (REPLICATE_POLL_INITIAL, x2, hasta REPLICATE_POLL_MAX).
+
+    `on_poll(prediction)` se llama tras cada consulta; si lanza una excepción
+    (p. ej. al cancelar el trabajo) la predicción se cancela en Replicate.
+    Lanza TimeoutError si no termina en REPLICATE_TIMEOUT segundos.
+    """
+    deadline = time.monotonic() + Config.REPLICATE_TIMEOUT
+    delay = Config.REPLICATE_POLL_INITIAL
+    while True:
+        prediction = get_prediction(prediction_id)
+        try:
+            if on_poll is not None:
+                on_poll(prediction)
+        except Exception:
+            if prediction.get('status') not in TERMINAL_STATUSES:
+                cancel_prediction(prediction_id)
+            raise
+        if prediction.get('status') in TERMINAL_STATUSES:
+            return prediction
+        if time.monotonic() + delay > deadline:
+            cancel_prediction(prediction_id)
+            raise TimeoutError(f"Replicate prediction {prediction_id} did not finish in {Config.REPLICATE_TIMEOUT}s")
+        time.sleep(delay)
+        delay = min(delay * 2, Config.REPLICATE_POLL_MAX)
+
+
+def download_output(url, path):
+    """
+    Descarga el resultado de una predicción a `path` sin cargarlo entero en memoria.
+    """
+    with requests.get(url, stream=True, timeout=(5, 60)) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
@@ -0,0 +1,240 @@
+import unicodedata
+
+
+def fold(text):
+    """
+    Texto en minúsculas y sin acentos ("Oshún" -> "oshun") para comparar.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """
+    Palabras de un texto ya normalizado; los signos separan palabras.
+    """
+    return ''.join(c if c.isalnum() else ' ' for c in text).split()
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_grams(word):
+    """
+    Trigramas de una palabra con dos espacios delante: los interiores sirven para
+    buscar subcadenas y los dos primeros para prefijos de una o dos letras.
+    """
+    padded = f"  {word}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def query_grams(token):
+    """
+    Trigramas que debe tener una palabra indexada con word_grams() para contener
+    `token`: sus trigramas si tiene tres letras o más, o el de prefijo si es más corto.
+    """
+    if len(token) >= 3:
+        return {token[i:i + 3] for i in range(len(token) - 2)}
+    return {f"  {token}"[-3:]}
+
+
+def word_start_gram(token):
+    """
+    Trigrama con el que word_grams() marca las palabras que empiezan por `token`.
+    """
+    return f"  {token}"[1:4] if len(token) >= 2 else f"  {token}"
+
+
+def digits(text):
+    return ''.join(c for c in text or '' if c.isdigit())
+
+
+# Separadores que se ignoran en una palabra de la consulta que parece un teléfono
+PHONE_SEPARATORS = ' -().+/'
+
+
+def query_tokens(query):
+    """
+    Palabras normalizadas de una consulta; "55-1234-5678" o "(55)" se buscan como dígitos.
+    """
+    tokens = []
+    for token in fold(query).split():
+        if any(c.isdigit() for c in token) and all(c.isdigit() or c in PHONE_SEPARATORS for c in token):
+            token = digits(token)
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def match_score(tokens, search_text):
+    """
+    Palabra exacta 3, prefijo de palabra 2, subcadena (desde tres letras) 1; None
+    si falta alguna palabra.
+    """
+    words = search_text.split()
+    score = 0
+    for token in tokens:
+        if token in words:
+            score += 3
+        elif any(word.startswith(token) for word in words):
+            score += 2
+        elif len(token) >= 3 and token in search_text:
+            score += 1
+        else:
+            return None
+    return score
+
+
+class GramIndex:
+    """
+    Índice invertido de trigramas en SQLite: <name>_grams (trigrama, clave) y
+    <name>_gram_counts (en cuántas claves aparece cada trigrama).
+
+    Las funciones reciben la conexión para trabajar dentro de la transacción de
+    quien guarda los datos indexados. `text_table` y `text_key` indican dónde
+    guarda el texto de cada clave (columna search_text).
+    """
+
+    def __init__(self, name, text_table, text_key, key_type='TEXT', checked_grams=2):
+        self.text_table = text_table
+        self.text_key = text_key
+        self.grams_table = f"{name}_grams"
+        self.counts_table = f"{name}_gram_counts"
+        self.checked_grams = checked_grams
+        self.schema = f"""
+CREATE TABLE IF NOT EXISTS {self.grams_table} (
+    gram TEXT NOT NULL,
+    key {key_type} NOT NULL,
+    PRIMARY KEY (gram, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS {self.counts_table} (
+    gram TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+    @staticmethod
+    def grams(search_text):
+        grams = set()
+        for word in (search_text or '').split():
+            grams |= word_grams(word)
+        return grams
+
+    def update(self, conn, key, old_text, new_text):
+        """
+        Pasa los trigramas de `key` de old_text a new_text (None para alta o baja).
+        """
+        old_grams = self.grams(old_text)
+        new_grams = self.grams(new_text)
+        removed = old_grams - new_grams
+        added = new_grams - old_grams
+        conn.executemany(f"DELETE FROM {self.grams_table} WHERE gram = ? AND key = ?", [(g, key) for g in removed])
+        conn.executemany(f"UPDATE {self.counts_table} SET df = df - 1 WHERE gram = ?", [(g,) for g in removed])
+        conn.executemany(f"INSERT OR IGNORE INTO {self.grams_table} (gram, key) VALUES (?, ?)", [(g, key) for g in added])
+        conn.executemany(
+            f"INSERT INTO {self.counts_table} (gram, df) VALUES (?, 1) ON CONFLICT(gram) DO UPDATE SET df = df + 1",
+            [(g,) for g in added]
+        )
+        if removed:
+            conn.execute(f"DELETE FROM {self.counts_table} WHERE df <= 0")
+
+    def insert_many(self, conn, entries):
+        """
+        Añade los trigramas de [(clave, texto)] sin tocar las frecuencias; para
+        reconstrucciones, que terminan con recount().
+        """
+        rows = sorted((gram, key) for key, text in entries for gram in self.grams(text))
+        conn.executemany(f"INSERT OR IGNORE INTO {self.grams_table} (gram, key) VALUES (?, ?)", rows)
+
+    def recount(self, conn):
+        conn.execute(f"DELETE FROM {self.counts_table}")
+        conn.execute(
+            f"INSERT INTO {self.counts_table} (gram, df) SELECT gram, COUNT(*) FROM {self.grams_table} GROUP BY gram"
+        )
+
+    def clear(self, conn):
+        conn.execute(f"DELETE FROM {self.grams_table}")
+        conn.execute(f"DELETE FROM {self.counts_table}")
+
+    def candidates(self, conn, tokens, newest_first=False, word_start=False):
+        """
+        Subconsulta SQL (con sus argumentos) de las claves que tienen los trigramas
+        de todas las palabras, o None si alguno no aparece en el índice. Con
+        word_start=True sólo las que tienen una palabra que empieza como cada
+        palabra de la consulta (se comprueba sobre el texto guardado).
+
+        Se recorre el trigrama menos frecuente y se comprueban por clave primaria
+        el menos frecuente de cada palabra (y el de inicio de palabra) y
+        `checked_grams` más; el resto lo verifica match_score(). La subconsulta
+        termina en "LIMIT ?" para que quien la usa fije el máximo de candidatos.
+        """
+        start_grams = {word_start_gram(token) for token in tokens} if word_start else set()
+        grams_by_token = [query_grams(token) for token in tokens]
+        grams = set().union(*grams_by_token) | start_grams
+        if word_start:
+            token_grams_all = [token_grams | {word_start_gram(token)} for token, token_grams in zip(tokens, grams_by_token)]
+        else:
+            token_grams_all = grams_by_token
+        placeholders = ','.join('?' * len(grams))
+        counts = {
+            row[0]: row[1]
+            for row in conn.execute(f"SELECT gram, df FROM {self.counts_table} WHERE gram IN ({placeholders})", list(grams))
+        }
+        if len(counts) < len(grams):
+            return None
+
+        checked = {min(token_grams, key=counts.get) for token_grams in grams_by_token} | start_grams
+        checked = sorted(checked, key=counts.get)
+        for gram in sorted(grams, key=counts.get):
+            if len(checked) >= len(tokens) + self.checked_grams:
+                break
+            if gram not in checked:
+                checked.append(gram)
+        rarest, *others = checked
+        # Primero los trigramas de las otras palabras: los de la palabra del recorrido casi siempre están
+        walked = [token_grams for token_grams in token_grams_all if rarest in token_grams]
+        others.sort(key=lambda gram: any(gram in token_grams for token_grams in walked))
+        conditions = ''.join(
+            f" AND EXISTS (SELECT 1 FROM {self.grams_table} o WHERE o.gram = ? AND o.key = g.key)" for _ in others
+        )
+        args = [rarest, *others]
+        if word_start:
+            conditions += (
+                f" AND EXISTS (SELECT 1 FROM {self.text_table} t WHERE t.{self.text_key} = g.key"
+                + " AND instr(' ' || t.search_text, ?) > 0" * len(tokens) + ")"
+            )
+            args += [f" {token}" for token in tokens]
+        order = " ORDER BY g.key DESC" if newest_first else ""
+        return f"SELECT g.key FROM {self.grams_table} g WHERE g.gram = ?{conditions}{order} LIMIT ?", args
+
+    def ranked_candidates(self, conn, tokens, limit, newest_first=False):
+        """
+        Hasta `limit` claves para puntuar con match_score(). Si hay más coincidencias
+        que `limit`, primero van las que tienen cada palabra de la consulta como
+        palabra o inicio de palabra (exactas y de prefijo) y, en el hueco que quede,
+        las que sólo la contienen. Así una consulta amplia ("ana") no pierde las
+        mejores coincidencias entre las de subcadena ("mariana").
+        """
+        candidates = self.candidates(conn, tokens, newest_first)
+        if candidates is None:
+            return []
+        sql, args = candidates
+        keys = [row[0] for row in conn.execute(sql, [*args, limit])]
+        if len(keys) < limit:
+            # Están todas las coincidencias
+            return keys
+        texts = conn.execute(
+            f"SELECT search_text FROM {self.text_table} WHERE {self.text_key} IN ({','.join('?' * len(keys))})", keys
+        )
+        if all(all(f" {token}" in f" {row[0]}" for token in tokens) for row in texts):
+            # Ya son todas exactas o de prefijo: no hay nada mejor que buscar
+            return keys
+
+        sql, args = self.candidates(conn, tokens, newest_first, word_start=True) or (None, None)
+        ranked = [row[0] for row in conn.execute(sql, [*args, limit])] if sql else []
+        seen = set(ranked)
+        ranked += [key for key in keys if key not in seen]
+        return ranked[:limit]
@@ -0,0 +1,55 @@
+import logging
+
+from config import Config
+from utils.fanout import map_bounded
+
+logger = logging.getLogger(__name__)
+
+# Máximo de elementos que WooCommerce acepta por petición a /batch
+BATCH_SIZE = 100
+
+
+def _error_message(error):
+    if isinstance(error, dict):
+        return error.get('message') or error.get('code') or str(error)
+    return str(error)
+
+
+def run_batch(wc_api, endpoint, action, items, concurrency=None):
+    """
+    Envía `items` al endpoint /batch de WooCommerce (p. ej. "products/batch") en
+    lotes de hasta BATCH_SIZE, con varios lotes en paralelo.
+
+    `action` es 'create', 'update' o 'delete' (para 'delete' los elementos son IDs;
+    WooCommerce los borra de forma permanente). Devuelve una lista alineada con
+    `items` de tuplas (objeto, error): si un lote falla entero, todos sus
+    elementos llevan ese error.
+    """
+    concurrency = concurrency or Config.WC_BATCH_CONCURRENCY
+    chunks = [items[start:start + BATCH_SIZE] for start in range(0, len(items), BATCH_SIZE)]
+
+    def send(chunk):
+        response = wc_api.post(
+            endpoint,
+            {action: chunk},
+            timeout=(Config.WC_CONNECT_TIMEOUT, Config.WC_BATCH_TIMEOUT)
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Status code: {response.status_code}")
+        entries = response.json().get(action, [])
+        if len(entries) != len(chunk):
+            raise RuntimeError(f"Unexpected batch response: {len(entries)} results for {len(chunk)} items")
+        return entries
+
+    results = []
+    for chunk, (entries, error) in zip(chunks, map_bounded(send, chunks, concurrency)):
+        if error is not None:
+            logger.error(f"Batch {action} on {endpoint} failed for {len(chunk)} items: {error}")
+            results.extend((None, str(error)) for _ in chunk)
+            continue
+        for entry in entries:
+            if isinstance(entry, dict) and entry.get('error'):
+                results.append((None, _error_message(entry['error'])))
+            else:
+                results.append((entry, None))
+    return results
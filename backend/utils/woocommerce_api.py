@@ -1,16 +1,289 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from json import dumps as jsonencode
+from urllib.parse import urlencode
 from woocommerce import API
 from config import Config
 
-def get_wc_api():
+# Cliente único por proceso (cada worker de gunicorn tiene el suyo)
+_wc_api = None
+_wc_api_pid = None
+_wc_api_lock = threading.Lock()
+
+# Memo de GETs de la petición Flask en curso (ver start_request_memo); el fan-out
+# lo propaga a sus hilos copiando el contexto
+_request_memo = contextvars.ContextVar('wc_request_memo', default=None)
+_deduplicated_gets = 0
+_deduplicated_lock = threading.Lock()
+
+
+def build_pooled_session(pool_size, max_retries=0):
+    """
+    Crea una requests.Session con un pool de conexiones keep-alive del tamaño indicado.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=max_retries,
+        pool_block=False
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def session_pool_stats(session):
     """
-    Initializes and returns the WooCommerce API client.
+    Resume el uso del pool de una sesión: conexiones abiertas vs. peticiones servidas.
+
+    Cada conexión nueva atiende su primera petición; el resto son reutilizaciones.
+    """
+    connections = 0
+    pooled_requests = 0
+    hosts = 0
+    adapters = session.adapters.values() if session is not None else []
+    for adapter in {id(a): a for a in adapters}.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts += 1
+            connections += pool.num_connections
+            pooled_requests += pool.num_requests
+
+    reused = max(pooled_requests - connections, 0)
+    return {
+        'hosts': hosts,
+        'connections_opened': connections,
+        'requests': pooled_requests,
+        'reused_connections': reused,
+        'reuse_rate': round(reused / pooled_requests, 4) if pooled_requests else 0.0
+    }
+
+
+class RequestMemo:
+    """
+    GETs a WooCommerce hechos durante una petición Flask.
+
+    Dos GET con el mismo endpoint y parámetros comparten una sola llamada, también
+    si se hacen a la vez desde hilos distintos. Los errores no se guardan, y
+    cualquier escritura vacía el memo para no devolver datos anteriores a ella.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.hits = 0
+
+    def get(self, key, fetch):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                response = fetch()
+                # Leer el cuerpo ya: la respuesta puede usarse desde varios hilos
+                response.content
+                future.set_result(response)
+            except Exception as e:
+                with self._lock:
+                    self._futures.pop(key, None)
+                future.set_exception(e)
+        return future.result()
+
+    def clear(self):
+        with self._lock:
+            self._futures.clear()
+
+
+def start_request_memo():
+    """
+    Activa el memo de GETs para la petición en curso (before_request).
+    """
+    _request_memo.set(RequestMemo())
+
+
+def end_request_memo(exc=None):
+    """
+    Descarta el memo de la petición (teardown_request).
+    """
+    global _deduplicated_gets
+
+    memo = _request_memo.get()
+    if memo is not None and memo.hits:
+        with _deduplicated_lock:
+            _deduplicated_gets += memo.hits
+    _request_memo.set(None)
+
+
+def _memo_key(endpoint, kwargs):
+    # Sólo se comparten GET que difieren como mucho en el timeout
+    if not set(kwargs) <= {'params', 'timeout'}:
+        return None
+    return endpoint, jsonencode(kwargs.get('params') or {}, sort_keys=True, default=str)
+
+
+class PooledWooCommerceAPI(API):
+    """
+    Cliente de WooCommerce que reutiliza conexiones a través de una requests.Session.
+
+    La librería oficial usa `requests.request` a nivel de módulo, lo que abre una
+    conexión TCP+TLS nueva por llamada. Esta subclase mantiene la misma interfaz
+    (get/post/put/delete/options) pero envía todo por una sesión compartida.
     """
+
+    def __init__(self, url, consumer_key, consumer_secret, session=None, **kwargs):
+        super().__init__(url, consumer_key, consumer_secret, **kwargs)
+        self.session = session or build_pooled_session(Config.WC_POOL_SIZE)
+
+    def _API__request(self, method, endpoint, data, params=None, **kwargs):
+        """
+        Igual que API.__request, pero usando la sesión con pool de conexiones.
+        """
+        if params is None:
+            params = {}
+        url = self._API__get_url(endpoint)
+        auth = None
+        headers = {
+            "user-agent": f"{self.user_agent}",
+            "accept": "application/json"
+        }
+
+        if self.is_ssl is True and self.query_string_auth is False:
+            auth = HTTPBasicAuth(self.consumer_key, self.consumer_secret)
+        elif self.is_ssl is True and self.query_string_auth is True:
+            params.update({
+                "consumer_key": self.consumer_key,
+                "consumer_secret": self.consumer_secret
+            })
+        else:
+            encoded_params = urlencode(params)
+            url = f"{url}?{encoded_params}"
+            url = self._API__get_oauth_url(url, method, **kwargs)
+
+        if data is not None:
+            data = jsonencode(data, ensure_ascii=False).encode('utf-8')
+            headers["content-type"] = "application/json;charset=utf-8"
+
+        kwargs.pop("oauth_timestamp", None)
+        kwargs.setdefault("timeout", self.timeout)
+
+        return self.session.request(
+            method=method,
+            url=url,
+            verify=self.verify_ssl,
+            auth=auth,
+            params=params,
+            data=data,
+            headers=headers,
+            **kwargs
+        )
+
+    def get(self, endpoint, **kwargs):
+        memo = _request_memo.get()
+        key = _memo_key(endpoint, kwargs) if memo is not None else None
+        if key is None:
+            return super().get(endpoint, **kwargs)
+        return memo.get(key, lambda: API.get(self, endpoint, **kwargs))
+
+    def post(self, endpoint, data, **kwargs):
+        self._forget_gets()
+        return super().post(endpoint, data, **kwargs)
+
+    def put(self, endpoint, data, **kwargs):
+        self._forget_gets()
+        return super().put(endpoint, data, **kwargs)
+
+    def delete(self, endpoint, **kwargs):
+        self._forget_gets()
+        return super().delete(endpoint, **kwargs)
+
+    @staticmethod
+    def _forget_gets():
+        memo = _request_memo.get()
+        if memo is not None:
+            memo.clear()
+
+    def close(self):
+        """
+        Cierra todas las conexiones del pool.
+        """
+        self.session.close()
+
+
+def _create_wc_api():
     if not all([Config.WC_STORE_URL, Config.WC_CONSUMER_KEY, Config.WC_CONSUMER_SECRET]):
         raise ValueError("WooCommerce API credentials are not fully configured.")
 
-    return API(
+    return PooledWooCommerceAPI(
         url=Config.WC_STORE_URL,
         consumer_key=Config.WC_CONSUMER_KEY,
         consumer_secret=Config.WC_CONSUMER_SECRET,
-        version="wc/v3"
-    ) 
\ No newline at end of file
+        version="wc/v3",
+        timeout=(Config.WC_CONNECT_TIMEOUT, Config.WC_READ_TIMEOUT)
+    )
+
+
+def get_wc_api():
+    """
+    Returns the process-wide WooCommerce API client.
+
+    The client is created lazily on first use and shared by every blueprint, so
+    connections to the store are kept alive and reused between requests. If the
+    process has been forked since the client was built, a fresh one is created.
+    """
+    global _wc_api, _wc_api_pid
+
+    pid = os.getpid()
+    if _wc_api is not None and _wc_api_pid == pid:
+        return _wc_api
+
+    with _wc_api_lock:
+        if _wc_api is None or _wc_api_pid != pid:
+            _wc_api = _create_wc_api()
+            _wc_api_pid = pid
+    return _wc_api
+
+
+def get_wc_api_stats():
+    """
+    Estadísticas del pool de conexiones del cliente de WooCommerce de este proceso
+    y GETs ahorrados por el memo de cada petición.
+    """
+    if _wc_api is None or _wc_api_pid != os.getpid():
+        stats = session_pool_stats(None)
+    else:
+        stats = session_pool_stats(_wc_api.session)
+    stats['deduplicated_gets'] = _deduplicated_gets
+    return stats
+
+
+def reset_wc_api():
+    """
+    Descarta el cliente actual para que el siguiente get_wc_api() cree uno nuevo.
+
+    Se llama tras un fork (hook post_fork de gunicorn) para que los workers no
+    compartan sockets heredados del proceso maestro.
+    """
+    global _wc_api, _wc_api_pid, _wc_api_lock
+
+    # El lock puede haberse heredado bloqueado de otro hilo del proceso padre
+    _wc_api_lock = threading.Lock()
+    _wc_api = None
+    _wc_api_pid = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_wc_api)
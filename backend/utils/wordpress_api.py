@@ -1,80 +1,224 @@
+import os
+import random
+import threading
+import time
 import requests
 import base64
 from config import Config
+from utils.woocommerce_api import build_pooled_session, session_pool_stats
+
+# Sesión compartida por todas las instancias de WordPressAPI del proceso
+_wp_session = None
+_wp_session_pid = None
+_wp_session_lock = threading.Lock()
+
+# Contadores de reintentos (por proceso)
+_wp_stats = {
+    'requests': 0,
+    'retries': 0,
+    'retries_exhausted': 0
+}
+_wp_stats_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _wp_stats_lock:
+        _wp_stats[name] += amount
+
+
+def get_wp_session():
+    """
+    Devuelve la requests.Session con pool de conexiones compartida por el proceso.
+    """
+    global _wp_session, _wp_session_pid
+
+    pid = os.getpid()
+    if _wp_session is not None and _wp_session_pid == pid:
+        return _wp_session
+
+    with _wp_session_lock:
+        if _wp_session is None or _wp_session_pid != pid:
+            _wp_session = build_pooled_session(Config.WP_POOL_SIZE)
+            _wp_session_pid = pid
+    return _wp_session
+
+
+def get_wp_api_stats():
+    """
+    Contadores de peticiones, reintentos y reutilización de conexiones hacia WordPress.
+    """
+    with _wp_stats_lock:
+        stats = dict(_wp_stats)
+    session = _wp_session if _wp_session_pid == os.getpid() else None
+    stats['pool'] = session_pool_stats(session)
+    return stats
+
+
+def reset_wp_session():
+    """
+    Descarta la sesión y los contadores heredados tras un fork.
+    """
+    global _wp_session, _wp_session_pid, _wp_session_lock, _wp_stats_lock
+
+    _wp_session_lock = threading.Lock()
+    _wp_stats_lock = threading.Lock()
+    _wp_session = None
+    _wp_session_pid = None
+    for key in _wp_stats:
+        _wp_stats[key] = 0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_wp_session)
+
 
 class WordPressAPI:
     """
     WordPress REST API client for blog functionality.
+
+    Todas las peticiones pasan por una sesión compartida con keep-alive, tienen
+    timeout por verbo y los verbos idempotentes se reintentan con backoff exponencial
+    con jitter ante errores de conexión y respuestas 429/502/503/504.
     """
-    
-    def __init__(self):
+
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+    RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+    def __init__(self, session=None):
         if not all([Config.WC_STORE_URL, Config.WP_USER_LOGIN, Config.WP_APPLICATION_PASSWORD]):
             raise ValueError("WordPress API credentials are not fully configured.")
-        
+
         # Extraer la URL base de WordPress desde WC_STORE_URL
         # WC_STORE_URL puede ser https://sitio.com/wp-json/wc/v3/ o https://sitio.com
         if '/wp-json/wc/v3' in Config.WC_STORE_URL:
             self.base_url = Config.WC_STORE_URL.split('/wp-json/wc/v3')[0]
         else:
             self.base_url = Config.WC_STORE_URL.rstrip('/')
-        
+
         self.api_url = f"{self.base_url}/wp-json/wp/v2"
-        
+        self.session = session or get_wp_session()
+
         # Crear credenciales de autenticación básica
         credentials = f"{Config.WP_USER_LOGIN}:{Config.WP_APPLICATION_PASSWORD}"
         self.auth_header = base64.b64encode(credentials.encode()).decode()
-        
+
         self.headers = {
             'Authorization': f'Basic {self.auth_header}',
             'Content-Type': 'application/json'
         }
-    
+
+        # Timeouts (conexión, lectura) por verbo
+        self.timeouts = {
+            'GET': (Config.WP_CONNECT_TIMEOUT, Config.WP_READ_TIMEOUT),
+            'POST': (Config.WP_CONNECT_TIMEOUT, Config.WP_WRITE_TIMEOUT),
+            'PUT': (Config.WP_CONNECT_TIMEOUT, Config.WP_WRITE_TIMEOUT),
+            'DELETE': (Config.WP_CONNECT_TIMEOUT, Config.WP_WRITE_TIMEOUT),
+            'UPLOAD': (Config.WP_CONNECT_TIMEOUT, Config.WP_UPLOAD_TIMEOUT)
+        }
+
+    def _backoff(self, attempt, response=None):
+        """
+        Espera antes del siguiente intento: full jitter sobre un backoff exponencial,
+        respetando Retry-After si WordPress lo envía.
+        """
+        delay = random.uniform(0, min(Config.WP_RETRY_MAX_DELAY, Config.WP_RETRY_BASE_DELAY * (2 ** attempt)))
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = min(float(retry_after), Config.WP_RETRY_MAX_DELAY)
+        time.sleep(delay)
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """
+        Envía una petición por la sesión compartida aplicando timeouts y reintentos.
+
+        Sólo los verbos idempotentes se reintentan ante errores o respuestas
+        transitorias; un POST únicamente se reintenta si la conexión no llegó a
+        establecerse, porque en ese caso WordPress nunca recibió la petición.
+        """
+        method = method.upper()
+        timeout = timeout or self.timeouts.get(method, self.timeouts['GET'])
+        idempotent = method in self.IDEMPOTENT_METHODS
+        attempts = Config.WP_MAX_RETRIES + 1
+
+        for attempt in range(attempts):
+            last_attempt = attempt + 1 >= attempts
+            _count('requests')
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                if last_attempt:
+                    _count('retries_exhausted')
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not idempotent:
+                    raise
+                if last_attempt:
+                    _count('retries_exhausted')
+                    raise
+            else:
+                if not idempotent or response.status_code not in self.RETRY_STATUS_CODES:
+                    return response
+                if last_attempt:
+                    _count('retries_exhausted')
+                    return response
+                response.close()
+                _count('retries')
+                self._backoff(attempt, response)
+                continue
+
+            _count('retries')
+            self._backoff(attempt)
+
     def get(self, endpoint, params=None):
         """
         Realiza una petición GET a la API de WordPress.
         """
         url = f"{self.api_url}/{endpoint.lstrip('/')}"
-        response = requests.get(url, headers=self.headers, params=params, timeout=30)
+        response = self.request('GET', url, headers=self.headers, params=params)
         response.raise_for_status()
         return response
-    
+
     def post(self, endpoint, data=None):
         """
         Realiza una petición POST a la API de WordPress.
         """
         url = f"{self.api_url}/{endpoint.lstrip('/')}"
-        response = requests.post(url, headers=self.headers, json=data)
+        response = self.request('POST', url, headers=self.headers, json=data)
         response.raise_for_status()
         return response
-    
+
     def put(self, endpoint, data=None):
         """
         Realiza una petición PUT a la API de WordPress.
         """
         url = f"{self.api_url}/{endpoint.lstrip('/')}"
-        response = requests.put(url, headers=self.headers, json=data)
+        response = self.request('PUT', url, headers=self.headers, json=data)
         response.raise_for_status()
         return response
-    
+
     def delete(self, endpoint, params=None):
         """
         Realiza una petición DELETE a la API de WordPress.
         """
         url = f"{self.api_url}/{endpoint.lstrip('/')}"
-        response = requests.delete(url, headers=self.headers, params=params)
+        response = self.request('DELETE', url, headers=self.headers, params=params)
         response.raise_for_status()
         return response
-    
-    def upload_media(self, file_data, filename, alt_text=None):
+
+    def upload_media(self, file_data, filename, alt_text=None, content_type=None, content_length=None):
         """
         Sube un archivo de media a WordPress.
+
+        `file_data` puede ser bytes o un objeto tipo archivo; en ese caso requests
+        lo envía por bloques sin cargarlo entero en memoria.
         """
         import mimetypes
-        
+
         upload_url = f"{self.base_url}/wp-json/wp/v2/media"
-        
+
         # Determinar el tipo MIME basado en la extensión del archivo
-        content_type, _ = mimetypes.guess_type(filename)
+        content_type = content_type or mimetypes.guess_type(filename)[0]
         if not content_type:
             # Fallback para tipos de imagen comunes
             if filename.lower().endswith(('.jpg', '.jpeg')):
@@ -87,23 +231,23 @@ class WordPressAPI:
                 content_type = 'image/webp'
             else:
                 content_type = 'application/octet-stream'
-        
+
         headers = {
             'Authorization': f'Basic {self.auth_header}',
             'Content-Type': content_type,
             'Content-Disposition': f'attachment; filename="{filename}"'
         }
-        
+        if content_length is not None:
+            headers['Content-Length'] = str(content_length)
+
         if alt_text:
             headers['Content-Description'] = alt_text
-        
-        print(f"Uploading media: {filename} ({content_type})")
-        
-        response = requests.post(upload_url, headers=headers, data=file_data)
-        
+
+        response = self.request('POST', upload_url, timeout=self.timeouts['UPLOAD'], headers=headers, data=file_data)
+
         if not response.ok:
-            print(f"Error uploading media: {response.status_code} - {response.text}")
-        
+            print(f"Error uploading media {filename}: {response.status_code} - {response.text[:200]}")
+
         response.raise_for_status()
         return response
 
@@ -111,4 +255,4 @@ def get_wp_api():
     """
     Inicializa y retorna el cliente de la API de WordPress.
     """
-    return WordPressAPI() 
\ No newline at end of file
+    return WordPressAPI()
@@ -1,6 +1,7 @@
 "use client";
 
 import { useState } from "react";
+import { readEventStream } from "@/lib/sse";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
@@ -51,6 +52,7 @@ export function AIContentGenerator({ selectedIdea, onContentGenerated }: AIConte
   const [uploadingImage, setUploadingImage] = useState(false);
   const [generatedContent, setGeneratedContent] = useState<GeneratedContent | null>(null);
   const [error, setError] = useState("");
+  const [streamedChars, setStreamedChars] = useState(0);
 
   // Palabras clave sugeridas basadas en la idea seleccionada y el tema
   const getSuggestedKeywords = () => {
@@ -217,6 +219,8 @@ export function AIContentGenerator({ selectedIdea, onContentGenerated }: AIConte
 
     setLoading(true);
     setError("");
+    setGeneratedContent(null);
+    setStreamedChars(0);
 
     try {
       // Construir el prompt para OpenAI
@@ -262,6 +266,7 @@ export function AIContentGenerator({ selectedIdea, onContentGenerated }: AIConte
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
+          stream: true,
           prompt,
           selectedIdea: topicToUse,
           additionalContext,
@@ -277,7 +282,24 @@ export function AIContentGenerator({ selectedIdea, onContentGenerated }: AIConte
         throw new Error('Error al generar contenido');
       }
 
-      const data = await response.json();
+      // Los campos se muestran según se completan; 'done' trae el artículo final
+      let data: any = null;
+      let streamError = "";
+      await readEventStream(response, (event, payload) => {
+        if (event === 'token') {
+          setStreamedChars(prev => prev + payload.text.length);
+        } else if (event === 'field') {
+          setGeneratedContent(prev => ({ ...(prev ?? {}), [payload.name]: payload.value } as GeneratedContent));
+        } else if (event === 'done') {
+          data = payload;
+        } else if (event === 'error') {
+          streamError = payload.error;
+        }
+      });
+
+      if (!data) {
+        throw new Error(streamError || 'La generación terminó sin resultado');
+      }
       const content = JSON.parse(data.content);
       
       setGeneratedContent(content);
@@ -598,7 +620,9 @@ export function AIContentGenerator({ selectedIdea, onContentGenerated }: AIConte
           ) : (
             <Wand2 className="h-4 w-4 mr-2" />
           )}
-          {loading ? "Generando Contenido..." : "Generar Artículo con IA"}
+          {loading
+            ? `Generando Contenido...${streamedChars > 0 ? ` (${streamedChars} caracteres)` : ""}`
+            : "Generar Artículo con IA"}
         </Button>
 
         {error && (
@@ -650,7 +674,7 @@ export function AIContentGenerator({ selectedIdea, onContentGenerated }: AIConte
             <div>
               <Label className="font-semibold">Palabras Clave:</Label>
               <div className="flex flex-wrap gap-1 mt-1">
-                {generatedContent.keywords.map((keyword, index) => (
+                {(generatedContent.keywords ?? []).map((keyword, index) => (
                   <Badge key={index} variant="outline" className="text-xs">
                     {keyword}
                   </Badge>
@@ -662,11 +686,11 @@ export function AIContentGenerator({ selectedIdea, onContentGenerated }: AIConte
               <Label className="font-semibold">Vista Previa del Contenido:</Label>
               <div 
                 className="text-sm border rounded p-3 max-h-40 overflow-y-auto"
-                dangerouslySetInnerHTML={{ __html: generatedContent.content.substring(0, 500) + "..." }}
+                dangerouslySetInnerHTML={{ __html: (generatedContent.content ?? "").substring(0, 500) + "..." }}
               />
             </div>
             
-            <Button onClick={handleUseContent} className="w-full">
+            <Button onClick={handleUseContent} disabled={loading} className="w-full">
               Usar este Contenido
             </Button>
           </CardContent>
@@ -71,7 +71,9 @@ export function AIIdeaGenerator({ onIdeaSelected }: AIIdeaGeneratorProps) {
         },
         body: JSON.stringify({
           focusArea: '',
-          audienceLevel: 'todos'
+          audienceLevel: 'todos',
+          // Si ya se generaron ideas, pedir otras nuevas en vez de las de la caché
+          forceRegenerate: ideas !== predefinedIdeas
         }),
       });
 
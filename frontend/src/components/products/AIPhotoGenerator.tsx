@@ -20,6 +20,35 @@ const examplePrompts = [
   "Presenta este artículo en un fondo elegante de terciopelo negro con iluminación dramática",
 ];
 
+interface GeneratedPhoto {
+  imageUrl: string;
+  fileName: string;
+}
+
+// Sigue el progreso de una generación en segundo plano (Server-Sent Events)
+const waitForGeneration = (apiBaseUrl: string, jobId: string, onProgress: (percent: number) => void) =>
+  new Promise<GeneratedPhoto>((resolve, reject) => {
+    const source = new EventSource(`${apiBaseUrl}/ai/generate-product-photo/${jobId}/events`);
+
+    source.addEventListener('progress', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      if (typeof data.percent === 'number') {
+        onProgress(Math.min(data.percent, 99));
+      }
+    });
+
+    source.addEventListener('done', (event) => {
+      source.close();
+      resolve(JSON.parse((event as MessageEvent).data));
+    });
+
+    source.addEventListener('error', (event) => {
+      source.close();
+      const data = (event as MessageEvent).data;
+      reject(new Error(data ? JSON.parse(data).error : 'Se perdió la conexión con el servidor'));
+    });
+  });
+
 export function AIPhotoGenerator({ onImageGenerated }: AIPhotoGeneratorProps) {
   const { toast } = useToast();
   const [selectedImage, setSelectedImage] = useState<File | null>(null);
@@ -85,6 +114,8 @@ export function AIPhotoGenerator({ onImageGenerated }: AIPhotoGeneratorProps) {
       return;
     }
 
+    // Volver a generar con la misma imagen y prompt: saltarse la caché del servidor
+    const regenerate = Boolean(generatedImage);
     setIsGenerating(true);
     setGeneratedImage("");
     
@@ -94,9 +125,12 @@ export function AIPhotoGenerator({ onImageGenerated }: AIPhotoGeneratorProps) {
       const formData = new FormData();
       formData.append('image', selectedImage);
       formData.append('prompt', prompt);
+      if (regenerate) {
+        formData.append('forceRegenerate', 'true');
+      }
 
       const API_BASE_URL = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5001/api';
-      const response = await fetch(`${API_BASE_URL}/ai/generate-product-photo`, {
+      const response = await fetch(`${API_BASE_URL}/ai/generate-product-photo?async=1`, {
         method: 'POST',
         body: formData,
       });
@@ -106,7 +140,15 @@ export function AIPhotoGenerator({ onImageGenerated }: AIPhotoGeneratorProps) {
         throw new Error(errorData.error || 'Error al generar la imagen');
       }
 
-      const result = await response.json();
+      let result = await response.json();
+
+      // 202: la generación sigue en segundo plano, esperar el resultado por SSE
+      if (response.status === 202 && result.job_id) {
+        result = await waitForGeneration(API_BASE_URL, result.job_id, (percent) => {
+          clearInterval(progressInterval);
+          setGenerationProgress(percent);
+        });
+      }
       
       // Validar que la respuesta contenga una URL válida
       console.log('Respuesta de la API:', result);
@@ -13,6 +13,8 @@ interface GeneratedImage {
   id: string;
   fileName: string;
   localUrl: string;
+  thumbUrl?: string;
+  mediumUrl?: string;
   originalUrl?: string;
   prompt: string;
   timestamp: string;
@@ -27,17 +29,25 @@ export function ImageGallery({ refreshTrigger }: ImageGalleryProps) {
   const [images, setImages] = useState<GeneratedImage[]>([]);
   const [selectedImage, setSelectedImage] = useState<GeneratedImage | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [page, setPage] = useState(1);
+  const [total, setTotal] = useState(0);
+  const [totalPages, setTotalPages] = useState(0);
 
-  const fetchImages = async () => {
+  // Las imágenes llegan paginadas (más recientes primero); "Cargar más" añade la siguiente página
+  const fetchImages = async (pageToLoad = 1) => {
     try {
       const API_BASE_URL = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5001/api';
-      const response = await fetch(`${API_BASE_URL}/ai/generated-images`);
+      const response = await fetch(`${API_BASE_URL}/ai/generated-images?page=${pageToLoad}&per_page=48`);
       if (!response.ok) {
         throw new Error('Error al cargar las imágenes');
       }
       
       const data = await response.json();
-      setImages(data.images || []);
+      const pageImages: GeneratedImage[] = data.images || [];
+      setImages(prev => pageToLoad === 1 ? pageImages : [...prev, ...pageImages]);
+      setPage(pageToLoad);
+      setTotal(data.total ?? pageImages.length);
+      setTotalPages(data.total_pages ?? 1);
     } catch (error) {
       console.error('Error cargando imágenes:', error);
       toast({
@@ -128,7 +138,7 @@ export function ImageGallery({ refreshTrigger }: ImageGalleryProps) {
             Galería de Imágenes Generadas
           </CardTitle>
           <CardDescription>
-            {images.length} imagen{images.length !== 1 ? 'es' : ''} guardada{images.length !== 1 ? 's' : ''} localmente
+            {total} imagen{total !== 1 ? 'es' : ''} guardada{total !== 1 ? 's' : ''} localmente
           </CardDescription>
         </CardHeader>
         <CardContent>
@@ -139,10 +149,12 @@ export function ImageGallery({ refreshTrigger }: ImageGalleryProps) {
                 className="group relative aspect-square cursor-pointer rounded-lg overflow-hidden border hover:border-primary transition-colors"
                 onClick={() => setSelectedImage(image)}
               >
+                {/* Miniatura WebP/AVIF generada por el backend (cacheable, sin reoptimizar) */}
                 <Image
-                  src={image.localUrl}
+                  src={image.thumbUrl || image.localUrl}
                   alt="Imagen generada"
                   fill
+                  unoptimized
                   className="object-cover transition-transform group-hover:scale-105"
                 />
                 <div className="absolute inset-0 bg-black/0 group-hover:bg-black/20 transition-colors flex items-center justify-center">
@@ -156,6 +168,13 @@ export function ImageGallery({ refreshTrigger }: ImageGalleryProps) {
               </div>
             ))}
           </div>
+          {page < totalPages && (
+            <div className="flex justify-center mt-4">
+              <Button variant="outline" onClick={() => fetchImages(page + 1)}>
+                Cargar más
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
 
@@ -184,9 +203,10 @@ export function ImageGallery({ refreshTrigger }: ImageGalleryProps) {
                 {/* Imagen */}
                 <div className="relative w-full h-96 bg-muted rounded-lg overflow-hidden">
                   <Image
-                    src={selectedImage.localUrl}
+                    src={selectedImage.mediumUrl || selectedImage.localUrl}
                     alt="Imagen generada expandida"
                     fill
+                    unoptimized
                     className="object-contain"
                   />
                 </div>
@@ -75,6 +75,7 @@ export function ProductsTable() {
     const [columnFilters, setColumnFilters] = React.useState<ColumnFiltersState>([]);
     const [rowSelection, setRowSelection] = React.useState<RowSelectionState>({});
     const [deletingProducts, setDeletingProducts] = useState(false);
+    const [deleteProgress, setDeleteProgress] = useState<{ done: number; total: number | null } | null>(null);
     const [showDeleteDialog, setShowDeleteDialog] = useState(false);
 
     // Función para cargar productos
@@ -151,7 +152,8 @@ export function ProductsTable() {
         
         try {
             // Usar el endpoint de eliminación en lote
-            const result = await productsApi.bulkDeleteProducts(selectedIds);
+            // Los lotes grandes siguen en segundo plano: se espera al resultado mostrando el avance
+            const result = await productsApi.bulkDeleteProducts(selectedIds, setDeleteProgress);
             
             // Actualizar la lista de productos eliminando solo los que se eliminaron exitosamente
             if (result.deleted.length > 0) {
@@ -187,6 +189,7 @@ export function ProductsTable() {
             });
         } finally {
             setDeletingProducts(false);
+            setDeleteProgress(null);
         }
     };
 
@@ -549,7 +552,10 @@ export function ProductsTable() {
           <div className="fixed inset-0 bg-background/80 backdrop-blur-sm z-50 flex items-center justify-center">
             <div className="flex flex-col items-center gap-4 bg-background p-6 rounded-lg shadow-lg border">
               <Spinner size="lg" />
-              <p className="text-sm text-muted-foreground">Eliminando productos...</p>
+              <p className="text-sm text-muted-foreground">
+                Eliminando productos...
+                {deleteProgress?.total ? ` ${deleteProgress.done} de ${deleteProgress.total}` : ''}
+              </p>
             </div>
           </div>
         )}
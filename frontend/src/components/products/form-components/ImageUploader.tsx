@@ -19,56 +19,60 @@ interface ImageUploaderProps {
   onMainImageChange: (id: number | null) => void;
 }
 
+// Archivos por petición a /media/upload-batch (MEDIA_MAX_BATCH_FILES en el backend)
+const MAX_BATCH_FILES = 20;
+
 export function ImageUploader({ images, onImagesChange, mainImageId, onMainImageChange }: ImageUploaderProps) {
   const [isUploading, setIsUploading] = useState(false);
 
   const onDrop = useCallback(async (acceptedFiles: File[]) => {
     setIsUploading(true);
-    const uploadPromises = acceptedFiles.map(async (file) => {
+
+    // Lotes de como máximo MAX_BATCH_FILES archivos: el backend sube los de cada
+    // lote a WordPress en paralelo y devuelve un resultado por archivo
+    const results: (UploadedImage | null)[] = [];
+    // Detectar si estamos en producción basándonos en la URL
+    const isProduction = window.location.pathname.startsWith('/panel');
+    const uploadUrl = isProduction 
+      ? "/panel/api/media/upload-batch"
+      : "/api/media/upload-batch";
+
+    for (let offset = 0; offset < acceptedFiles.length; offset += MAX_BATCH_FILES) {
       const formData = new FormData();
-      formData.append("file", file);
+      acceptedFiles.slice(offset, offset + MAX_BATCH_FILES).forEach((file) => formData.append("files", file));
 
       try {
-        // Detectar si estamos en producción basándonos en la URL
-        const isProduction = window.location.pathname.startsWith('/panel');
-        const uploadUrl = isProduction 
-          ? "/panel/api/media/upload"
-          : "/api/media/upload";
-        
-        console.log("Upload URL:", uploadUrl, "isProduction:", isProduction);
-          
         const response = await fetch(uploadUrl, {
           method: "POST",
           body: formData,
         });
 
         const responseText = await response.text();
-        console.log("Respuesta cruda del backend:", responseText);
-        
-        if (!response.ok) {
-          let errorMsg = `Error al subir ${file.name}`;
-          try {
-            const errorJson = JSON.parse(responseText);
-            errorMsg = errorJson.error || errorMsg;
-          } catch(e) { /* No es un JSON, usar el texto plano si es posible */ }
-          throw new Error(errorMsg);
+        let batch: any = null;
+        try {
+          batch = JSON.parse(responseText);
+        } catch(e) { /* No es un JSON */ }
+
+        if (!batch?.results) {
+          throw new Error(batch?.error || "Error al subir las imágenes");
         }
-        
-        const uploadedImage = JSON.parse(responseText);
-        console.log("JSON parseado de la respuesta:", uploadedImage);
-
-        return {
-          id: uploadedImage.id,
-          src: uploadedImage.source_url,
-          alt: uploadedImage.alt_text,
-        } as UploadedImage;
+
+        results.push(...batch.results.map((result: any) => {
+          if (!result.success) {
+            toast.error(result.error || `Fallo al subir ${result.filename}`);
+            return null;
+          }
+          return {
+            id: result.id,
+            src: result.source_url,
+            alt: result.alt_text,
+          } as UploadedImage;
+        }));
       } catch (error) {
-        toast.error(error instanceof Error ? error.message : `Fallo al subir ${file.name}`);
-        return null;
+        toast.error(error instanceof Error ? error.message : "Fallo al subir las imágenes");
       }
-    });
+    }
 
-    const results = await Promise.all(uploadPromises);
     const newImages = results.filter((img): img is UploadedImage => img !== null);
     
     if (newImages.length > 0) {
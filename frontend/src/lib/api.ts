@@ -19,6 +19,50 @@ async function apiCall<T>(endpoint: string, options?: RequestInit): Promise<T> {
   return response.json();
 }
 
+// Trabajo en segundo plano del backend (/api/jobs/<id>)
+export interface BackgroundJob<T = any> {
+  id: string;
+  type: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+  progress: { done: number; total: number | null };
+  error: string | null;
+  result?: T | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Espera a que termine un trabajo y devuelve su resultado (mismo cuerpo que la respuesta síncrona)
+async function waitForJob<T>(jobId: string, onProgress?: (progress: BackgroundJob['progress']) => void): Promise<T> {
+  while (true) {
+    const job = await apiCall<BackgroundJob<T>>(`/jobs/${jobId}`);
+    if (job.status === 'succeeded') {
+      return { ...(job.result as T), job_id: jobId };
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'La operación falló');
+    }
+    if (job.status === 'cancelled') {
+      throw new Error('La operación se canceló');
+    }
+    onProgress?.(job.progress);
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+}
+
+// Como apiCall, para las rutas que encolan un trabajo: si no termina a tiempo el
+// backend responde 202 con su job_id y aquí se espera al resultado final
+async function apiJobCall<T>(
+  endpoint: string,
+  options?: RequestInit,
+  onProgress?: (progress: BackgroundJob['progress']) => void
+): Promise<T> {
+  const result = await apiCall<any>(endpoint, options);
+  if (result?.job_id && result.status_url && (result.status === 'queued' || result.status === 'running')) {
+    return waitForJob<T>(result.job_id, onProgress);
+  }
+  return result as T;
+}
+
 // Orders API
 export const ordersApi = {
   // Get orders with filters
@@ -294,8 +338,8 @@ export const productsApi = {
   },
 
   // Bulk delete products
-  bulkDeleteProducts: async (productIds: number[]) => {
-    return apiCall<{
+  bulkDeleteProducts: async (productIds: number[], onProgress?: (progress: BackgroundJob['progress']) => void) => {
+    return apiJobCall<{
       deleted: number[];
       failed: { id: number; error: string }[];
       total_deleted: number;
@@ -303,7 +347,7 @@ export const productsApi = {
     }>('/products/bulk-delete', {
       method: 'POST',
       body: JSON.stringify({ product_ids: productIds }),
-    });
+    }, onProgress);
   },
 
   // Search products
@@ -719,7 +763,7 @@ export const blogApi = {
   // Bulk update comments (optional - fallback to individual updates)
   bulkUpdateComments: async (commentIds: number[], action: 'approve' | 'hold' | 'spam' | 'trash' | 'delete') => {
     try {
-      return await apiCall<any>('/blog/comments/bulk', {
+      return await apiJobCall<any>('/blog/comments/bulk', {
         method: 'POST',
         body: JSON.stringify({
           comment_ids: commentIds,
@@ -838,7 +882,7 @@ export const categoriesApi = {
 
   // Bulk delete categories
   bulkDeleteCategories: async (categoryIds: number[], force = false) => {
-    return apiCall<any>('/categories/bulk', {
+    return apiJobCall<any>('/categories/bulk', {
       method: 'DELETE',
       body: JSON.stringify({ 
         category_ids: categoryIds,
@@ -976,7 +1020,7 @@ export const inventoryApi = {
 
   // Bulk update products
   bulkUpdateProducts: async (bulkData: BulkUpdateRequest): Promise<BulkUpdateResponse> => {
-    return apiCall<BulkUpdateResponse>('/inventory/bulk-update', {
+    return apiJobCall<BulkUpdateResponse>('/inventory/bulk-update', {
       method: 'POST',
       body: JSON.stringify(bulkData),
     });